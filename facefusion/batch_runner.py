@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, List, Optional
+
+import facefusion.globals
+from facefusion import logger, wording
+from facefusion.ffmpeg import extract_frames
+from facefusion.filesystem import clear_temp, create_temp, get_temp_directory_path, is_video
+from facefusion.common_helper import get_first
+from facefusion.vision import detect_video_resolution, pack_resolution, unpack_resolution, restrict_video_resolution, restrict_video_fps
+
+PREFETCH_FUTURES : Dict[str, Future[bool]] = {}
+FINALIZE_EXECUTOR : Optional[ThreadPoolExecutor] = None
+
+
+# 目录批处理: 处理当前目标时后台预提取下一个目标的帧,上一个目标的音频与清理在后台完成
+def run_batch(target_paths : List[str], process_target : Callable[[str], None]) -> None:
+	global FINALIZE_EXECUTOR
+
+	output_video_resolution = facefusion.globals.output_video_resolution
+
+	try:
+		with ThreadPoolExecutor(max_workers = 1) as prefetch_executor, ThreadPoolExecutor(max_workers = 1) as finalize_executor:
+			FINALIZE_EXECUTOR = finalize_executor
+			for index, target_path in enumerate(target_paths):
+				next_target_path = get_first(target_paths[index + 1:])
+				if next_target_path and is_prefetch_target(next_target_path, target_paths[max(index - 1, 0):index + 1]):
+					PREFETCH_FUTURES[next_target_path] = prefetch_executor.submit(prefetch_frames, next_target_path, output_video_resolution)
+				process_target(target_path)
+				PREFETCH_FUTURES.pop(target_path, None)
+	finally:
+		FINALIZE_EXECUTOR = None
+		PREFETCH_FUTURES.clear()
+
+
+# 流式与分段处理不使用临时帧,临时目录与正在处理或收尾的目标相同时也不能预取
+def is_prefetch_target(target_path : str, busy_target_paths : List[str]) -> bool:
+	if not is_video(target_path) or facefusion.globals.stream_frames:
+		return False
+	if facefusion.globals.video_segment_count and facefusion.globals.video_segment_count > 1:
+		return False
+	if facefusion.globals.shard_directory:
+		return False
+	temp_directory_path = get_temp_directory_path(target_path)
+	return all(get_temp_directory_path(busy_target_path) != temp_directory_path for busy_target_path in busy_target_paths)
+
+
+def prefetch_frames(target_path : str, output_video_resolution : Optional[str]) -> bool:
+	output_video_resolution = output_video_resolution or pack_resolution(detect_video_resolution(target_path))
+	temp_video_resolution = pack_resolution(restrict_video_resolution(target_path, unpack_resolution(output_video_resolution)))
+	temp_video_fps = restrict_video_fps(target_path, facefusion.globals.output_video_fps)
+
+	logger.debug(wording.get('prefetching_frames').format(target_path = target_path), __name__.upper())
+	clear_temp(target_path)
+	create_temp(target_path)
+	return extract_frames(target_path, temp_video_resolution, temp_video_fps, until_done = True)
+
+
+def is_frames_prefetched(target_path : str) -> bool:
+	return target_path in PREFETCH_FUTURES
+
+
+# 等待预取完成,失败时返回False由调用方重新提取
+def wait_prefetched_frames(target_path : str) -> bool:
+	prefetch_future = PREFETCH_FUTURES.pop(target_path, None)
+	if prefetch_future:
+		try:
+			return prefetch_future.result()
+		except Exception as exception:
+			logger.error(str(exception), __name__.upper())
+	return False
+
+
+def submit_finalize(finalize_function : Callable[..., Any], *args : Any) -> bool:
+	if FINALIZE_EXECUTOR:
+		FINALIZE_EXECUTOR.submit(run_finalize, finalize_function, *args)
+		return True
+	return False
+
+
+def run_finalize(finalize_function : Callable[..., Any], *args : Any) -> None:
+	try:
+		finalize_function(*args)
+	except Exception as exception:
+		logger.error(str(exception), __name__.upper())
+
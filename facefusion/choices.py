@@ -1,8 +1,12 @@
 from typing import List, Dict
 
-from facefusion.typing import VideoMemoryStrategy, FaceSelectorMode, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, FaceDetectorModel, FaceMaskType, FaceMaskRegion, TempFrameFormat, OutputVideoEncoder, OutputVideoPreset
+from facefusion.typing import ExecutionBackend, ExecutionMode, ExecutionGraphOptimization, ShardRole, VideoMemoryStrategy, FaceSelectorMode, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, FaceDetectorModel, FaceMaskType, FaceMaskRegion, TempFrameFormat, OutputVideoEncoder, OutputVideoPreset
 from facefusion.common_helper import create_int_range, create_float_range
 
+execution_backends : List[ExecutionBackend] = [ 'thread', 'process' ]
+execution_modes : List[ExecutionMode] = [ 'sequential', 'parallel' ]
+execution_graph_optimizations : List[ExecutionGraphOptimization] = [ 'disable', 'basic', 'extended', 'all' ]
+shard_roles : List[ShardRole] = [ 'coordinator', 'worker' ]
 video_memory_strategies : List[VideoMemoryStrategy] = [ 'strict', 'moderate', 'tolerant' ]
 face_analyser_orders : List[FaceAnalyserOrder] = [ 'left-right', 'right-left', 'top-bottom', 'bottom-top', 'small-large', 'large-small', 'best-worst', 'worst-best' ]
 face_analyser_ages : List[FaceAnalyserAge] = [ 'child', 'teen', 'adult', 'senior' ]
@@ -57,9 +61,15 @@ video_template_sizes : List[int] = [ 240, 360, 480, 540, 720, 1080, 1440, 2160,
 
 execution_thread_count_range : List[int] = create_int_range(1, 128, 1)
 execution_queue_count_range : List[int] = create_int_range(1, 32, 1)
+video_segment_count_range : List[int] = create_int_range(1, 64, 1)
+duplicate_frame_distance_range : List[int] = create_int_range(0, 32, 1)
+shard_count_range : List[int] = create_int_range(1, 1024, 1)
 system_memory_limit_range : List[int] = create_int_range(0, 128, 1)
+static_face_limit_range : List[int] = create_int_range(0, 4096, 64)
 face_detector_score_range : List[float] = create_float_range(0.0, 1.0, 0.05)
 face_landmarker_score_range : List[float] = create_float_range(0.0, 1.0, 0.05)
+face_detector_interval_range : List[int] = create_int_range(1, 60, 1)
+face_presence_interval_range : List[int] = create_int_range(1, 30, 1)
 face_mask_blur_range : List[float] = create_float_range(0.0, 1.0, 0.05)
 face_mask_padding_range : List[int] = create_int_range(0, 100, 1)
 reference_face_distance_range : List[float] = create_float_range(0.0, 1.5, 0.05)
@@ -3,14 +3,13 @@ from functools import lru_cache
 from time import sleep
 import cv2
 import numpy
-import onnxruntime
 from tqdm import tqdm
 
 import facefusion.globals
 from facefusion import process_manager, wording
 from facefusion.thread_helper import thread_lock, conditional_thread_semaphore
 from facefusion.typing import VisionFrame, ModelSet, Fps
-from facefusion.execution import apply_execution_provider_options
+from facefusion.inference_manager import get_inference_session, clear_inference_sessions
 from facefusion.vision import get_video_frame, count_video_frame_total, read_image, detect_video_fps
 from facefusion.filesystem import resolve_relative_path, is_file
 from facefusion.download import conditional_download
@@ -34,18 +33,21 @@ STREAM_COUNTER = 0
 def get_content_analyser() -> Any:
 	global CONTENT_ANALYSER
 
-	with thread_lock():
-		while process_manager.is_checking():
-			sleep(0.5)
-		if CONTENT_ANALYSER is None:
-			model_path = MODELS.get('open_nsfw').get('path')
-			CONTENT_ANALYSER = onnxruntime.InferenceSession(model_path, providers = apply_execution_provider_options(facefusion.globals.execution_providers))
+	if CONTENT_ANALYSER is None:
+		with thread_lock():
+			while process_manager.is_checking():
+				sleep(0.5)
+			if CONTENT_ANALYSER is None:
+				model_path = MODELS.get('open_nsfw').get('path')
+				CONTENT_ANALYSER = get_inference_session(model_path)
 	return CONTENT_ANALYSER
 
 
 def clear_content_analyser() -> None:
 	global CONTENT_ANALYSER
 
+	if CONTENT_ANALYSER is not None:
+		clear_inference_sessions([ MODELS.get('open_nsfw').get('path') ])
 	CONTENT_ANALYSER = None
 
 
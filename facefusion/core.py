@@ -22,29 +22,41 @@ import shutil
 import numpy
 import onnxruntime
 from time import sleep, time
+from typing import List, Optional
 from argparse import ArgumentParser, HelpFormatter
 
 import facefusion.choices
 import facefusion.globals
-from facefusion.face_analyser import get_one_face, get_average_face
-from facefusion.face_store import get_reference_faces, append_reference_face
+from facefusion.face_analyser import get_one_face, get_source_face
+from facefusion.face_cache import save_face_cache
+from facefusion.face_store import get_reference_faces, append_reference_face, clear_reference_faces, clear_static_faces
 from facefusion import face_analyser, face_masker, content_analyser, config, process_manager, metadata, logger, wording, \
 	voice_extractor
 from facefusion.content_analyser import analyse_image, analyse_video
-from facefusion.processors.frame.core import get_frame_processors_modules, load_frame_processor_module
+from facefusion.processors.frame.core import get_frame_processors_modules, load_frame_processor_module, multi_process_stream, \
+	multi_process_fused_frames, create_duplicate_frame_paths, copy_duplicate_frames, create_empty_frame_paths, copy_empty_frames, \
+	register_frame_numbers, get_frame_number_offset
+from facefusion.processors.frame.process_pool import multi_process_pool_frames, multi_process_pool_stream
 from facefusion.common_helper import create_metavar, get_first
 from facefusion.execution import encode_execution_providers, decode_execution_providers
 from facefusion.normalizer import normalize_output_path, normalize_padding, normalize_fps
 from facefusion.memory import limit_system_memory
+from facefusion.typing import Fps, Shard
 from facefusion.statistics import conditional_log_statistics
 from facefusion.download import conditional_download
 from facefusion.filesystem import list_directory, get_temp_frame_paths, create_temp, move_temp, clear_temp, is_image, \
 	is_video, filter_audio_paths, resolve_relative_path, is_temp_moved, is_temp_file, find_images, \
-	find_images_or_videos, create_directory
-from facefusion.ffmpeg import extract_frames, merge_video, copy_image, finalize_image, restore_audio, replace_audio
-from facefusion.vision import read_image, read_static_images, detect_image_resolution, restrict_video_fps, \
+	find_images_or_videos, create_directory, get_temp_directory_path, clear_frame_journal
+from facefusion.ffmpeg import extract_frames, merge_video, copy_image, finalize_image, restore_audio, replace_audio, \
+	concat_video, detect_video_keyframes
+from facefusion.batch_runner import run_batch, is_frames_prefetched, wait_prefetched_frames, submit_finalize
+from facefusion.server import run_server
+from facefusion.video_segmenter import create_segment_ranges, multi_process_segments
+from facefusion.shard_manager import create_shard_job, read_shard_job, claim_shard, complete_shard, release_shard, \
+	is_shard_job_done, get_shard_segment_path, get_shard_segment_paths, keep_shard_claimed
+from facefusion.vision import read_image, detect_image_resolution, restrict_video_fps, \
 	create_image_resolutions, get_video_frame, detect_video_resolution, detect_video_fps, restrict_video_resolution, \
-	restrict_image_resolution, create_video_resolutions, pack_resolution, unpack_resolution
+	restrict_image_resolution, create_video_resolutions, pack_resolution, unpack_resolution, count_video_frame_total
 
 onnxruntime.set_default_logger_severity(3)
 warnings.filterwarnings('ignore', category=UserWarning, module='gradio')
@@ -87,6 +99,21 @@ def cli() -> None:
 							default=config.get_bool_value('misc.hwaccel_cuda'))
 	group_misc.add_argument('--headless', help=wording.get('help.headless'), action='store_true',
 							default=config.get_bool_value('misc.headless'))
+	# 多台机器通过共享目录分片处理同一个视频
+	group_misc.add_argument('--shard-directory', help=wording.get('help.shard_directory'),
+							default=config.get_str_value('misc.shard_directory'))
+	group_misc.add_argument('--shard-role', help=wording.get('help.shard_role'),
+							default=config.get_str_value('misc.shard_role', 'coordinator'),
+							choices=facefusion.choices.shard_roles)
+	group_misc.add_argument('--shard-count', help=wording.get('help.shard_count'), type=int,
+							default=config.get_int_value('misc.shard_count', '8'),
+							choices=facefusion.choices.shard_count_range,
+							metavar=create_metavar(facefusion.choices.shard_count_range))
+	# 常驻服务,模型只加载一次
+	group_misc.add_argument('--server', help=wording.get('help.server'), action='store_true',
+							default=config.get_bool_value('misc.server'))
+	group_misc.add_argument('--server-port', help=wording.get('help.server_port'), type=int,
+							default=config.get_int_value('misc.server_port', '7870'))
 	group_misc.add_argument('--log-level', help=wording.get('help.log_level'),
 							default=config.get_str_value('misc.log_level', 'info'), choices=logger.get_log_levels())
 	# execution
@@ -103,6 +130,23 @@ def cli() -> None:
 								 default=config.get_int_value('execution.execution_queue_count', '1'),
 								 choices=facefusion.choices.execution_queue_count_range,
 								 metavar=create_metavar(facefusion.choices.execution_queue_count_range))
+	group_execution.add_argument('--execution-backend', help=wording.get('help.execution_backend'),
+								 default=config.get_str_value('execution.execution_backend', 'thread'),
+								 choices=facefusion.choices.execution_backends)
+	group_execution.add_argument('--execution-model-limits', help=wording.get('help.execution_model_limits'),
+								 default=config.get_str_list('execution.execution_model_limits'), nargs='+', metavar='MODEL=LIMIT')
+	group_execution.add_argument('--execution-model-replicas', help=wording.get('help.execution_model_replicas'),
+								 default=config.get_str_list('execution.execution_model_replicas'), nargs='+', metavar='MODEL=REPLICAS')
+	group_execution.add_argument('--execution-intra-op-threads', help=wording.get('help.execution_intra_op_threads'),
+								 default=config.get_str_list('execution.execution_intra_op_threads'), nargs='+', metavar='MODEL=THREADS')
+	group_execution.add_argument('--execution-inter-op-threads', help=wording.get('help.execution_inter_op_threads'),
+								 default=config.get_str_list('execution.execution_inter_op_threads'), nargs='+', metavar='MODEL=THREADS')
+	group_execution.add_argument('--execution-modes', help=wording.get('help.execution_modes').format(choices=', '.join(facefusion.choices.execution_modes)),
+								 default=config.get_str_list('execution.execution_modes'), nargs='+', metavar='MODEL=MODE')
+	group_execution.add_argument('--execution-graph-optimizations', help=wording.get('help.execution_graph_optimizations').format(choices=', '.join(facefusion.choices.execution_graph_optimizations)),
+								 default=config.get_str_list('execution.execution_graph_optimizations'), nargs='+', metavar='MODEL=LEVEL')
+	group_execution.add_argument('--execution-cache-directory', help=wording.get('help.execution_cache_directory'),
+								 default=config.get_str_value('execution.execution_cache_directory'))
 	# memory
 	group_memory = program.add_argument_group('memory')
 	group_memory.add_argument('--video-memory-strategy', help=wording.get('help.video_memory_strategy'),
@@ -112,6 +156,10 @@ def cli() -> None:
 							  default=config.get_int_value('memory.system_memory_limit', '0'),
 							  choices=facefusion.choices.system_memory_limit_range,
 							  metavar=create_metavar(facefusion.choices.system_memory_limit_range))
+	group_memory.add_argument('--static-face-limit', help=wording.get('help.static_face_limit'), type=int,
+							  default=config.get_int_value('memory.static_face_limit', '1024'),
+							  choices=facefusion.choices.static_face_limit_range,
+							  metavar=create_metavar(facefusion.choices.static_face_limit_range))
 	# face analyser
 	group_face_analyser = program.add_argument_group('face analyser')
 	group_face_analyser.add_argument('--face-analyser-order', help=wording.get('help.face_analyser_order'),
@@ -137,6 +185,19 @@ def cli() -> None:
 									 default=config.get_float_value('face_analyser.face_landmarker_score', '0.5'),
 									 choices=facefusion.choices.face_landmarker_score_range,
 									 metavar=create_metavar(facefusion.choices.face_landmarker_score_range))
+	# 预先低分辨率抽样检测,跳过没有人脸的帧
+	group_face_analyser.add_argument('--face-presence-interval', help=wording.get('help.face_presence_interval'), type=int,
+									 default=config.get_int_value('face_analyser.face_presence_interval'),
+									 choices=facefusion.choices.face_presence_interval_range,
+									 metavar=create_metavar(facefusion.choices.face_presence_interval_range))
+	# 每隔N帧检测一次,其余帧通过光流跟踪关键点
+	group_face_analyser.add_argument('--face-detector-interval', help=wording.get('help.face_detector_interval'), type=int,
+									 default=config.get_int_value('face_analyser.face_detector_interval', '1'),
+									 choices=facefusion.choices.face_detector_interval_range,
+									 metavar=create_metavar(facefusion.choices.face_detector_interval_range))
+	# 同一目标再次处理时复用上次的人脸分析结果
+	group_face_analyser.add_argument('--face-cache-directory', help=wording.get('help.face_cache_directory'),
+									 default=config.get_str_value('face_analyser.face_cache_directory'))
 	# face selector
 	group_face_selector = program.add_argument_group('face selector')
 	group_face_selector.add_argument('--face-selector-mode', help=wording.get('help.face_selector_mode'),
@@ -181,6 +242,16 @@ def cli() -> None:
 										choices=facefusion.choices.temp_frame_formats)
 	group_frame_extraction.add_argument('--keep-temp', help=wording.get('help.keep_temp'), action='store_true',
 										default=config.get_bool_value('frame_extraction.keep_temp'))
+	group_frame_extraction.add_argument('--video-segment-count', help=wording.get('help.video_segment_count'), type=int,
+										default=config.get_int_value('frame_extraction.video_segment_count', '1'),
+										choices=facefusion.choices.video_segment_count_range,
+										metavar=create_metavar(facefusion.choices.video_segment_count_range))
+	group_frame_extraction.add_argument('--stream-frames', help=wording.get('help.stream_frames'), action='store_true',
+										default=config.get_bool_value('frame_extraction.stream_frames'))
+	group_frame_extraction.add_argument('--duplicate-frame-distance', help=wording.get('help.duplicate_frame_distance'), type=int,
+										default=config.get_int_value('frame_extraction.duplicate_frame_distance'),
+										choices=facefusion.choices.duplicate_frame_distance_range,
+										metavar=create_metavar(facefusion.choices.duplicate_frame_distance_range))
 	# output creation
 	group_output_creation = program.add_argument_group('output creation')
 	group_output_creation.add_argument('--output-image-quality', help=wording.get('help.output_image_quality'),
@@ -305,14 +376,28 @@ def apply_args(program: ArgumentParser) -> None:
 	facefusion.globals.out_new_dir = args.out_new_dir
 	facefusion.globals.skip_extract_frames = args.skip_extract_frames
 	facefusion.globals.headless = args.headless
+	facefusion.globals.shard_directory = args.shard_directory
+	facefusion.globals.shard_role = args.shard_role
+	facefusion.globals.shard_count = args.shard_count
+	facefusion.globals.server = args.server
+	facefusion.globals.server_port = args.server_port
 	facefusion.globals.log_level = args.log_level
 	# execution
 	facefusion.globals.execution_providers = decode_execution_providers(args.execution_providers)
 	facefusion.globals.execution_thread_count = args.execution_thread_count
 	facefusion.globals.execution_queue_count = args.execution_queue_count
+	facefusion.globals.execution_backend = args.execution_backend
+	facefusion.globals.execution_model_limits = args.execution_model_limits
+	facefusion.globals.execution_model_replicas = args.execution_model_replicas
+	facefusion.globals.execution_intra_op_threads = args.execution_intra_op_threads
+	facefusion.globals.execution_inter_op_threads = args.execution_inter_op_threads
+	facefusion.globals.execution_modes = args.execution_modes
+	facefusion.globals.execution_graph_optimizations = args.execution_graph_optimizations
+	facefusion.globals.execution_cache_directory = args.execution_cache_directory
 	# memory
 	facefusion.globals.video_memory_strategy = args.video_memory_strategy
 	facefusion.globals.system_memory_limit = args.system_memory_limit
+	facefusion.globals.static_face_limit = args.static_face_limit
 	# face analyser
 	facefusion.globals.face_analyser_order = args.face_analyser_order
 	facefusion.globals.face_analyser_age = args.face_analyser_age
@@ -324,6 +409,9 @@ def apply_args(program: ArgumentParser) -> None:
 		facefusion.globals.face_detector_size = '640x640'
 	facefusion.globals.face_detector_score = args.face_detector_score
 	facefusion.globals.face_landmarker_score = args.face_landmarker_score
+	facefusion.globals.face_detector_interval = args.face_detector_interval
+	facefusion.globals.face_presence_interval = args.face_presence_interval
+	facefusion.globals.face_cache_directory = args.face_cache_directory
 	# face selector
 	facefusion.globals.face_selector_mode = args.face_selector_mode
 	facefusion.globals.reference_face_position = args.reference_face_position
@@ -339,6 +427,9 @@ def apply_args(program: ArgumentParser) -> None:
 	facefusion.globals.trim_frame_end = args.trim_frame_end
 	facefusion.globals.temp_frame_format = args.temp_frame_format
 	facefusion.globals.keep_temp = args.keep_temp
+	facefusion.globals.stream_frames = args.stream_frames
+	facefusion.globals.video_segment_count = args.video_segment_count
+	facefusion.globals.duplicate_frame_distance = args.duplicate_frame_distance
 	# output creation
 	facefusion.globals.output_image_quality = args.output_image_quality
 	if is_image(args.target_path):
@@ -386,11 +477,16 @@ def run(program: ArgumentParser) -> None:
 	for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
 		if not frame_processor_module.pre_check():
 			return
-	if facefusion.globals.headless:
+	if facefusion.globals.server:
+		run_server(process_target)
+	elif facefusion.globals.headless:
 		# facefusion.globals.target_dir
 		# 如果发现有target_dir,递归遍历target_dir目录下的所有图片(包括子目录)把路径写入到target_path变量中一个一个处理
-		if facefusion.globals.target_dir:
-			find_images_or_videos(facefusion.globals.target_dir, once_conditional_process)
+		if facefusion.globals.shard_directory and facefusion.globals.shard_role == 'worker':
+			run_shard_worker()
+			auto_shutdown_pc()
+		elif facefusion.globals.target_dir:
+			run_batch(find_images_or_videos(facefusion.globals.target_dir), once_conditional_process)
 			auto_shutdown_pc()
 		else:
 			conditional_process()
@@ -446,6 +542,16 @@ def once_image(image_path) -> None:
 
 # 开始运行的主函数
 def conditional_process() -> None:
+	for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
+		while not frame_processor_module.post_check():
+			logger.disable()
+			sleep(0.5)
+		logger.enable()
+	process_target()
+
+
+# 处理当前目标,服务模式下模型已检查过,直接调用
+def process_target() -> None:
 	# 避免单次被覆盖,临时保存输出分辨率设置
 	old_output_video_resolution = facefusion.globals.output_video_resolution
 	old_output_image_resolution = facefusion.globals.output_image_resolution
@@ -454,23 +560,24 @@ def conditional_process() -> None:
 	if facefusion.globals.output_path:
 		create_directory(facefusion.globals.output_path)
 	for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
-		while not frame_processor_module.post_check():
-			logger.disable()
-			sleep(0.5)
-		logger.enable()
 		if not frame_processor_module.pre_process('output'):
 			return
 	conditional_append_reference_faces()
 	if is_image(facefusion.globals.target_path):
 		process_image(start_time)
 	if is_video(facefusion.globals.target_path):
-		process_video(start_time)
+		if facefusion.globals.shard_directory and facefusion.globals.shard_role == 'coordinator':
+			process_sharded_video(start_time)
+		elif facefusion.globals.video_segment_count and facefusion.globals.video_segment_count > 1:
+			process_segmented_video(start_time)
+		else:
+			process_video(start_time)
 	# 还原设置
 	facefusion.globals.output_video_resolution = old_output_video_resolution
 	facefusion.globals.output_image_resolution = old_output_image_resolution
 
 
-def auto_shutdown_pc():
+def auto_shutdown_pc() -> None:
 	# 这里可能没有移动完成？
 	if facefusion.globals.shutdown:
 		# # 如果不是keep_temp需要循环检查临时文件是否移动完成,如果检查时间大于1小时则打印日志并强制关闭
@@ -497,8 +604,7 @@ def auto_shutdown_pc():
 
 def conditional_append_reference_faces() -> None:
 	if 'reference' in facefusion.globals.face_selector_mode and not get_reference_faces():
-		source_frames = read_static_images(facefusion.globals.source_paths)
-		source_face = get_average_face(source_frames)
+		source_face = get_source_face(facefusion.globals.source_paths)
 		if is_video(facefusion.globals.target_path):
 			reference_frame = get_video_frame(facefusion.globals.target_path, facefusion.globals.reference_frame_number)
 		else:
@@ -604,89 +710,41 @@ def process_video(start_time: float) -> None:
 	if analyse_video(facefusion.globals.target_path, facefusion.globals.trim_frame_start,
 					 facefusion.globals.trim_frame_end):
 		return
-	# clear temp
-	logger.debug(wording.get('clearing_temp'), __name__.upper())
-	clear_temp(facefusion.globals.target_path)
-	# create temp
-	logger.debug(wording.get('creating_temp'), __name__.upper())
-	create_temp(facefusion.globals.target_path)
+	# 批处理预取的帧已在临时目录中
+	if not is_frames_prefetched(facefusion.globals.target_path):
+		# clear temp
+		logger.debug(wording.get('clearing_temp'), __name__.upper())
+		clear_temp(facefusion.globals.target_path)
+		# create temp
+		logger.debug(wording.get('creating_temp'), __name__.upper())
+		create_temp(facefusion.globals.target_path)
 	# extract frames
 	process_manager.start()
 	# 如果目标分辨率不存在临时使用当前图片的
 	if not facefusion.globals.output_video_resolution:
-		facefusion.globals.output_video_resolution = 'x'.join([str(s)  for s in restrict_video_resolution(facefusion.globals.target_path)])
+		facefusion.globals.output_video_resolution = pack_resolution(detect_video_resolution(facefusion.globals.target_path))
 	temp_video_resolution = pack_resolution(restrict_video_resolution(facefusion.globals.target_path, unpack_resolution(
 		facefusion.globals.output_video_resolution)))
 	temp_video_fps = restrict_video_fps(facefusion.globals.target_path, facefusion.globals.output_video_fps)
-	logger.info(wording.get('extracting_frames').format(resolution=temp_video_resolution, fps=temp_video_fps),
-				__name__.upper())
-	if extract_frames(facefusion.globals.target_path, temp_video_resolution, temp_video_fps):
-		logger.debug(wording.get('extracting_frames_succeed'), __name__.upper())
+	if facefusion.globals.stream_frames:
+		is_video_processed = stream_video_frames(temp_video_resolution, temp_video_fps)
 	else:
-		if is_process_stopping():
-			return
-		logger.error(wording.get('extracting_frames_failed'), __name__.upper())
-		return
-	# process frames
-	temp_frame_paths = get_temp_frame_paths(facefusion.globals.target_path)
-	if temp_frame_paths:
-		for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
-			logger.info(wording.get('processing'), frame_processor_module.NAME)
-			# 模型处理视频帧
-			new_temp_frame_paths = frame_processor_module.process_video(facefusion.globals.source_paths,
-																		temp_frame_paths)
-			if new_temp_frame_paths:
-				temp_frame_paths = new_temp_frame_paths
-			frame_processor_module.post_process()
-		if is_process_stopping():
-			return
-	else:
-		logger.error(wording.get('temp_frames_not_found'), __name__.upper())
-		return
-	# merge video
-	logger.info(wording.get('merging_video').format(resolution=facefusion.globals.output_video_resolution,
-													fps=facefusion.globals.output_video_fps), __name__.upper())
-	if merge_video(facefusion.globals.target_path, facefusion.globals.output_video_resolution,
-				   facefusion.globals.output_video_fps):
-		logger.debug(wording.get('merging_video_succeed'), __name__.upper())
-	else:
-		if is_process_stopping():
-			return
-		logger.error(wording.get('merging_video_failed'), __name__.upper())
+		is_video_processed = process_video_frames(temp_video_resolution, temp_video_fps)
+	# 中断时也保存已分析的人脸,下次处理同一目标时直接读取
+	save_face_cache()
+	if not is_video_processed:
 		return
-	# handle audio
-	if facefusion.globals.skip_audio:
-		logger.info(wording.get('skipping_audio'), __name__.upper())
-		move_temp(facefusion.globals.target_path, normed_output_path)
-	else:
-		if 'lip_syncer' in facefusion.globals.frame_processors:
-			source_audio_path = get_first(filter_audio_paths(facefusion.globals.source_paths))
-			if source_audio_path and replace_audio(facefusion.globals.target_path, source_audio_path,
-												   normed_output_path):
-				logger.debug(wording.get('restoring_audio_succeed'), __name__.upper())
-			else:
-				if is_process_stopping():
-					return
-				logger.warn(wording.get('restoring_audio_skipped'), __name__.upper())
-				move_temp(facefusion.globals.target_path, normed_output_path)
-		else:
-			# 这里没有拿进度导致会提前关闭
-			if restore_audio(facefusion.globals.target_path, normed_output_path, facefusion.globals.output_video_fps):
-				logger.debug(wording.get('restoring_audio_succeed'), __name__.upper())
-			else:
-				if is_process_stopping():
-					return
-				logger.warn(wording.get('restoring_audio_skipped'), __name__.upper())
-				move_temp(facefusion.globals.target_path, normed_output_path)
-	# validate video
-	if is_video(normed_output_path):
-		seconds = '{:.2f}'.format((time() - start_time))
-		logger.info(wording.get('processing_video_succeed').format(seconds=seconds), __name__.upper())
-		conditional_log_statistics()
-	else:
-		logger.error(wording.get('processing_video_failed'), __name__.upper())
+	# 批处理时音频与清理交给后台,下一个目标可以立即开始
+	# 后台收尾时主线程已重置处理状态,是否停止以提交时为准
+	if not submit_finalize(complete_video, facefusion.globals.target_path, normed_output_path, start_time, clear_target_path_file_flag, False):
+		complete_video(facefusion.globals.target_path, normed_output_path, start_time, clear_target_path_file_flag)
 	# 结束执行
 	process_manager.end()
+
+
+def complete_video(target_path: str, normed_output_path: str, start_time: float, clear_target_path_file_flag: bool, check_stopping: bool = True) -> None:
+	if not finalize_video(target_path, normed_output_path, start_time, check_stopping):
+		return
 	# 这里可能没有移动完成
 	# if facefusion.globals.shutdown:
 	# 	# 如果不是keep_temp需要循环检查临时文件是否移动完成,如果检查时间大于1小时则打印日志并强制关闭
@@ -717,9 +775,275 @@ def process_video(start_time: float) -> None:
 	# else:
 	# clear temp
 	logger.debug(wording.get('clearing_temp'), __name__.upper())
-	clear_temp(facefusion.globals.target_path)
+	clear_temp(target_path)
 	if clear_target_path_file_flag and not facefusion.globals.keep_temp:
-		os.remove(facefusion.globals.target_path)
+		os.remove(target_path)
+
+
+# 把视频按关键帧切分为多个片段,由多个进程并行处理后再拼接
+def process_segmented_video(start_time: float) -> None:
+	normed_output_path = normalize_output_path(facefusion.globals.target_path, facefusion.globals.output_path)
+	if analyse_video(facefusion.globals.target_path, facefusion.globals.trim_frame_start,
+					 facefusion.globals.trim_frame_end):
+		return
+	logger.debug(wording.get('clearing_temp'), __name__.upper())
+	clear_temp(facefusion.globals.target_path)
+	logger.debug(wording.get('creating_temp'), __name__.upper())
+	create_temp(facefusion.globals.target_path)
+	process_manager.start()
+	if not facefusion.globals.output_video_resolution:
+		facefusion.globals.output_video_resolution = pack_resolution(detect_video_resolution(facefusion.globals.target_path))
+	video_frame_total = count_video_frame_total(facefusion.globals.target_path)
+	trim_frame_start = facefusion.globals.trim_frame_start or 0
+	trim_frame_end = facefusion.globals.trim_frame_end or video_frame_total
+	segment_ranges = create_segment_ranges(trim_frame_start, trim_frame_end,
+										   detect_video_keyframes(facefusion.globals.target_path),
+										   facefusion.globals.video_segment_count)
+	logger.info(wording.get('processing_segments').format(segment_total=len(segment_ranges)), __name__.upper())
+	segment_paths = multi_process_segments(facefusion.globals.target_path, segment_ranges)
+	if segment_paths:
+		logger.debug(wording.get('processing_segments_succeed'), __name__.upper())
+	else:
+		if is_process_stopping():
+			return
+		logger.error(wording.get('processing_segments_failed'), __name__.upper())
+		return
+	if concat_video(facefusion.globals.target_path, segment_paths):
+		logger.debug(wording.get('merging_video_succeed'), __name__.upper())
+	else:
+		if is_process_stopping():
+			return
+		logger.error(wording.get('merging_video_failed'), __name__.upper())
+		return
+	if not finalize_video(facefusion.globals.target_path, normed_output_path, start_time):
+		return
+	process_manager.end()
+	logger.debug(wording.get('clearing_temp'), __name__.upper())
+	clear_temp(facefusion.globals.target_path)
+
+
+# 协调节点创建分片任务,自身也参与处理,全部完成后拼接并恢复音频
+def process_sharded_video(start_time: float) -> None:
+	normed_output_path = normalize_output_path(facefusion.globals.target_path, facefusion.globals.output_path)
+	if analyse_video(facefusion.globals.target_path, facefusion.globals.trim_frame_start,
+					 facefusion.globals.trim_frame_end):
+		return
+	video_frame_total = count_video_frame_total(facefusion.globals.target_path)
+	trim_frame_start = facefusion.globals.trim_frame_start or 0
+	trim_frame_end = facefusion.globals.trim_frame_end or video_frame_total
+	shard_ranges = create_segment_ranges(trim_frame_start, trim_frame_end,
+										 detect_video_keyframes(facefusion.globals.target_path),
+										 facefusion.globals.shard_count)
+	job_directory = create_shard_job(facefusion.globals.shard_directory, facefusion.globals.target_path, shard_ranges)
+	logger.info(wording.get('processing_shards').format(shard_total=len(shard_ranges)), __name__.upper())
+	if not run_shard_worker([ job_directory ]):
+		return
+	process_manager.start()
+	if not is_shard_job_done(job_directory):
+		logger.info(wording.get('waiting_for_shards'), __name__.upper())
+	while not is_shard_job_done(job_directory):
+		if is_process_stopping():
+			return
+		# 其它节点超时未续约的分片会被重新放回,由协调节点接手
+		if not run_shard_worker([ job_directory ]):
+			return
+		sleep(1)
+	create_temp(facefusion.globals.target_path)
+	if concat_video(facefusion.globals.target_path, get_shard_segment_paths(job_directory)):
+		logger.debug(wording.get('merging_video_succeed'), __name__.upper())
+	else:
+		if is_process_stopping():
+			return
+		logger.error(wording.get('merging_video_failed'), __name__.upper())
+		return
+	if not finalize_video(facefusion.globals.target_path, normed_output_path, start_time):
+		return
+	process_manager.end()
+	logger.debug(wording.get('clearing_temp'), __name__.upper())
+	clear_temp(facefusion.globals.target_path)
+	shutil.rmtree(job_directory, ignore_errors=True)
+
+
+# 循环认领并处理分片,没有待处理的分片时返回
+def run_shard_worker(job_directories: Optional[List[str]] = None) -> bool:
+	while True:
+		shard_claim = claim_shard(facefusion.globals.shard_directory, job_directories)
+		if not shard_claim:
+			return True
+		job_directory, shard = shard_claim
+		with keep_shard_claimed(job_directory, shard):
+			is_shard_processed = process_shard(job_directory, shard)
+		if is_shard_processed:
+			complete_shard(job_directory, shard)
+		else:
+			release_shard(job_directory, shard)
+			logger.error(wording.get('processing_shard_failed').format(shard_index=shard.get('index')), __name__.upper())
+			return False
+
+
+def process_shard(job_directory: str, shard: Shard) -> bool:
+	shard_job = read_shard_job(job_directory)
+	segment_path = get_shard_segment_path(job_directory, shard.get('index'))
+	globals_names = [ 'target_path', 'output_path', 'temp_dir', 'trim_frame_start', 'trim_frame_end', 'trim_frame_offset', 'skip_audio' ]
+	globals_values = { globals_name: getattr(facefusion.globals, globals_name) for globals_name in globals_names }
+
+	logger.info(wording.get('processing_shard').format(shard_index=shard.get('index'),
+													   trim_frame_start=shard.get('trim_frame_start'),
+													   trim_frame_end=shard.get('trim_frame_end')), __name__.upper())
+	# 分片使用本机的临时目录,只把编码后的片段写回共享目录
+	facefusion.globals.temp_dir = os.path.join(get_temp_directory_path(shard_job.get('target_path')), 'shards',
+											   str(shard.get('index')).zfill(4))
+	facefusion.globals.target_path = shard_job.get('target_path')
+	facefusion.globals.output_path = segment_path
+	facefusion.globals.trim_frame_start = shard.get('trim_frame_start')
+	facefusion.globals.trim_frame_end = shard.get('trim_frame_end')
+	# 音频与人脸跟踪按整个任务内的帧序号对齐
+	facefusion.globals.trim_frame_offset = shard.get('trim_frame_start') - shard_job.get('trim_frame_start', 0)
+	facefusion.globals.skip_audio = True
+	if globals_values.get('target_path') != facefusion.globals.target_path:
+		clear_reference_faces()
+		clear_static_faces()
+	try:
+		for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
+			if not frame_processor_module.pre_process('output'):
+				return False
+		conditional_append_reference_faces()
+		process_video(time())
+		return is_video(segment_path)
+	finally:
+		for globals_name, globals_value in globals_values.items():
+			setattr(facefusion.globals, globals_name, globals_value)
+
+
+# 处理音频并校验输出视频
+def finalize_video(target_path: str, normed_output_path: str, start_time: float, check_stopping: bool = True) -> bool:
+	# handle audio
+	if facefusion.globals.skip_audio:
+		logger.info(wording.get('skipping_audio'), __name__.upper())
+		move_temp(target_path, normed_output_path)
+	else:
+		if 'lip_syncer' in facefusion.globals.frame_processors:
+			source_audio_path = get_first(filter_audio_paths(facefusion.globals.source_paths))
+			if source_audio_path and replace_audio(target_path, source_audio_path,
+												   normed_output_path):
+				logger.debug(wording.get('restoring_audio_succeed'), __name__.upper())
+			else:
+				if check_stopping and is_process_stopping():
+					return False
+				logger.warn(wording.get('restoring_audio_skipped'), __name__.upper())
+				move_temp(target_path, normed_output_path)
+		else:
+			# 这里没有拿进度导致会提前关闭
+			if restore_audio(target_path, normed_output_path, facefusion.globals.output_video_fps):
+				logger.debug(wording.get('restoring_audio_succeed'), __name__.upper())
+			else:
+				if check_stopping and is_process_stopping():
+					return False
+				logger.warn(wording.get('restoring_audio_skipped'), __name__.upper())
+				move_temp(target_path, normed_output_path)
+	# validate video
+	if is_video(normed_output_path):
+		seconds = '{:.2f}'.format((time() - start_time))
+		logger.info(wording.get('processing_video_succeed').format(seconds=seconds), __name__.upper())
+		conditional_log_statistics()
+	else:
+		logger.error(wording.get('processing_video_failed'), __name__.upper())
+	return True
+
+
+# 提取帧到临时目录,逐个处理器处理后再合并视频
+def process_video_frames(temp_video_resolution: str, temp_video_fps: Fps) -> bool:
+	logger.info(wording.get('extracting_frames').format(resolution=temp_video_resolution, fps=temp_video_fps),
+				__name__.upper())
+	if is_frames_prefetched(facefusion.globals.target_path):
+		is_extracted = wait_prefetched_frames(facefusion.globals.target_path) or extract_frames(facefusion.globals.target_path, temp_video_resolution, temp_video_fps)
+	else:
+		is_extracted = extract_frames(facefusion.globals.target_path, temp_video_resolution, temp_video_fps)
+	if is_extracted:
+		logger.debug(wording.get('extracting_frames_succeed'), __name__.upper())
+	else:
+		if is_process_stopping():
+			return False
+		logger.error(wording.get('extracting_frames_failed'), __name__.upper())
+		return False
+	# process frames
+	temp_frame_paths = get_temp_frame_paths(facefusion.globals.target_path)
+	register_frame_numbers(temp_frame_paths, get_frame_number_offset(temp_video_fps))
+	if temp_frame_paths:
+		# 近似重复帧不参与处理,处理完成后复用代表帧的输出
+		duplicate_frame_paths = create_duplicate_frame_paths(temp_frame_paths)
+		if duplicate_frame_paths:
+			logger.info(wording.get('skipping_duplicate_frames').format(frame_total=len(duplicate_frame_paths)), __name__.upper())
+			temp_frame_paths = [temp_frame_path for temp_frame_path in temp_frame_paths if temp_frame_path not in duplicate_frame_paths]
+		# 没有人脸的帧不读取、不处理、不写入
+		empty_frame_paths = create_empty_frame_paths(temp_frame_paths)
+		if empty_frame_paths:
+			logger.info(wording.get('skipping_empty_frames').format(frame_total=len(empty_frame_paths)), __name__.upper())
+			empty_frame_path_set = set(empty_frame_paths)
+			temp_frame_paths = [temp_frame_path for temp_frame_path in temp_frame_paths if temp_frame_path not in empty_frame_path_set]
+		if facefusion.globals.execution_backend == 'process':
+			logger.info(wording.get('processing'), __name__.upper())
+			multi_process_pool_frames(facefusion.globals.source_paths, temp_frame_paths)
+			for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
+				frame_processor_module.post_process()
+		# strict模式下逐个处理器运行,处理完即释放模型
+		elif facefusion.globals.video_memory_strategy == 'strict':
+			for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
+				logger.info(wording.get('processing'), frame_processor_module.NAME)
+				# 模型处理视频帧
+				new_temp_frame_paths = frame_processor_module.process_video(facefusion.globals.source_paths,
+																			temp_frame_paths)
+				if new_temp_frame_paths:
+					temp_frame_paths = new_temp_frame_paths
+				frame_processor_module.post_process()
+		else:
+			logger.info(wording.get('processing'), __name__.upper())
+			multi_process_fused_frames(facefusion.globals.source_paths, temp_frame_paths)
+			for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
+				frame_processor_module.post_process()
+		if is_process_stopping():
+			return False
+		copy_empty_frames(facefusion.globals.target_path, empty_frame_paths)
+		copy_duplicate_frames(facefusion.globals.target_path, duplicate_frame_paths)
+	else:
+		logger.error(wording.get('temp_frames_not_found'), __name__.upper())
+		return False
+	# merge video
+	logger.info(wording.get('merging_video').format(resolution=facefusion.globals.output_video_resolution,
+													fps=facefusion.globals.output_video_fps), __name__.upper())
+	if merge_video(facefusion.globals.target_path, facefusion.globals.output_video_resolution,
+				   facefusion.globals.output_video_fps):
+		logger.debug(wording.get('merging_video_succeed'), __name__.upper())
+		# 合并完成后记录不再需要,保留临时帧时也不会被下次任务误用
+		clear_frame_journal(facefusion.globals.target_path)
+	else:
+		if is_process_stopping():
+			return False
+		logger.error(wording.get('merging_video_failed'), __name__.upper())
+		return False
+	return True
+
+
+# 在内存中解码、处理并编码视频帧,不写入临时帧
+def stream_video_frames(temp_video_resolution: str, temp_video_fps: Fps) -> bool:
+	logger.info(wording.get('streaming_frames').format(resolution=temp_video_resolution, fps=temp_video_fps),
+				__name__.upper())
+	if facefusion.globals.execution_backend == 'process':
+		is_streamed = multi_process_pool_stream(facefusion.globals.source_paths, facefusion.globals.target_path,
+												temp_video_resolution, temp_video_fps)
+	else:
+		is_streamed = multi_process_stream(facefusion.globals.source_paths, facefusion.globals.target_path,
+										   temp_video_resolution, temp_video_fps)
+	if is_streamed:
+		logger.debug(wording.get('streaming_frames_succeed'), __name__.upper())
+	else:
+		if is_process_stopping():
+			return False
+		logger.error(wording.get('streaming_frames_failed'), __name__.upper())
+		return False
+	for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
+		frame_processor_module.post_process()
+	return not is_process_stopping()
 
 
 def is_process_stopping() -> bool:
@@ -1,22 +1,30 @@
-from typing import Any, Optional, List, Tuple
+from typing import Any, Callable, Dict, Optional, List, Sequence, Tuple
+import threading
+from functools import partial
 from time import sleep
 import cv2
 import numpy
-import onnxruntime
 
+import facefusion.choices
 import facefusion.globals
 from facefusion import process_manager
 from facefusion.common_helper import get_first
 from facefusion.face_helper import estimate_matrix_by_face_landmark_5, warp_face_by_face_landmark_5, warp_face_by_translation, create_static_anchors, distance_to_face_landmark_5, distance_to_bounding_box, convert_face_landmark_68_to_5, apply_nms, categorize_age, categorize_gender
+from facefusion.face_cache import read_cached_faces, write_cached_faces, create_source_key, read_source_face, write_source_face
+from facefusion.face_index import get_face_index, search_face_index
 from facefusion.face_store import get_static_faces, set_static_faces
-from facefusion.execution import apply_execution_provider_options
+from facefusion.face_tracker import track_faces, set_face_track
+from facefusion.inference_manager import get_inference_session, clear_inference_sessions
 from facefusion.download import conditional_download
-from facefusion.filesystem import resolve_relative_path, is_file
+from facefusion.filesystem import resolve_relative_path, is_file, filter_image_paths
+from facefusion.processors.frame import globals as frame_processors_globals
 from facefusion.thread_helper import thread_lock, thread_semaphore, conditional_thread_semaphore
-from facefusion.typing import VisionFrame, Face, FaceSet, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, ModelSet, BoundingBox, FaceLandmarkSet, FaceLandmark5, FaceLandmark68, Score, FaceScoreSet, Embedding
-from facefusion.vision import resize_frame_resolution, unpack_resolution
+from facefusion.typing import VisionFrame, Face, FaceSet, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, ModelSet, FaceDetectorModel, BoundingBox, FaceLandmarkSet, FaceLandmark5, FaceLandmark68, Score, FaceScoreSet, Embedding, FaceDetection, FaceAttribute, LazyFaceValue, LazyEmbedding, LazyGenderAge
+from facefusion.vision import read_static_images, resize_frame_resolution, unpack_resolution
 
-FACE_ANALYSER = None
+FACE_ANALYSER : Dict[str, Any] = {}
+SOURCE_FACES : Dict[str, Optional[Face]] = {}
+SOURCE_FACE_LOCK : threading.Lock = threading.Lock()
 MODELS : ModelSet =\
 {
 	'face_detector_retinaface':
@@ -77,49 +85,82 @@ MODELS : ModelSet =\
 }
 
 
+# 预加载当前设置需要的模型,其余模型在首次使用时加载
 def get_face_analyser() -> Any:
-	global FACE_ANALYSER
-
-	face_detectors = {}
-	face_landmarkers = {}
-
-	with thread_lock():
-		while process_manager.is_checking():
-			sleep(0.5)
-		if FACE_ANALYSER is None:
-			if facefusion.globals.face_detector_model in [ 'many', 'retinaface' ]:
-				face_detectors['retinaface'] = onnxruntime.InferenceSession(MODELS.get('face_detector_retinaface').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			if facefusion.globals.face_detector_model in [ 'many', 'scrfd' ]:
-				face_detectors['scrfd'] = onnxruntime.InferenceSession(MODELS.get('face_detector_scrfd').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			if facefusion.globals.face_detector_model in [ 'many', 'yoloface' ]:
-				face_detectors['yoloface'] = onnxruntime.InferenceSession(MODELS.get('face_detector_yoloface').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			if facefusion.globals.face_detector_model in [ 'yunet' ]:
-				face_detectors['yunet'] = cv2.FaceDetectorYN.create(MODELS.get('face_detector_yunet').get('path'), '', (0, 0))
-			if facefusion.globals.face_recognizer_model == 'arcface_blendswap':
-				face_recognizer = onnxruntime.InferenceSession(MODELS.get('face_recognizer_arcface_blendswap').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			if facefusion.globals.face_recognizer_model == 'arcface_inswapper':
-				face_recognizer = onnxruntime.InferenceSession(MODELS.get('face_recognizer_arcface_inswapper').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			if facefusion.globals.face_recognizer_model == 'arcface_simswap':
-				face_recognizer = onnxruntime.InferenceSession(MODELS.get('face_recognizer_arcface_simswap').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			if facefusion.globals.face_recognizer_model == 'arcface_uniface':
-				face_recognizer = onnxruntime.InferenceSession(MODELS.get('face_recognizer_arcface_uniface').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			face_landmarkers['68'] = onnxruntime.InferenceSession(MODELS.get('face_landmarker_68').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			face_landmarkers['68_5'] = onnxruntime.InferenceSession(MODELS.get('face_landmarker_68_5').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			gender_age = onnxruntime.InferenceSession(MODELS.get('gender_age').get('path'), providers = apply_execution_provider_options(facefusion.globals.execution_providers))
-			FACE_ANALYSER =\
-			{
-				'face_detectors': face_detectors,
-				'face_recognizer': face_recognizer,
-				'face_landmarkers': face_landmarkers,
-				'gender_age': gender_age
-			}
+	model_keys = [ 'face_landmarker_68', 'face_landmarker_68_5' ]
+	face_attributes = get_face_attributes()
+
+	if facefusion.globals.face_detector_model in [ 'many', 'retinaface' ]:
+		model_keys.append('face_detector_retinaface')
+	if facefusion.globals.face_detector_model in [ 'many', 'scrfd' ]:
+		model_keys.append('face_detector_scrfd')
+	if facefusion.globals.face_detector_model in [ 'many', 'yoloface' ]:
+		model_keys.append('face_detector_yoloface')
+	if facefusion.globals.face_detector_model in [ 'yunet' ]:
+		model_keys.append('face_detector_yunet')
+	if 'embedding' in face_attributes:
+		model_keys.append('face_recognizer_' + facefusion.globals.face_recognizer_model)
+	if 'gender_age' in face_attributes:
+		model_keys.append('gender_age')
+	for model_key in model_keys:
+		get_face_analyser_model(model_key)
 	return FACE_ANALYSER
 
 
+# 模型已加载时直接返回,只有首次加载才会竞争全局锁
+def get_face_analyser_model(model_key : str) -> Any:
+	face_analyser_model = FACE_ANALYSER.get(model_key)
+
+	if face_analyser_model is None:
+		with thread_lock():
+			while process_manager.is_checking():
+				sleep(0.5)
+			if model_key not in FACE_ANALYSER:
+				model_path = MODELS.get(model_key).get('path')
+				if model_key == 'face_detector_yunet':
+					FACE_ANALYSER[model_key] = cv2.FaceDetectorYN.create(model_path, '', (0, 0))
+				else:
+					FACE_ANALYSER[model_key] = get_inference_session(model_path)
+			face_analyser_model = FACE_ANALYSER.get(model_key)
+	return face_analyser_model
+
+
+def get_face_detector(face_detector_model : FaceDetectorModel) -> Any:
+	return get_face_analyser_model('face_detector_' + face_detector_model)
+
+
+def get_face_landmarker(face_landmarker_model : str) -> Any:
+	return get_face_analyser_model('face_landmarker_' + face_landmarker_model)
+
+
+def get_face_recognizer() -> Any:
+	return get_face_analyser_model('face_recognizer_' + facefusion.globals.face_recognizer_model)
+
+
+def get_gender_age() -> Any:
+	return get_face_analyser_model('gender_age')
+
+
+# 选择模式、过滤条件和处理器用到的属性在创建人脸时批量计算,其余属性首次访问时才计算
+def get_face_attributes() -> List[FaceAttribute]:
+	face_attributes : List[FaceAttribute] = []
+	face_debugger_items = frame_processors_globals.face_debugger_items or []
+
+	if facefusion.globals.face_selector_mode == 'reference':
+		face_attributes.append('embedding')
+	if facefusion.globals.face_analyser_age or facefusion.globals.face_analyser_gender:
+		face_attributes.append('gender_age')
+	elif 'face_debugger' in (facefusion.globals.frame_processors or []) and ('age' in face_debugger_items or 'gender' in face_debugger_items):
+		face_attributes.append('gender_age')
+	return face_attributes
+
+
 def clear_face_analyser() -> Any:
-	global FACE_ANALYSER
+	model_paths = [ MODELS.get(model_key).get('path') for model_key in FACE_ANALYSER ]
 
-	FACE_ANALYSER = None
+	FACE_ANALYSER.clear()
+	SOURCE_FACES.clear()
+	clear_inference_sessions(model_paths)
 
 
 def pre_check() -> bool:
@@ -169,50 +210,18 @@ def pre_check() -> bool:
 	return all(is_file(model_path) for model_path in model_paths)
 
 
-def detect_with_retinaface(vision_frame : VisionFrame, face_detector_size : str) -> Tuple[List[BoundingBox], List[FaceLandmark5], List[Score]]:
-	face_detector = get_face_analyser().get('face_detectors').get('retinaface')
-	face_detector_width, face_detector_height = unpack_resolution(face_detector_size)
-	temp_vision_frame = resize_frame_resolution(vision_frame, (face_detector_width, face_detector_height))
-	ratio_height = vision_frame.shape[0] / temp_vision_frame.shape[0]
-	ratio_width = vision_frame.shape[1] / temp_vision_frame.shape[1]
-	feature_strides = [ 8, 16, 32 ]
-	feature_map_channel = 3
-	anchor_total = 2
-	bounding_box_list = []
-	face_landmark_5_list = []
-	score_list = []
+def detect_with_retinaface(vision_frame : VisionFrame, face_detector_size : str) -> FaceDetection:
+	face_detector = get_face_detector('retinaface')
+	return detect_with_anchors(face_detector, vision_frame, face_detector_size)
 
-	detect_vision_frame = prepare_detect_frame(temp_vision_frame, face_detector_size)
-	with thread_semaphore():
-		detections = face_detector.run(None,
-		{
-			face_detector.get_inputs()[0].name: detect_vision_frame
-		})
-	for index, feature_stride in enumerate(feature_strides):
-		keep_indices = numpy.where(detections[index] >= facefusion.globals.face_detector_score)[0]
-		if keep_indices.any():
-			stride_height = face_detector_height // feature_stride
-			stride_width = face_detector_width // feature_stride
-			anchors = create_static_anchors(feature_stride, anchor_total, stride_height, stride_width)
-			bounding_box_raw = detections[index + feature_map_channel] * feature_stride
-			face_landmark_5_raw = detections[index + feature_map_channel * 2] * feature_stride
-			for bounding_box in distance_to_bounding_box(anchors, bounding_box_raw)[keep_indices]:
-				bounding_box_list.append(numpy.array(
-				[
-					bounding_box[0] * ratio_width,
-					bounding_box[1] * ratio_height,
-					bounding_box[2] * ratio_width,
-					bounding_box[3] * ratio_height
-				]))
-			for face_landmark_5 in distance_to_face_landmark_5(anchors, face_landmark_5_raw)[keep_indices]:
-				face_landmark_5_list.append(face_landmark_5 * [ ratio_width, ratio_height ])
-			for score in detections[index][keep_indices]:
-				score_list.append(score[0])
-	return bounding_box_list, face_landmark_5_list, score_list
-
-
-def detect_with_scrfd(vision_frame : VisionFrame, face_detector_size : str) -> Tuple[List[BoundingBox], List[FaceLandmark5], List[Score]]:
-	face_detector = get_face_analyser().get('face_detectors').get('scrfd')
+
+def detect_with_scrfd(vision_frame : VisionFrame, face_detector_size : str) -> FaceDetection:
+	face_detector = get_face_detector('scrfd')
+	return detect_with_anchors(face_detector, vision_frame, face_detector_size)
+
+
+# retinaface与scrfd的输出结构相同,按锚点解码
+def detect_with_anchors(face_detector : Any, vision_frame : VisionFrame, face_detector_size : str) -> FaceDetection:
 	face_detector_width, face_detector_height = unpack_resolution(face_detector_size)
 	temp_vision_frame = resize_frame_resolution(vision_frame, (face_detector_width, face_detector_height))
 	ratio_height = vision_frame.shape[0] / temp_vision_frame.shape[0]
@@ -220,102 +229,76 @@ def detect_with_scrfd(vision_frame : VisionFrame, face_detector_size : str) -> T
 	feature_strides = [ 8, 16, 32 ]
 	feature_map_channel = 3
 	anchor_total = 2
-	bounding_box_list = []
-	face_landmark_5_list = []
-	score_list = []
+	bounding_boxes = [ numpy.empty((0, 4)) ]
+	face_landmarks_5 = [ numpy.empty((0, 5, 2)) ]
+	scores = [ numpy.empty(0) ]
 
 	detect_vision_frame = prepare_detect_frame(temp_vision_frame, face_detector_size)
-	with thread_semaphore():
+	with conditional_thread_semaphore(facefusion.globals.execution_providers):
 		detections = face_detector.run(None,
 		{
 			face_detector.get_inputs()[0].name: detect_vision_frame
 		})
 	for index, feature_stride in enumerate(feature_strides):
-		keep_indices = numpy.where(detections[index] >= facefusion.globals.face_detector_score)[0]
-		if keep_indices.any():
+		keep_indices = numpy.where(detections[index][:, 0] >= facefusion.globals.face_detector_score)[0]
+		if keep_indices.size:
 			stride_height = face_detector_height // feature_stride
 			stride_width = face_detector_width // feature_stride
-			anchors = create_static_anchors(feature_stride, anchor_total, stride_height, stride_width)
-			bounding_box_raw = detections[index + feature_map_channel] * feature_stride
-			face_landmark_5_raw = detections[index + feature_map_channel * 2] * feature_stride
-			for bounding_box in distance_to_bounding_box(anchors, bounding_box_raw)[keep_indices]:
-				bounding_box_list.append(numpy.array(
-				[
-					bounding_box[0] * ratio_width,
-					bounding_box[1] * ratio_height,
-					bounding_box[2] * ratio_width,
-					bounding_box[3] * ratio_height
-				]))
-			for face_landmark_5 in distance_to_face_landmark_5(anchors, face_landmark_5_raw)[keep_indices]:
-				face_landmark_5_list.append(face_landmark_5 * [ ratio_width, ratio_height ])
-			for score in detections[index][keep_indices]:
-				score_list.append(score[0])
-	return bounding_box_list, face_landmark_5_list, score_list
-
-
-def detect_with_yoloface(vision_frame : VisionFrame, face_detector_size : str) -> Tuple[List[BoundingBox], List[FaceLandmark5], List[Score]]:
-	face_detector = get_face_analyser().get('face_detectors').get('yoloface')
+			anchors = create_static_anchors(feature_stride, anchor_total, stride_height, stride_width)[keep_indices]
+			bounding_box_raw = detections[index + feature_map_channel][keep_indices] * feature_stride
+			face_landmark_5_raw = detections[index + feature_map_channel * 2][keep_indices] * feature_stride
+			bounding_boxes.append(distance_to_bounding_box(anchors, bounding_box_raw) * [ ratio_width, ratio_height, ratio_width, ratio_height ])
+			face_landmarks_5.append(distance_to_face_landmark_5(anchors, face_landmark_5_raw) * [ ratio_width, ratio_height ])
+			scores.append(detections[index][keep_indices, 0])
+	return numpy.concatenate(bounding_boxes), numpy.concatenate(face_landmarks_5), numpy.concatenate(scores)
+
+
+def detect_with_yoloface(vision_frame : VisionFrame, face_detector_size : str) -> FaceDetection:
+	face_detector = get_face_detector('yoloface')
 	face_detector_width, face_detector_height = unpack_resolution(face_detector_size)
 	temp_vision_frame = resize_frame_resolution(vision_frame, (face_detector_width, face_detector_height))
 	ratio_height = vision_frame.shape[0] / temp_vision_frame.shape[0]
 	ratio_width = vision_frame.shape[1] / temp_vision_frame.shape[1]
-	bounding_box_list = []
-	face_landmark_5_list = []
-	score_list = []
 
 	detect_vision_frame = prepare_detect_frame(temp_vision_frame, face_detector_size)
-	with thread_semaphore():
+	with conditional_thread_semaphore(facefusion.globals.execution_providers):
 		detections = face_detector.run(None,
 		{
 			face_detector.get_inputs()[0].name: detect_vision_frame
 		})
 	detections = numpy.squeeze(detections).T
 	bounding_box_raw, score_raw, face_landmark_5_raw = numpy.split(detections, [ 4, 5 ], axis = 1)
-	keep_indices = numpy.where(score_raw > facefusion.globals.face_detector_score)[0]
-	if keep_indices.any():
-		bounding_box_raw, face_landmark_5_raw, score_raw = bounding_box_raw[keep_indices], face_landmark_5_raw[keep_indices], score_raw[keep_indices]
-		for bounding_box in bounding_box_raw:
-			bounding_box_list.append(numpy.array(
-			[
-				(bounding_box[0] - bounding_box[2] / 2) * ratio_width,
-				(bounding_box[1] - bounding_box[3] / 2) * ratio_height,
-				(bounding_box[0] + bounding_box[2] / 2) * ratio_width,
-				(bounding_box[1] + bounding_box[3] / 2) * ratio_height
-			]))
-		face_landmark_5_raw[:, 0::3] = (face_landmark_5_raw[:, 0::3]) * ratio_width
-		face_landmark_5_raw[:, 1::3] = (face_landmark_5_raw[:, 1::3]) * ratio_height
-		for face_landmark_5 in face_landmark_5_raw:
-			face_landmark_5_list.append(numpy.array(face_landmark_5.reshape(-1, 3)[:, :2]))
-		score_list = score_raw.ravel().tolist()
-	return bounding_box_list, face_landmark_5_list, score_list
-
-
-def detect_with_yunet(vision_frame : VisionFrame, face_detector_size : str) -> Tuple[List[BoundingBox], List[FaceLandmark5], List[Score]]:
-	face_detector = get_face_analyser().get('face_detectors').get('yunet')
+	keep_indices = numpy.where(score_raw[:, 0] > facefusion.globals.face_detector_score)[0]
+	bounding_box_raw, face_landmark_5_raw, score_raw = bounding_box_raw[keep_indices], face_landmark_5_raw[keep_indices], score_raw[keep_indices]
+	bounding_boxes = numpy.column_stack(
+	[
+		bounding_box_raw[:, :2] - bounding_box_raw[:, 2:] / 2,
+		bounding_box_raw[:, :2] + bounding_box_raw[:, 2:] / 2
+	]) * [ ratio_width, ratio_height, ratio_width, ratio_height ]
+	face_landmarks_5 = face_landmark_5_raw.reshape(-1, 5, 3)[:, :, :2] * [ ratio_width, ratio_height ]
+	return bounding_boxes, face_landmarks_5, score_raw.ravel()
+
+
+def detect_with_yunet(vision_frame : VisionFrame, face_detector_size : str) -> FaceDetection:
+	face_detector = get_face_detector('yunet')
 	face_detector_width, face_detector_height = unpack_resolution(face_detector_size)
 	temp_vision_frame = resize_frame_resolution(vision_frame, (face_detector_width, face_detector_height))
 	ratio_height = vision_frame.shape[0] / temp_vision_frame.shape[0]
 	ratio_width = vision_frame.shape[1] / temp_vision_frame.shape[1]
-	bounding_box_list = []
-	face_landmark_5_list = []
-	score_list = []
 
 	face_detector.setInputSize((temp_vision_frame.shape[1], temp_vision_frame.shape[0]))
 	face_detector.setScoreThreshold(facefusion.globals.face_detector_score)
 	with thread_semaphore():
 		_, detections = face_detector.detect(temp_vision_frame)
-	if numpy.any(detections):
-		for detection in detections:
-			bounding_box_list.append(numpy.array(
-			[
-				detection[0] * ratio_width,
-				detection[1] * ratio_height,
-				(detection[0] + detection[2]) * ratio_width,
-				(detection[1] + detection[3]) * ratio_height
-			]))
-			face_landmark_5_list.append(detection[4:14].reshape((5, 2)) * [ ratio_width, ratio_height ])
-			score_list.append(detection[14])
-	return bounding_box_list, face_landmark_5_list, score_list
+	if detections is None:
+		detections = numpy.empty((0, 15))
+	bounding_boxes = numpy.column_stack(
+	[
+		detections[:, :2],
+		detections[:, :2] + detections[:, 2:4]
+	]) * [ ratio_width, ratio_height, ratio_width, ratio_height ]
+	face_landmarks_5 = detections[:, 4:14].reshape(-1, 5, 2) * [ ratio_width, ratio_height ]
+	return bounding_boxes, face_landmarks_5, detections[:, 14]
 
 
 def prepare_detect_frame(temp_vision_frame : VisionFrame, face_detector_size : str) -> VisionFrame:
@@ -327,120 +310,240 @@ def prepare_detect_frame(temp_vision_frame : VisionFrame, face_detector_size : s
 	return detect_vision_frame
 
 
-def create_faces(vision_frame : VisionFrame, bounding_box_list : List[BoundingBox], face_landmark_5_list : List[FaceLandmark5], score_list : List[Score]) -> List[Face]:
+# 用较小的检测尺寸快速判断画面中是否有人脸,不做后续分析
+def detect_face_presence(vision_frame : VisionFrame) -> bool:
+	face_detector_model = 'scrfd' if facefusion.globals.face_detector_model == 'many' else facefusion.globals.face_detector_model
+	face_detector_size = '320x320' if '320x320' in facefusion.choices.face_detector_set.get(face_detector_model) else facefusion.globals.face_detector_size
+	bounding_boxes = numpy.empty((0, 4))
+
+	if face_detector_model == 'retinaface':
+		bounding_boxes, _, _ = detect_with_retinaface(vision_frame, face_detector_size)
+	if face_detector_model == 'scrfd':
+		bounding_boxes, _, _ = detect_with_scrfd(vision_frame, face_detector_size)
+	if face_detector_model == 'yoloface':
+		bounding_boxes, _, _ = detect_with_yoloface(vision_frame, face_detector_size)
+	if face_detector_model == 'yunet':
+		bounding_boxes, _, _ = detect_with_yunet(vision_frame, face_detector_size)
+	return len(bounding_boxes) > 0
+
+
+# 传入的检测结果已按分数降序并完成NMS
+def create_faces(vision_frame : VisionFrame, bounding_boxes : BoundingBox, face_landmarks_5 : FaceLandmark5, detector_scores : numpy.ndarray[Any, Any]) -> List[Face]:
 	faces = []
-	if facefusion.globals.face_detector_score > 0:
-		sort_indices = numpy.argsort(-numpy.array(score_list))
-		bounding_box_list = [ bounding_box_list[index] for index in sort_indices ]
-		face_landmark_5_list = [face_landmark_5_list[index] for index in sort_indices]
-		score_list = [ score_list[index] for index in sort_indices ]
-		iou_threshold = 0.1 if facefusion.globals.face_detector_model == 'many' else 0.4
-		keep_indices = apply_nms(bounding_box_list, iou_threshold)
-		for index in keep_indices:
-			bounding_box = bounding_box_list[index]
-			face_landmark_5_68 = face_landmark_5_list[index]
-			face_landmark_68_5 = expand_face_landmark_68_from_5(face_landmark_5_68)
-			face_landmark_68 = face_landmark_68_5
-			face_landmark_68_score = 0.0
-			if facefusion.globals.face_landmarker_score > 0:
-				face_landmark_68, face_landmark_68_score = detect_face_landmark_68(vision_frame, bounding_box)
-				if face_landmark_68_score > facefusion.globals.face_landmarker_score:
-					face_landmark_5_68 = convert_face_landmark_68_to_5(face_landmark_68)
+	bounding_box_list = list(bounding_boxes)
+	face_landmark_5_list = list(face_landmarks_5)
+	score_list = detector_scores.tolist()
+	if bounding_box_list:
+		# 同一帧的所有人脸一次推理,避免逐个调用模型
+		face_landmark_68_5_list = expand_face_landmarks_68_from_5(face_landmark_5_list)
+		face_landmark_68_list = face_landmark_68_5_list
+		face_landmark_68_score_list = [ 0.0 ] * len(bounding_box_list)
+		if facefusion.globals.face_landmarker_score > 0:
+			face_landmark_68_list, face_landmark_68_score_list = detect_face_landmarks_68(vision_frame, bounding_box_list)
+		face_landmark_5_68_list = []
+		for face_landmark_5, face_landmark_68, face_landmark_68_score in zip(face_landmark_5_list, face_landmark_68_list, face_landmark_68_score_list):
+			if face_landmark_68_score > facefusion.globals.face_landmarker_score:
+				face_landmark_5_68_list.append(convert_face_landmark_68_to_5(face_landmark_68))
+			else:
+				face_landmark_5_68_list.append(face_landmark_5)
+		face_attributes = get_face_attributes()
+		embedding_list : Sequence[LazyEmbedding]
+		normed_embedding_list : Sequence[LazyEmbedding]
+		gender_age_list : Sequence[LazyGenderAge]
+		if 'embedding' in face_attributes:
+			embedding_list, normed_embedding_list = calc_embeddings(vision_frame, face_landmark_5_68_list)
+		else:
+			embedding_list, normed_embedding_list = create_lazy_embeddings(vision_frame, face_landmark_5_68_list)
+		if 'gender_age' in face_attributes:
+			gender_age_list = detect_genders_ages(vision_frame, bounding_box_list)
+		else:
+			gender_age_list = create_lazy_genders_ages(vision_frame, bounding_box_list)
+		for index, bounding_box in enumerate(bounding_box_list):
 			landmarks : FaceLandmarkSet =\
 			{
 				'5': face_landmark_5_list[index],
-				'5/68': face_landmark_5_68,
-				'68': face_landmark_68,
-				'68/5': face_landmark_68_5
+				'5/68': face_landmark_5_68_list[index],
+				'68': face_landmark_68_list[index],
+				'68/5': face_landmark_68_5_list[index]
 			}
 			scores : FaceScoreSet = \
 			{
 				'detector': score_list[index],
-				'landmarker': face_landmark_68_score
+				'landmarker': face_landmark_68_score_list[index]
 			}
-			embedding, normed_embedding = calc_embedding(vision_frame, landmarks.get('5/68'))
-			gender, age = detect_gender_age(vision_frame, bounding_box)
+			gender, age = gender_age_list[index]
 			faces.append(Face(
 				bounding_box = bounding_box,
 				landmarks = landmarks,
 				scores = scores,
-				embedding = embedding,
-				normed_embedding = normed_embedding,
+				embedding = embedding_list[index],
+				normed_embedding = normed_embedding_list[index],
 				gender = gender,
 				age = age
 			))
 	return faces
 
 
-def calc_embedding(temp_vision_frame : VisionFrame, face_landmark_5 : FaceLandmark5) -> Tuple[Embedding, Embedding]:
-	face_recognizer = get_face_analyser().get('face_recognizer')
-	crop_vision_frame, matrix = warp_face_by_face_landmark_5(temp_vision_frame, face_landmark_5, 'arcface_112_v2', (112, 112))
-	crop_vision_frame = crop_vision_frame / 127.5 - 1
-	crop_vision_frame = crop_vision_frame[:, :, ::-1].transpose(2, 0, 1).astype(numpy.float32)
-	crop_vision_frame = numpy.expand_dims(crop_vision_frame, axis = 0)
+# 模型的批次维度为动态时一次推理整批,固定批次的模型逐个推理后拼接
+def run_batch(inference_session : Any, input_batch : numpy.ndarray[Any, Any]) -> List[numpy.ndarray[Any, Any]]:
+	input_name = inference_session.get_inputs()[0].name
 	with conditional_thread_semaphore(facefusion.globals.execution_providers):
-		embedding = face_recognizer.run(None,
-		{
-			face_recognizer.get_inputs()[0].name: crop_vision_frame
-		})[0]
-	embedding = embedding.ravel()
-	normed_embedding = embedding / numpy.linalg.norm(embedding)
-	return embedding, normed_embedding
+		if is_batch_supported(inference_session):
+			return inference_session.run(None,
+			{
+				input_name: input_batch
+			})
+		output_batches = []
+		for input_item in input_batch:
+			output_batches.append(inference_session.run(None,
+			{
+				input_name: input_item[numpy.newaxis]
+			}))
+	return [ numpy.concatenate(outputs, axis = 0) for outputs in zip(*output_batches) ]
+
+
+def is_batch_supported(inference_session : Any) -> bool:
+	batch_dimension = inference_session.get_inputs()[0].shape[0]
+	return not isinstance(batch_dimension, int) or batch_dimension < 1
+
+
+def calc_embedding(temp_vision_frame : VisionFrame, face_landmark_5 : FaceLandmark5) -> Tuple[Embedding, Embedding]:
+	embedding_list, normed_embedding_list = calc_embeddings(temp_vision_frame, [ face_landmark_5 ])
+	return embedding_list[0], normed_embedding_list[0]
+
+
+def calc_embeddings(temp_vision_frame : VisionFrame, face_landmark_5_list : List[FaceLandmark5]) -> Tuple[List[Embedding], List[Embedding]]:
+	crop_vision_frames = [ prepare_recognizer_frame(temp_vision_frame, face_landmark_5) for face_landmark_5 in face_landmark_5_list ]
+	return forward_embeddings(crop_vision_frames)
+
+
+# 延迟求值时只保留裁剪后的小图,不持有整帧
+def create_lazy_embeddings(temp_vision_frame : VisionFrame, face_landmark_5_list : List[FaceLandmark5]) -> Tuple[List[LazyFaceValue], List[LazyFaceValue]]:
+	embedding_list = []
+	normed_embedding_list = []
+
+	for face_landmark_5 in face_landmark_5_list:
+		embedding_value = LazyFaceValue(partial(forward_embeddings, [ prepare_recognizer_frame(temp_vision_frame, face_landmark_5) ]))
+		embedding_list.append(LazyFaceValue(create_embedding_loader(embedding_value, 0)))
+		normed_embedding_list.append(LazyFaceValue(create_embedding_loader(embedding_value, 1)))
+	return embedding_list, normed_embedding_list
+
+
+def create_embedding_loader(embedding_value : LazyFaceValue, index : int) -> Callable[[], Embedding]:
+	return lambda : embedding_value.resolve()[index][0]
+
+
+def prepare_recognizer_frame(temp_vision_frame : VisionFrame, face_landmark_5 : FaceLandmark5) -> VisionFrame:
+	crop_vision_frame, _ = warp_face_by_face_landmark_5(temp_vision_frame, face_landmark_5, 'arcface_112_v2', (112, 112))
+	return crop_vision_frame
+
+
+def forward_embeddings(crop_vision_frames : List[VisionFrame]) -> Tuple[List[Embedding], List[Embedding]]:
+	face_recognizer = get_face_recognizer()
+	crop_vision_batch = (numpy.stack(crop_vision_frames) / 127.5 - 1)[:, :, :, ::-1].transpose(0, 3, 1, 2).astype(numpy.float32)
+	embeddings = run_batch(face_recognizer, crop_vision_batch)[0]
+	embeddings = embeddings.reshape(len(crop_vision_frames), -1)
+	normed_embeddings = embeddings / numpy.linalg.norm(embeddings, axis = 1, keepdims = True)
+	return list(embeddings), list(normed_embeddings)
 
 
 def detect_face_landmark_68(temp_vision_frame : VisionFrame, bounding_box : BoundingBox) -> Tuple[FaceLandmark68, Score]:
-	face_landmarker = get_face_analyser().get('face_landmarkers').get('68')
-	scale = 195 / numpy.subtract(bounding_box[2:], bounding_box[:2]).max()
-	translation = (256 - numpy.add(bounding_box[2:], bounding_box[:2]) * scale) * 0.5
-	crop_vision_frame, affine_matrix = warp_face_by_translation(temp_vision_frame, translation, scale, (256, 256))
-	crop_vision_frame = cv2.cvtColor(crop_vision_frame, cv2.COLOR_RGB2Lab)
-	if numpy.mean(crop_vision_frame[:, :, 0]) < 30:
-		crop_vision_frame[:, :, 0] = cv2.createCLAHE(clipLimit = 2).apply(crop_vision_frame[:, :, 0])
-	crop_vision_frame = cv2.cvtColor(crop_vision_frame, cv2.COLOR_Lab2RGB)
-	crop_vision_frame = crop_vision_frame.transpose(2, 0, 1).astype(numpy.float32) / 255.0
-	with conditional_thread_semaphore(facefusion.globals.execution_providers):
-		face_landmark_68, face_heatmap = face_landmarker.run(None,
-		{
-			face_landmarker.get_inputs()[0].name: [ crop_vision_frame ]
-		})
-	face_landmark_68 = face_landmark_68[:, :, :2][0] / 64
-	face_landmark_68 = face_landmark_68.reshape(1, -1, 2) * 256
-	face_landmark_68 = cv2.transform(face_landmark_68, cv2.invertAffineTransform(affine_matrix))
-	face_landmark_68 = face_landmark_68.reshape(-1, 2)
-	face_landmark_68_score = numpy.amax(face_heatmap, axis = (2, 3))
-	face_landmark_68_score = numpy.mean(face_landmark_68_score)
-	return face_landmark_68, face_landmark_68_score
+	face_landmark_68_list, face_landmark_68_score_list = detect_face_landmarks_68(temp_vision_frame, [ bounding_box ])
+	return face_landmark_68_list[0], face_landmark_68_score_list[0]
+
+
+def detect_face_landmarks_68(temp_vision_frame : VisionFrame, bounding_box_list : List[BoundingBox]) -> Tuple[List[FaceLandmark68], List[Score]]:
+	face_landmarker = get_face_landmarker('68')
+	crop_vision_frames = []
+	affine_matrices = []
+	face_landmark_68_list = []
+
+	for bounding_box in bounding_box_list:
+		scale = 195 / numpy.subtract(bounding_box[2:], bounding_box[:2]).max()
+		translation = (256 - numpy.add(bounding_box[2:], bounding_box[:2]) * scale) * 0.5
+		crop_vision_frame, affine_matrix = warp_face_by_translation(temp_vision_frame, translation, scale, (256, 256))
+		crop_vision_frame = cv2.cvtColor(crop_vision_frame, cv2.COLOR_RGB2Lab)
+		if numpy.mean(crop_vision_frame[:, :, 0]) < 30:
+			crop_vision_frame[:, :, 0] = cv2.createCLAHE(clipLimit = 2).apply(crop_vision_frame[:, :, 0])
+		crop_vision_frame = cv2.cvtColor(crop_vision_frame, cv2.COLOR_Lab2RGB)
+		crop_vision_frames.append(crop_vision_frame.transpose(2, 0, 1).astype(numpy.float32) / 255.0)
+		affine_matrices.append(affine_matrix)
+	face_landmarks_68, face_heatmaps = run_batch(face_landmarker, numpy.stack(crop_vision_frames))[:2]
+	for face_landmark_68, affine_matrix in zip(face_landmarks_68, affine_matrices):
+		face_landmark_68 = face_landmark_68[:, :2] / 64
+		face_landmark_68 = face_landmark_68.reshape(1, -1, 2) * 256
+		face_landmark_68 = cv2.transform(face_landmark_68, cv2.invertAffineTransform(affine_matrix))
+		face_landmark_68_list.append(face_landmark_68.reshape(-1, 2))
+	face_landmark_68_scores = numpy.mean(numpy.amax(face_heatmaps, axis = (2, 3)), axis = 1)
+	return face_landmark_68_list, face_landmark_68_scores.tolist()
 
 
 def expand_face_landmark_68_from_5(face_landmark_5 : FaceLandmark5) -> FaceLandmark68:
-	face_landmarker = get_face_analyser().get('face_landmarkers').get('68_5')
-	affine_matrix = estimate_matrix_by_face_landmark_5(face_landmark_5, 'ffhq_512', (1, 1))
-	face_landmark_5 = cv2.transform(face_landmark_5.reshape(1, -1, 2), affine_matrix).reshape(-1, 2)
-	with conditional_thread_semaphore(facefusion.globals.execution_providers):
-		face_landmark_68_5 = face_landmarker.run(None,
-		{
-			face_landmarker.get_inputs()[0].name: [ face_landmark_5 ]
-		})[0][0]
-	face_landmark_68_5 = cv2.transform(face_landmark_68_5.reshape(1, -1, 2), cv2.invertAffineTransform(affine_matrix)).reshape(-1, 2)
-	return face_landmark_68_5
+	return expand_face_landmarks_68_from_5([ face_landmark_5 ])[0]
+
+
+def expand_face_landmarks_68_from_5(face_landmark_5_list : List[FaceLandmark5]) -> List[FaceLandmark68]:
+	face_landmarker = get_face_landmarker('68_5')
+	affine_matrices = []
+	face_landmark_5_batch = []
+	face_landmark_68_5_list = []
+
+	for face_landmark_5 in face_landmark_5_list:
+		affine_matrix = estimate_matrix_by_face_landmark_5(face_landmark_5, 'ffhq_512', (1, 1))
+		face_landmark_5_batch.append(cv2.transform(face_landmark_5.reshape(1, -1, 2), affine_matrix).reshape(-1, 2))
+		affine_matrices.append(affine_matrix)
+	face_landmarks_68_5 = run_batch(face_landmarker, numpy.stack(face_landmark_5_batch).astype(numpy.float32))[0]
+	for face_landmark_68_5, affine_matrix in zip(face_landmarks_68_5, affine_matrices):
+		face_landmark_68_5 = cv2.transform(face_landmark_68_5.reshape(1, -1, 2), cv2.invertAffineTransform(affine_matrix)).reshape(-1, 2)
+		face_landmark_68_5_list.append(face_landmark_68_5)
+	return face_landmark_68_5_list
 
 
 def detect_gender_age(temp_vision_frame : VisionFrame, bounding_box : BoundingBox) -> Tuple[int, int]:
-	gender_age = get_face_analyser().get('gender_age')
+	return detect_genders_ages(temp_vision_frame, [ bounding_box ])[0]
+
+
+def detect_genders_ages(temp_vision_frame : VisionFrame, bounding_box_list : List[BoundingBox]) -> List[Tuple[int, int]]:
+	crop_vision_frames = [ prepare_gender_age_frame(temp_vision_frame, bounding_box) for bounding_box in bounding_box_list ]
+	return forward_genders_ages(crop_vision_frames)
+
+
+def create_lazy_genders_ages(temp_vision_frame : VisionFrame, bounding_box_list : List[BoundingBox]) -> List[Tuple[LazyFaceValue, LazyFaceValue]]:
+	gender_age_list = []
+
+	for bounding_box in bounding_box_list:
+		gender_age_value = LazyFaceValue(partial(forward_genders_ages, [ prepare_gender_age_frame(temp_vision_frame, bounding_box) ]))
+		gender_age_list.append(
+		(
+			LazyFaceValue(create_gender_age_loader(gender_age_value, 0)),
+			LazyFaceValue(create_gender_age_loader(gender_age_value, 1))
+		))
+	return gender_age_list
+
+
+def create_gender_age_loader(gender_age_value : LazyFaceValue, index : int) -> Callable[[], int]:
+	return lambda : gender_age_value.resolve()[0][index]
+
+
+def prepare_gender_age_frame(temp_vision_frame : VisionFrame, bounding_box : BoundingBox) -> VisionFrame:
 	bounding_box = bounding_box.reshape(2, -1)
 	scale = 64 / numpy.subtract(*bounding_box[::-1]).max()
 	translation = 48 - bounding_box.sum(axis = 0) * scale * 0.5
-	crop_vision_frame, affine_matrix = warp_face_by_translation(temp_vision_frame, translation, scale, (96, 96))
-	crop_vision_frame = crop_vision_frame[:, :, ::-1].transpose(2, 0, 1).astype(numpy.float32)
-	crop_vision_frame = numpy.expand_dims(crop_vision_frame, axis = 0)
-	with conditional_thread_semaphore(facefusion.globals.execution_providers):
-		prediction = gender_age.run(None,
-		{
-			gender_age.get_inputs()[0].name: crop_vision_frame
-		})[0][0]
-	gender = int(numpy.argmax(prediction[:2]))
-	age = int(numpy.round(prediction[2] * 100))
-	return gender, age
+	crop_vision_frame, _ = warp_face_by_translation(temp_vision_frame, translation, scale, (96, 96))
+	return crop_vision_frame
+
+
+def forward_genders_ages(crop_vision_frames : List[VisionFrame]) -> List[Tuple[int, int]]:
+	gender_age = get_gender_age()
+	gender_age_list = []
+
+	crop_vision_batch = numpy.stack(crop_vision_frames)[:, :, :, ::-1].transpose(0, 3, 1, 2).astype(numpy.float32)
+	predictions = run_batch(gender_age, crop_vision_batch)[0]
+	for prediction in predictions:
+		gender = int(numpy.argmax(prediction[:2]))
+		age = int(numpy.round(prediction[2] * 100))
+		gender_age_list.append((gender, age))
+	return gender_age_list
 
 
 def get_one_face(vision_frame : VisionFrame, position : int = 0) -> Optional[Face]:
@@ -467,18 +570,30 @@ def get_average_face(vision_frames : List[VisionFrame], position : int = 0) -> O
 			normed_embedding_list.append(face.normed_embedding)
 	if faces:
 		first_face = get_first(faces)
-		average_face = Face(
-			bounding_box = first_face.bounding_box,
-			landmarks = first_face.landmarks,
-			scores = first_face.scores,
+		average_face = first_face._replace(
 			embedding = numpy.mean(embedding_list, axis = 0),
-			normed_embedding = numpy.mean(normed_embedding_list, axis = 0),
-			gender = first_face.gender,
-			age = first_face.age
+			normed_embedding = numpy.mean(normed_embedding_list, axis = 0)
 		)
 	return average_face
 
 
+# 整个任务共用同一个源人脸对象,设置了缓存目录时按源文件内容保存到磁盘
+def get_source_face(source_paths : List[str]) -> Optional[Face]:
+	source_image_paths = filter_image_paths(source_paths)
+	source_key = create_source_key(source_image_paths)
+
+	if source_key not in SOURCE_FACES:
+		with SOURCE_FACE_LOCK:
+			if source_key not in SOURCE_FACES:
+				source_face = read_source_face(source_key)
+				if source_face is None:
+					source_face = get_average_face(read_static_images(source_image_paths))
+					if source_face:
+						write_source_face(source_key, source_face)
+				SOURCE_FACES[source_key] = source_face
+	return SOURCE_FACES.get(source_key)
+
+
 def get_many_faces(vision_frame : VisionFrame) -> List[Face]:
 	faces = []
 	try:
@@ -486,32 +601,16 @@ def get_many_faces(vision_frame : VisionFrame) -> List[Face]:
 		if faces_cache:
 			faces = faces_cache
 		else:
-			bounding_box_list = []
-			face_landmark_5_list = []
-			score_list = []
-
-			if facefusion.globals.face_detector_model in [ 'many', 'retinaface']:
-				bounding_box_list_retinaface, face_landmark_5_list_retinaface, score_list_retinaface = detect_with_retinaface(vision_frame, facefusion.globals.face_detector_size)
-				bounding_box_list.extend(bounding_box_list_retinaface)
-				face_landmark_5_list.extend(face_landmark_5_list_retinaface)
-				score_list.extend(score_list_retinaface)
-			if facefusion.globals.face_detector_model in [ 'many', 'scrfd' ]:
-				bounding_box_list_scrfd, face_landmark_5_list_scrfd, score_list_scrfd = detect_with_scrfd(vision_frame, facefusion.globals.face_detector_size)
-				bounding_box_list.extend(bounding_box_list_scrfd)
-				face_landmark_5_list.extend(face_landmark_5_list_scrfd)
-				score_list.extend(score_list_scrfd)
-			if facefusion.globals.face_detector_model in [ 'many', 'yoloface' ]:
-				bounding_box_list_yoloface, face_landmark_5_list_yoloface, score_list_yoloface = detect_with_yoloface(vision_frame, facefusion.globals.face_detector_size)
-				bounding_box_list.extend(bounding_box_list_yoloface)
-				face_landmark_5_list.extend(face_landmark_5_list_yoloface)
-				score_list.extend(score_list_yoloface)
-			if facefusion.globals.face_detector_model in [ 'yunet' ]:
-				bounding_box_list_yunet, face_landmark_5_list_yunet, score_list_yunet = detect_with_yunet(vision_frame, facefusion.globals.face_detector_size)
-				bounding_box_list.extend(bounding_box_list_yunet)
-				face_landmark_5_list.extend(face_landmark_5_list_yunet)
-				score_list.extend(score_list_yunet)
-			if bounding_box_list and face_landmark_5_list and score_list:
-				faces = create_faces(vision_frame, bounding_box_list, face_landmark_5_list, score_list)
+			faces = read_cached_faces(vision_frame)
+			if faces is not None:
+				faces = restore_cached_faces(vision_frame, faces)
+			else:
+				# 跟踪窗口内优先通过光流跟踪,失败时再完整检测
+				faces = track_faces(vision_frame)
+				if faces is None:
+					faces = detect_faces(vision_frame)
+					set_face_track(vision_frame, faces)
+				write_cached_faces(vision_frame, faces)
 			if faces:
 				set_static_faces(vision_frame, faces)
 		if facefusion.globals.face_analyser_order:
@@ -525,17 +624,56 @@ def get_many_faces(vision_frame : VisionFrame) -> List[Face]:
 	return faces
 
 
+# 磁盘缓存中没有的embedding与性别年龄按当前帧延迟计算
+def restore_cached_faces(vision_frame : VisionFrame, faces : List[Face]) -> List[Face]:
+	restored_faces = []
+
+	for face in faces:
+		if face.embedding is None:
+			embedding_list, normed_embedding_list = create_lazy_embeddings(vision_frame, [ face.landmarks.get('5/68') ])
+			face = face._replace(embedding = embedding_list[0], normed_embedding = normed_embedding_list[0])
+		if face.gender is None or face.age is None:
+			gender, age = get_first(create_lazy_genders_ages(vision_frame, [ face.bounding_box ]))
+			face = face._replace(gender = gender, age = age)
+		restored_faces.append(face)
+	return restored_faces
+
+
+def detect_faces(vision_frame : VisionFrame) -> List[Face]:
+	faces : List[Face] = []
+	detection_list = []
+
+	if facefusion.globals.face_detector_model in [ 'many', 'retinaface']:
+		detection_list.append(detect_with_retinaface(vision_frame, facefusion.globals.face_detector_size))
+	if facefusion.globals.face_detector_model in [ 'many', 'scrfd' ]:
+		detection_list.append(detect_with_scrfd(vision_frame, facefusion.globals.face_detector_size))
+	if facefusion.globals.face_detector_model in [ 'many', 'yoloface' ]:
+		detection_list.append(detect_with_yoloface(vision_frame, facefusion.globals.face_detector_size))
+	if facefusion.globals.face_detector_model in [ 'yunet' ]:
+		detection_list.append(detect_with_yunet(vision_frame, facefusion.globals.face_detector_size))
+	if facefusion.globals.face_detector_score > 0:
+		# 所有模型的检测结果拼接后一次完成NMS
+		bounding_boxes = numpy.concatenate([ detection[0] for detection in detection_list ])
+		face_landmarks_5 = numpy.concatenate([ detection[1] for detection in detection_list ])
+		scores = numpy.concatenate([ detection[2] for detection in detection_list ])
+		iou_threshold = 0.1 if facefusion.globals.face_detector_model == 'many' else 0.4
+		keep_indices = apply_nms(bounding_boxes, scores, iou_threshold)
+		if keep_indices.size:
+			faces = create_faces(vision_frame, bounding_boxes[keep_indices], face_landmarks_5[keep_indices], scores[keep_indices])
+	return faces
+
+
 def find_similar_faces(reference_faces : FaceSet, vision_frame : VisionFrame, face_distance : float) -> List[Face]:
 	similar_faces : List[Face] = []
 	many_faces = get_many_faces(vision_frame)
 
-	if reference_faces:
+	if reference_faces and many_faces:
+		embeddings = numpy.stack([ face.normed_embedding for face in many_faces ])
 		for reference_set in reference_faces:
-			if not similar_faces:
-				for reference_face in reference_faces[reference_set]:
-					for face in many_faces:
-						if compare_faces(face, reference_face, face_distance):
-							similar_faces.append(face)
+			if not similar_faces and reference_faces[reference_set]:
+				# 按参考人脸的顺序展开,匹配多个参考人脸的人脸会重复出现
+				_, face_indices = numpy.nonzero(search_face_index(get_face_index(reference_faces[reference_set]), embeddings, face_distance).T)
+				similar_faces = [ many_faces[face_index] for face_index in face_indices ]
 	return similar_faces
 
 
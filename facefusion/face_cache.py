@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+import numpy
+
+import facefusion.globals
+from facefusion import logger, wording
+from facefusion.common_helper import get_first
+from facefusion.face_store import create_frame_hash
+from facefusion.filesystem import create_directory, is_file, is_video
+from facefusion.typing import Face, FaceCache, FaceLandmarkSet, FaceScoreSet, LazyFaceValue, VisionFrame
+
+FACE_CACHE : Optional[FaceCache] = None
+FACE_CACHE_PENDING : Dict[str, List[Face]] = {}
+FACE_CACHE_LOCK : threading.Lock = threading.Lock()
+FACE_CACHE_COLUMNS = [ 'bounding_boxes', 'face_landmarks_5', 'face_landmarks_5_68', 'face_landmarks_68', 'face_landmarks_68_5', 'detector_scores', 'landmarker_scores', 'embeddings', 'normed_embeddings', 'genders', 'ages' ]
+FACE_CACHE_CHUNK_SIZE = 1024
+FACE_CACHE_CHUNK_LIMIT = 16
+FILE_SAMPLE_SIZE = 1024 ** 2
+
+
+# 每个目标一份按列存储的缓存,读取时内存映射,只有命中的人脸才会被拷贝
+# 缓存由多个只追加的分块组成,多个进程可以同时写入各自的分块
+def get_face_cache() -> Optional[FaceCache]:
+	global FACE_CACHE
+
+	target_path = facefusion.globals.target_path
+	if not facefusion.globals.face_cache_directory or not is_video(target_path):
+		return None
+	if FACE_CACHE is None or FACE_CACHE.get('target_path') != target_path:
+		with FACE_CACHE_LOCK:
+			if FACE_CACHE is None or FACE_CACHE.get('target_path') != target_path:
+				# 切换目标前写入上一个目标剩余的帧
+				if FACE_CACHE and FACE_CACHE_PENDING:
+					write_face_cache_chunk(FACE_CACHE.get('cache_path'), list(FACE_CACHE_PENDING.items()))
+				FACE_CACHE_PENDING.clear()
+				FACE_CACHE = load_face_cache(target_path)
+	return FACE_CACHE
+
+
+def load_face_cache(target_path : str) -> FaceCache:
+	cache_path = get_face_cache_path(target_path)
+	face_cache : FaceCache =\
+	{
+		'target_path': target_path,
+		'cache_path': cache_path,
+		'frame_indices': {},
+		'chunk_paths': [],
+		'chunks': []
+	}
+
+	if os.path.isdir(cache_path):
+		for chunk_name in sorted(os.listdir(cache_path)):
+			chunk_path = os.path.join(cache_path, chunk_name)
+			if os.path.isdir(chunk_path) and not chunk_name.endswith('.tmp'):
+				append_face_cache_chunk(face_cache, chunk_path)
+	if face_cache.get('frame_indices'):
+		logger.debug(wording.get('face_cache_loaded').format(frame_total = len(face_cache.get('frame_indices'))), __name__.upper())
+	return face_cache
+
+
+def append_face_cache_chunk(face_cache : FaceCache, chunk_path : str) -> None:
+	try:
+		frame_hashes = numpy.load(os.path.join(chunk_path, 'frame_hashes.npy'))
+		columns = { column_name: numpy.load(os.path.join(chunk_path, column_name + '.npy'), mmap_mode = 'r') for column_name in FACE_CACHE_COLUMNS + [ 'frame_offsets' ] }
+	except (OSError, ValueError):
+		return
+	chunk_index = len(face_cache.get('chunks'))
+	# 先加入分块再登记帧,其它线程查到帧时分块一定已存在
+	face_cache.get('chunk_paths').append(chunk_path)
+	face_cache.get('chunks').append(columns)
+	for frame_index, frame_hash in enumerate(frame_hashes.tolist()):
+		face_cache.get('frame_indices')[frame_hash.decode()] = (chunk_index, frame_index)
+
+
+# 目标内容、裁剪范围与分析设置共同决定缓存是否可用
+def get_face_cache_path(target_path : str) -> str:
+	cache_values =\
+	[
+		get_file_sample_hash(target_path),
+		facefusion.globals.trim_frame_start,
+		facefusion.globals.trim_frame_end,
+		facefusion.globals.face_detector_interval
+	]
+	return os.path.join(facefusion.globals.face_cache_directory, create_cache_key(cache_values))
+
+
+def create_cache_key(cache_values : List[Any]) -> str:
+	analyser_values =\
+	[
+		facefusion.globals.face_detector_model,
+		facefusion.globals.face_detector_size,
+		facefusion.globals.face_detector_score,
+		facefusion.globals.face_landmarker_score,
+		facefusion.globals.face_recognizer_model
+	]
+	return hashlib.md5(json.dumps(cache_values + analyser_values).encode()).hexdigest()
+
+
+# 视频文件很大,只对文件大小与首尾各一段内容求哈希
+def get_file_sample_hash(file_path : str) -> str:
+	file_hash = hashlib.blake2b(digest_size = 16)
+	file_size = os.path.getsize(file_path)
+	file_hash.update(str(file_size).encode())
+	with open(file_path, 'rb') as file:
+		file_hash.update(file.read(FILE_SAMPLE_SIZE))
+		file.seek(max(file_size - FILE_SAMPLE_SIZE, 0))
+		file_hash.update(file.read(FILE_SAMPLE_SIZE))
+	return file_hash.hexdigest()
+
+
+# 与静态人脸相同,按帧序号与抽样哈希定位,相同画面出现在不同帧时分别缓存
+# 未求值的embedding与性别年龄返回None,由调用方按当前帧重新延迟计算
+def read_cached_faces(vision_frame : VisionFrame) -> Optional[List[Face]]:
+	face_cache = get_face_cache()
+	frame_hash = create_frame_hash(vision_frame) if face_cache else None
+	frame_location = face_cache.get('frame_indices').get(frame_hash) if face_cache and frame_hash else None
+	if frame_location:
+		chunk_index, frame_index = frame_location
+		return read_faces(face_cache.get('chunks')[chunk_index], frame_index)
+	return None
+
+
+def read_faces(columns : Dict[str, numpy.ndarray[Any, Any]], frame_index : int) -> List[Face]:
+	frame_start, frame_end = columns.get('frame_offsets')[frame_index:frame_index + 2].tolist()
+	faces = []
+
+	for index in range(frame_start, frame_end):
+		landmarks : FaceLandmarkSet =\
+		{
+			'5': numpy.array(columns.get('face_landmarks_5')[index]),
+			'5/68': numpy.array(columns.get('face_landmarks_5_68')[index]),
+			'68': numpy.array(columns.get('face_landmarks_68')[index]),
+			'68/5': numpy.array(columns.get('face_landmarks_68_5')[index])
+		}
+		scores : FaceScoreSet =\
+		{
+			'detector': float(columns.get('detector_scores')[index]),
+			'landmarker': float(columns.get('landmarker_scores')[index])
+		}
+		faces.append(Face(
+			bounding_box = numpy.array(columns.get('bounding_boxes')[index]),
+			landmarks = landmarks,
+			scores = scores,
+			embedding = read_cached_value(columns.get('embeddings')[index]),
+			normed_embedding = read_cached_value(columns.get('normed_embeddings')[index]),
+			gender = read_cached_value(columns.get('genders')[index]),
+			age = read_cached_value(columns.get('ages')[index])
+		))
+	return faces
+
+
+# 性别与年龄按单个数值存储,读取时还原为整数
+def read_cached_value(cached_value : numpy.ndarray[Any, Any]) -> Any:
+	if numpy.isnan(cached_value).any():
+		return None
+	if cached_value.size == 1:
+		return int(cached_value[0])
+	return numpy.array(cached_value)
+
+
+# 待写入的帧攒够一个分块就写入磁盘,内存中不会无限累积
+def write_cached_faces(vision_frame : VisionFrame, faces : List[Face]) -> None:
+	face_cache = get_face_cache()
+	frame_hash = create_frame_hash(vision_frame) if face_cache else None
+	if face_cache and frame_hash and frame_hash not in face_cache.get('frame_indices'):
+		with FACE_CACHE_LOCK:
+			FACE_CACHE_PENDING[frame_hash] = faces
+			is_chunk_full = len(FACE_CACHE_PENDING) >= FACE_CACHE_CHUNK_SIZE
+		if is_chunk_full:
+			flush_face_cache()
+
+
+def flush_face_cache() -> None:
+	with FACE_CACHE_LOCK:
+		face_cache = FACE_CACHE
+		cache_items = list(FACE_CACHE_PENDING.items())
+		FACE_CACHE_PENDING.clear()
+	if face_cache and cache_items:
+		chunk_path = write_face_cache_chunk(face_cache.get('cache_path'), cache_items)
+		with FACE_CACHE_LOCK:
+			if FACE_CACHE is face_cache:
+				append_face_cache_chunk(face_cache, chunk_path)
+		logger.debug(wording.get('face_cache_saved').format(frame_total = len(cache_items)), __name__.upper())
+
+
+# 分块先写临时目录再重命名,其它进程不会读到写了一半的分块
+def write_face_cache_chunk(cache_path : str, cache_items : List[Tuple[str, List[Face]]]) -> str:
+	chunk_path = os.path.join(cache_path, uuid.uuid4().hex)
+	temp_chunk_path = chunk_path + '.tmp'
+	create_directory(temp_chunk_path)
+	faces = [ face for _, frame_faces in cache_items for face in frame_faces ]
+	columns = create_face_columns(faces)
+	columns['frame_offsets'] = numpy.cumsum([ 0 ] + [ len(frame_faces) for _, frame_faces in cache_items ]).astype(numpy.int64)
+	numpy.save(os.path.join(temp_chunk_path, 'frame_hashes.npy'), numpy.array([ frame_hash for frame_hash, _ in cache_items ], dtype = 'S'))
+	for column_name, column in columns.items():
+		numpy.save(os.path.join(temp_chunk_path, column_name + '.npy'), column)
+	os.replace(temp_chunk_path, chunk_path)
+	return chunk_path
+
+
+# 处理结束后写入剩余的帧,分块过多时合并为一个,下次加载时不需要打开大量文件
+def save_face_cache() -> None:
+	global FACE_CACHE
+
+	flush_face_cache()
+	with FACE_CACHE_LOCK:
+		face_cache = FACE_CACHE
+		# 子进程写入的分块不在当前进程的缓存中,合并前重新加载
+		FACE_CACHE = None
+		if not face_cache:
+			return
+		face_cache = load_face_cache(face_cache.get('target_path'))
+		if len(face_cache.get('chunks')) <= FACE_CACHE_CHUNK_LIMIT:
+			return
+		cache_items = [ (frame_hash, read_faces(face_cache.get('chunks')[chunk_index], frame_index)) for frame_hash, (chunk_index, frame_index) in face_cache.get('frame_indices').items() ]
+		write_face_cache_chunk(face_cache.get('cache_path'), cache_items)
+		chunk_paths = face_cache.get('chunk_paths')
+		# 释放内存映射后才能删除旧的分块
+		face_cache['chunks'] = []
+		for chunk_path in chunk_paths:
+			shutil.rmtree(chunk_path, ignore_errors = True)
+
+
+# 源人脸按源文件内容与分析设置保存,不同任务使用相同的源图片时直接读取
+def create_source_key(source_paths : List[str]) -> str:
+	return create_cache_key([ get_file_sample_hash(source_path) for source_path in source_paths ])
+
+
+def read_source_face(source_key : str) -> Optional[Face]:
+	source_face_path = get_source_face_path(source_key)
+
+	if source_face_path and is_file(source_face_path):
+		try:
+			with numpy.load(source_face_path) as source_face_file:
+				columns = { column_name: source_face_file[column_name] for column_name in FACE_CACHE_COLUMNS + [ 'frame_offsets' ] }
+			return get_first(read_faces(columns, 0))
+		except (OSError, ValueError, KeyError):
+			return None
+	return None
+
+
+def write_source_face(source_key : str, source_face : Face) -> None:
+	source_face_path = get_source_face_path(source_key)
+
+	if source_face_path:
+		create_directory(os.path.dirname(source_face_path))
+		columns = create_face_columns([ source_face ])
+		columns['frame_offsets'] = numpy.array([ 0, 1 ], dtype = numpy.int64)
+		temp_source_face_path = source_face_path + '.tmp.npz'
+		numpy.savez(temp_source_face_path, **cast(Dict[str, Any], columns))
+		os.replace(temp_source_face_path, source_face_path)
+
+
+def get_source_face_path(source_key : str) -> Optional[str]:
+	if facefusion.globals.face_cache_directory:
+		return os.path.join(facefusion.globals.face_cache_directory, 'source_faces', source_key + '.npz')
+	return None
+
+
+def create_face_columns(faces : List[Face]) -> Dict[str, numpy.ndarray[Any, Any]]:
+	return\
+	{
+		'bounding_boxes': numpy.array([ face.bounding_box for face in faces ], dtype = numpy.float32).reshape(-1, 4),
+		'face_landmarks_5': numpy.array([ face.landmarks.get('5') for face in faces ], dtype = numpy.float32).reshape(-1, 5, 2),
+		'face_landmarks_5_68': numpy.array([ face.landmarks.get('5/68') for face in faces ], dtype = numpy.float32).reshape(-1, 5, 2),
+		'face_landmarks_68': numpy.array([ face.landmarks.get('68') for face in faces ], dtype = numpy.float32).reshape(-1, 68, 2),
+		'face_landmarks_68_5': numpy.array([ face.landmarks.get('68/5') for face in faces ], dtype = numpy.float32).reshape(-1, 68, 2),
+		'detector_scores': numpy.array([ face.scores.get('detector') for face in faces ], dtype = numpy.float32),
+		'landmarker_scores': numpy.array([ face.scores.get('landmarker') for face in faces ], dtype = numpy.float32),
+		'embeddings': create_value_column([ get_resolved_value(face, 3) for face in faces ]),
+		'normed_embeddings': create_value_column([ get_resolved_value(face, 4) for face in faces ]),
+		'genders': create_value_column([ get_resolved_value(face, 5) for face in faces ]),
+		'ages': create_value_column([ get_resolved_value(face, 6) for face in faces ])
+	}
+
+
+# 只写入已经求值的字段,不为写缓存额外运行模型
+def get_resolved_value(face : Face, index : int) -> Any:
+	face_value = tuple.__getitem__(face, index)
+	if isinstance(face_value, LazyFaceValue):
+		return face_value.value if face_value.loader is None else None
+	return face_value
+
+
+# 缺失的值以NaN填充
+def create_value_column(face_values : List[Any]) -> numpy.ndarray[Any, Any]:
+	value_size = max([ numpy.size(face_value) for face_value in face_values if face_value is not None ] + [ 1 ])
+	value_column = numpy.full((len(face_values), value_size), numpy.nan, dtype = numpy.float32)
+
+	for index, face_value in enumerate(face_values):
+		if face_value is not None:
+			value_column[index] = numpy.reshape(face_value, value_size)
+	return value_column
+
+
+def clear_face_cache() -> None:
+	global FACE_CACHE
+
+	with FACE_CACHE_LOCK:
+		FACE_CACHE = None
+		FACE_CACHE_PENDING.clear()
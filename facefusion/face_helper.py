@@ -1,4 +1,4 @@
-from typing import Any, Tuple, List
+from typing import Any, Tuple
 from cv2.typing import Size
 from functools import lru_cache
 import cv2
@@ -129,28 +129,15 @@ def convert_face_landmark_68_to_5(face_landmark_68 : FaceLandmark68) -> FaceLand
 	return face_landmark_5
 
 
-def apply_nms(bounding_box_list : List[BoundingBox], iou_threshold : float) -> List[int]:
-	keep_indices = []
-	dimension_list = numpy.reshape(bounding_box_list, (-1, 4))
-	x1 = dimension_list[:, 0]
-	y1 = dimension_list[:, 1]
-	x2 = dimension_list[:, 2]
-	y2 = dimension_list[:, 3]
-	areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-	indices = numpy.arange(len(bounding_box_list))
-	while indices.size > 0:
-		index = indices[0]
-		remain_indices = indices[1:]
-		keep_indices.append(index)
-		xx1 = numpy.maximum(x1[index], x1[remain_indices])
-		yy1 = numpy.maximum(y1[index], y1[remain_indices])
-		xx2 = numpy.minimum(x2[index], x2[remain_indices])
-		yy2 = numpy.minimum(y2[index], y2[remain_indices])
-		width = numpy.maximum(0, xx2 - xx1 + 1)
-		height = numpy.maximum(0, yy2 - yy1 + 1)
-		iou = width * height / (areas[index] + areas[remain_indices] - width * height)
-		indices = indices[numpy.where(iou <= iou_threshold)[0] + 1]
-	return keep_indices
+# 按分数降序贪心抑制,返回保留的索引
+def apply_nms(bounding_boxes : numpy.ndarray[Any, Any], scores : numpy.ndarray[Any, Any], iou_threshold : float) -> numpy.ndarray[Any, Any]:
+	if not len(bounding_boxes):
+		return numpy.empty(0, dtype = numpy.int64)
+	bounding_boxes = numpy.asarray(bounding_boxes, dtype = numpy.float64).reshape(-1, 4)
+	# 宽高加一,与按像素计算面积的方式保持一致
+	nms_boxes = numpy.column_stack([ bounding_boxes[:, :2], bounding_boxes[:, 2:] - bounding_boxes[:, :2] + 1 ])
+	keep_indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), numpy.asarray(scores, dtype = numpy.float32).tolist(), 0.0, iou_threshold)
+	return numpy.asarray(keep_indices, dtype = numpy.int64).reshape(-1)
 
 
 def categorize_age(age : int) -> FaceAnalyserAge:
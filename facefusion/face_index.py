@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+import numpy
+import scipy.cluster.vq
+
+import facefusion.globals
+from facefusion.filesystem import create_directory, is_file
+from facefusion.typing import Embedding, Face, FaceIndex
+
+FACE_INDEXES : Dict[int, Tuple[List[Face], int, FaceIndex]] = {}
+FACE_INDEX_LOCK : threading.Lock = threading.Lock()
+FACE_INDEX_LIMIT = 16
+FACE_INDEX_THRESHOLD = 256
+FACE_INDEX_PROBE_TOTAL = 4
+
+
+# 同一组参考人脸只堆叠一次,列表追加后重新创建
+def get_face_index(reference_faces : List[Face]) -> FaceIndex:
+	index_entry = FACE_INDEXES.get(id(reference_faces))
+
+	if index_entry and index_entry[0] is reference_faces and index_entry[1] == len(reference_faces):
+		return index_entry[2]
+	with FACE_INDEX_LOCK:
+		if len(FACE_INDEXES) >= FACE_INDEX_LIMIT:
+			FACE_INDEXES.clear()
+		face_index = load_or_create_face_index(numpy.stack([ reference_face.normed_embedding for reference_face in reference_faces ]).astype(numpy.float32))
+		FACE_INDEXES[id(reference_faces)] = (reference_faces, len(reference_faces), face_index)
+	return face_index
+
+
+# 大量参考人脸时按聚类建立近似索引,设置了缓存目录则保存以便之后的任务复用
+def load_or_create_face_index(embeddings : Embedding) -> FaceIndex:
+	if len(embeddings) < FACE_INDEX_THRESHOLD:
+		return create_face_index(embeddings, 0)
+	if facefusion.globals.face_cache_directory:
+		index_path = os.path.join(facefusion.globals.face_cache_directory, 'face_indexes', hashlib.md5(embeddings.tobytes()).hexdigest() + '.npz')
+		if is_file(index_path):
+			return load_face_index(index_path)
+		face_index = create_face_index(embeddings, int(numpy.sqrt(len(embeddings))))
+		save_face_index(index_path, face_index)
+		return face_index
+	return create_face_index(embeddings, int(numpy.sqrt(len(embeddings))))
+
+
+def create_face_index(embeddings : Embedding, cluster_total : int) -> FaceIndex:
+	centroids = numpy.empty((0, embeddings.shape[1]), dtype = numpy.float32)
+	clusters = numpy.zeros(len(embeddings), dtype = numpy.int64)
+
+	if cluster_total > 1:
+		centroids, clusters = scipy.cluster.vq.kmeans2(embeddings, cluster_total, minit = '++', seed = 0)
+	face_index : FaceIndex =\
+	{
+		'embeddings': embeddings,
+		'centroids': centroids.astype(numpy.float32),
+		'clusters': clusters.astype(numpy.int64)
+	}
+	return face_index
+
+
+# 一次矩阵乘法得到所有人脸与参考人脸的匹配矩阵,有聚类时只比较最接近的几个聚类
+def search_face_index(face_index : FaceIndex, embeddings : Embedding, face_distance : float) -> numpy.ndarray[Any, Any]:
+	if not face_index.get('centroids').size:
+		return 1 - numpy.dot(embeddings, face_index.get('embeddings').T) < face_distance
+	probe_clusters = numpy.argsort(-numpy.dot(embeddings, face_index.get('centroids').T), axis = 1)[:, :FACE_INDEX_PROBE_TOTAL]
+	match_matrix = numpy.zeros((len(embeddings), len(face_index.get('embeddings'))), dtype = bool)
+
+	for index, embedding in enumerate(embeddings):
+		candidate_indices = numpy.flatnonzero(numpy.isin(face_index.get('clusters'), probe_clusters[index]))
+		match_matrix[index, candidate_indices] = 1 - numpy.dot(face_index.get('embeddings')[candidate_indices], embedding) < face_distance
+	return match_matrix
+
+
+def save_face_index(index_path : str, face_index : FaceIndex) -> None:
+	create_directory(os.path.dirname(index_path))
+	temp_index_path = index_path + '.tmp.npz'
+	numpy.savez(temp_index_path, **face_index)
+	os.replace(temp_index_path, index_path)
+
+
+def load_face_index(index_path : str) -> FaceIndex:
+	with numpy.load(index_path) as index_file:
+		face_index : FaceIndex =\
+		{
+			'embeddings': index_file['embeddings'],
+			'centroids': index_file['centroids'],
+			'clusters': index_file['clusters']
+		}
+	return face_index
+
+
+def clear_face_indexes() -> None:
+	with FACE_INDEX_LOCK:
+		FACE_INDEXES.clear()
@@ -4,13 +4,12 @@ from functools import lru_cache
 from time import sleep
 import cv2
 import numpy
-import onnxruntime
 
 import facefusion.globals
 from facefusion import process_manager
 from facefusion.thread_helper import thread_lock, conditional_thread_semaphore
 from facefusion.typing import FaceLandmark68, VisionFrame, Mask, Padding, FaceMaskRegion, ModelSet
-from facefusion.execution import apply_execution_provider_options
+from facefusion.inference_manager import get_inference_session, clear_inference_sessions
 from facefusion.filesystem import resolve_relative_path, is_file
 from facefusion.download import conditional_download
 
@@ -47,36 +46,42 @@ FACE_MASK_REGIONS : Dict[FaceMaskRegion, int] =\
 def get_face_occluder() -> Any:
 	global FACE_OCCLUDER
 
-	with thread_lock():
-		while process_manager.is_checking():
-			sleep(0.5)
-		if FACE_OCCLUDER is None:
-			model_path = MODELS.get('face_occluder').get('path')
-			FACE_OCCLUDER = onnxruntime.InferenceSession(model_path, providers = apply_execution_provider_options(facefusion.globals.execution_providers))
+	if FACE_OCCLUDER is None:
+		with thread_lock():
+			while process_manager.is_checking():
+				sleep(0.5)
+			if FACE_OCCLUDER is None:
+				model_path = MODELS.get('face_occluder').get('path')
+				FACE_OCCLUDER = get_inference_session(model_path)
 	return FACE_OCCLUDER
 
 
 def get_face_parser() -> Any:
 	global FACE_PARSER
 
-	with thread_lock():
-		while process_manager.is_checking():
-			sleep(0.5)
-		if FACE_PARSER is None:
-			model_path = MODELS.get('face_parser').get('path')
-			FACE_PARSER = onnxruntime.InferenceSession(model_path, providers = apply_execution_provider_options(facefusion.globals.execution_providers))
+	if FACE_PARSER is None:
+		with thread_lock():
+			while process_manager.is_checking():
+				sleep(0.5)
+			if FACE_PARSER is None:
+				model_path = MODELS.get('face_parser').get('path')
+				FACE_PARSER = get_inference_session(model_path)
 	return FACE_PARSER
 
 
 def clear_face_occluder() -> None:
 	global FACE_OCCLUDER
 
+	if FACE_OCCLUDER is not None:
+		clear_inference_sessions([ MODELS.get('face_occluder').get('path') ])
 	FACE_OCCLUDER = None
 
 
 def clear_face_parser() -> None:
 	global FACE_PARSER
 
+	if FACE_PARSER is not None:
+		clear_inference_sessions([ MODELS.get('face_parser').get('path') ])
 	FACE_PARSER = None
 
 
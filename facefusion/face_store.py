@@ -1,35 +1,79 @@
-from typing import Optional, List
+from collections import OrderedDict
+from typing import Dict, Optional, List
 import hashlib
+import threading
 import numpy
 
+import facefusion.globals
+from facefusion.face_index import clear_face_indexes
+from facefusion.face_tracker import get_tracking_frame_number
 from facefusion.typing import VisionFrame, Face, FaceStore, FaceSet
 
 FACE_STORE: FaceStore =\
 {
-	'static_faces': {},
+	'static_faces': OrderedDict(),
 	'reference_faces': {}
 }
+FACE_STORE_LOCK : threading.Lock = threading.Lock()
+STATIC_FACES_STATS : Dict[str, int] =\
+{
+	'hits': 0,
+	'misses': 0,
+	'evictions': 0
+}
+FRAME_HASH_SIZE = 256
 
 
 def get_static_faces(vision_frame : VisionFrame) -> Optional[List[Face]]:
 	frame_hash = create_frame_hash(vision_frame)
-	if frame_hash in FACE_STORE['static_faces']:
-		return FACE_STORE['static_faces'][frame_hash]
+	with FACE_STORE_LOCK:
+		if frame_hash in FACE_STORE['static_faces']:
+			FACE_STORE['static_faces'].move_to_end(frame_hash)
+			STATIC_FACES_STATS['hits'] += 1
+			return FACE_STORE['static_faces'][frame_hash]
+		STATIC_FACES_STATS['misses'] += 1
 	return None
 
 
+# 按最近使用淘汰,超过上限时丢弃最久未命中的帧
 def set_static_faces(vision_frame : VisionFrame, faces : List[Face]) -> None:
 	frame_hash = create_frame_hash(vision_frame)
 	if frame_hash:
-		FACE_STORE['static_faces'][frame_hash] = faces
+		with FACE_STORE_LOCK:
+			FACE_STORE['static_faces'][frame_hash] = faces
+			FACE_STORE['static_faces'].move_to_end(frame_hash)
+			while facefusion.globals.static_face_limit and len(FACE_STORE['static_faces']) > facefusion.globals.static_face_limit:
+				FACE_STORE['static_faces'].popitem(last = False)
+				STATIC_FACES_STATS['evictions'] += 1
 
 
 def clear_static_faces() -> None:
-	FACE_STORE['static_faces'] = {}
+	with FACE_STORE_LOCK:
+		FACE_STORE['static_faces'] = OrderedDict()
+
 
+def get_static_faces_stats() -> Dict[str, int]:
+	return STATIC_FACES_STATS.copy()
 
+
+# 已知帧序号时写入键中,同一帧经过不同处理器后内容不同,仍需内容哈希区分
 def create_frame_hash(vision_frame : VisionFrame) -> Optional[str]:
-	return hashlib.sha1(vision_frame.tobytes()).hexdigest() if numpy.any(vision_frame) else None
+	sample_hash = create_sample_hash(vision_frame)
+	frame_number = get_tracking_frame_number()
+	if sample_hash and frame_number is not None:
+		return str(frame_number) + '-' + sample_hash
+	return sample_hash
+
+
+# 只对均匀抽样的像素求哈希,避免整帧sha1的开销
+def create_sample_hash(vision_frame : VisionFrame) -> Optional[str]:
+	frame_height, frame_width = vision_frame.shape[:2]
+	sample_vision_frame = numpy.ascontiguousarray(vision_frame[::max(frame_height // FRAME_HASH_SIZE, 1), ::max(frame_width // FRAME_HASH_SIZE, 1)])
+	if numpy.any(sample_vision_frame):
+		sample_hash = hashlib.blake2b(sample_vision_frame.tobytes(), digest_size = 16)
+		sample_hash.update(str(vision_frame.shape).encode())
+		return sample_hash.hexdigest()
+	return None
 
 
 def get_reference_faces() -> Optional[FaceSet]:
@@ -46,3 +90,4 @@ def append_reference_face(name : str, face : Face) -> None:
 
 def clear_reference_faces() -> None:
 	FACE_STORE['reference_faces'] = {}
+	clear_face_indexes()
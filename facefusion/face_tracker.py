@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import cv2
+import numpy
+
+import facefusion.globals
+from facefusion.face_helper import convert_face_landmark_68_to_5
+from facefusion.typing import Face, FaceTrack, Matrix, VisionFrame
+
+FACE_TRACKS : OrderedDict[int, FaceTrack] = OrderedDict()
+FACE_TRACK_LIMIT = 64
+FACE_TRACKER_LOCK : threading.Lock = threading.Lock()
+FACE_TRACKER_CONTEXT = threading.local()
+TRACK_SCORE = 0.8
+SCENE_CHANGE_DISTANCE = 30
+
+
+# 标记当前线程处理的帧序号,只有视频帧才会参与跟踪
+@contextmanager
+def track_frame_number(frame_number : Optional[int]) -> Iterator[None]:
+	previous_frame_number = get_tracking_frame_number()
+	FACE_TRACKER_CONTEXT.frame_number = frame_number
+	try:
+		yield
+	finally:
+		FACE_TRACKER_CONTEXT.frame_number = previous_frame_number
+
+
+def get_tracking_frame_number() -> Optional[int]:
+	return getattr(FACE_TRACKER_CONTEXT, 'frame_number', None)
+
+
+# 每个检测间隔对应一个跟踪窗口,窗口内第一次检测的结果作为跟踪起点
+def get_face_track_index() -> Optional[int]:
+	frame_number = get_tracking_frame_number()
+	if frame_number is not None and facefusion.globals.face_detector_interval and facefusion.globals.face_detector_interval > 1:
+		return frame_number // facefusion.globals.face_detector_interval
+	return None
+
+
+def track_faces(vision_frame : VisionFrame) -> Optional[List[Face]]:
+	face_track_index = get_face_track_index()
+	if face_track_index is None:
+		return None
+	with FACE_TRACKER_LOCK:
+		face_track = FACE_TRACKS.get(face_track_index)
+	if not face_track:
+		return None
+	previous_vision_frame = face_track.get('vision_frame')
+	track_vision_frame = prepare_track_frame(vision_frame)
+	if track_vision_frame.shape != previous_vision_frame.shape or is_scene_changed(previous_vision_frame, track_vision_frame):
+		return None
+	faces = []
+	for face in face_track.get('faces'):
+		tracked_face = track_face(previous_vision_frame, track_vision_frame, face)
+		# 任意一张人脸跟踪失败,整帧回退到检测
+		if not tracked_face:
+			return None
+		faces.append(tracked_face)
+	return faces
+
+
+def set_face_track(vision_frame : VisionFrame, faces : List[Face]) -> None:
+	face_track_index = get_face_track_index()
+	if face_track_index is None or not faces:
+		return
+	face_track : FaceTrack =\
+	{
+		'vision_frame': prepare_track_frame(vision_frame),
+		'faces': faces
+	}
+	with FACE_TRACKER_LOCK:
+		FACE_TRACKS[face_track_index] = face_track
+		FACE_TRACKS.move_to_end(face_track_index)
+		while len(FACE_TRACKS) > FACE_TRACK_LIMIT:
+			FACE_TRACKS.popitem(last = False)
+
+
+def clear_face_tracks() -> None:
+	with FACE_TRACKER_LOCK:
+		FACE_TRACKS.clear()
+
+
+def prepare_track_frame(vision_frame : VisionFrame) -> VisionFrame:
+	if vision_frame.ndim == 3:
+		return cv2.cvtColor(vision_frame, cv2.COLOR_BGR2GRAY)
+	return vision_frame
+
+
+def is_scene_changed(previous_vision_frame : VisionFrame, vision_frame : VisionFrame) -> bool:
+	previous_thumbnail_frame = cv2.resize(previous_vision_frame, (64, 36), interpolation = cv2.INTER_AREA)
+	thumbnail_frame = cv2.resize(vision_frame, (64, 36), interpolation = cv2.INTER_AREA)
+	return bool(numpy.mean(cv2.absdiff(previous_thumbnail_frame, thumbnail_frame)) > SCENE_CHANGE_DISTANCE)
+
+
+# 用金字塔LK光流跟踪68个关键点,前后向误差过大的点视为跟踪失败
+def track_face(previous_vision_frame : VisionFrame, vision_frame : VisionFrame, face : Face) -> Optional[Face]:
+	face_landmark_68 = face.landmarks.get('68').reshape(-1, 1, 2).astype(numpy.float32)
+	face_size = numpy.subtract(face.bounding_box[2:], face.bounding_box[:2]).max()
+	track_criteria = (cv2.TERM_CRITERIA_COUNT | cv2.TERM_CRITERIA_EPS, 30, 0.01)
+	track_landmark_68, track_status, _ = cv2.calcOpticalFlowPyrLK(previous_vision_frame, vision_frame, face_landmark_68, None, winSize = (21, 21), maxLevel = 3, criteria = track_criteria)
+	if track_landmark_68 is None:
+		return None
+	back_landmark_68, back_status, _ = cv2.calcOpticalFlowPyrLK(vision_frame, previous_vision_frame, track_landmark_68, None, winSize = (21, 21), maxLevel = 3, criteria = track_criteria)
+	if back_landmark_68 is None:
+		return None
+	track_error = numpy.linalg.norm(back_landmark_68 - face_landmark_68, axis = 2).ravel()
+	track_mask = track_status.ravel().astype(bool) & back_status.ravel().astype(bool) & (track_error < max(face_size * 0.01, 1.0))
+	if numpy.mean(track_mask) < TRACK_SCORE:
+		return None
+	affine_matrix, _ = cv2.estimateAffinePartial2D(face_landmark_68[track_mask], track_landmark_68[track_mask])
+	if affine_matrix is None:
+		return None
+	return transform_face(face, affine_matrix, track_landmark_68.reshape(-1, 2), track_mask)
+
+
+# 跟踪成功的点直接使用,其余关键点与人脸框按相似变换移动,身份特征沿用检测结果
+def transform_face(face : Face, affine_matrix : Matrix, track_landmark_68 : numpy.ndarray, track_mask : numpy.ndarray) -> Face:
+	face_landmark_68 = transform_points(face.landmarks.get('68'), affine_matrix)
+	face_landmark_68[track_mask] = track_landmark_68[track_mask]
+	face_landmark_5_68 = transform_points(face.landmarks.get('5/68'), affine_matrix)
+	if face.scores.get('landmarker') > facefusion.globals.face_landmarker_score:
+		face_landmark_5_68 = convert_face_landmark_68_to_5(face_landmark_68)
+	x1, y1, x2, y2 = face.bounding_box
+	bounding_box_points = transform_points(numpy.array([ [ x1, y1 ], [ x2, y1 ], [ x2, y2 ], [ x1, y2 ] ]), affine_matrix)
+	bounding_box = numpy.concatenate([ bounding_box_points.min(axis = 0), bounding_box_points.max(axis = 0) ])
+	landmarks =\
+	{
+		'5': transform_points(face.landmarks.get('5'), affine_matrix),
+		'5/68': face_landmark_5_68,
+		'68': face_landmark_68,
+		'68/5': transform_points(face.landmarks.get('68/5'), affine_matrix)
+	}
+	return face._replace(bounding_box = bounding_box, landmarks = landmarks)
+
+
+def transform_points(points : numpy.ndarray, affine_matrix : Matrix) -> numpy.ndarray:
+	return cv2.transform(numpy.asarray(points, dtype = numpy.float32).reshape(1, -1, 2), affine_matrix).reshape(-1, 2)
@@ -1,20 +1,24 @@
 import shutil
-from typing import List, Optional
+from typing import Generator, List, Optional, Set, Tuple
 import os
 import subprocess
+import cv2
+import numpy
 import filetype
 
 import facefusion.globals
 from facefusion import logger, process_manager
-from facefusion.typing import OutputVideoPreset, Fps, AudioBuffer
+from facefusion.typing import OutputVideoPreset, Fps, AudioBuffer, VisionFrame
 from facefusion.filesystem import get_temp_frames_pattern, get_temp_output_video_path, get_temp_directory_path, \
 	get_out_temp_frames_pattern, has_files, exist_temp_directory, is_need_range, get_out_temp_frame_paths_range, \
-	get_temp_frame_paths_range, write_frame_range_file, read_frame_range_file, clear_temp, create_temp
-from facefusion.vision import restrict_video_fps, count_video_frame_total
+	get_temp_frame_paths_range, write_frame_range_file, read_frame_range_file, clear_temp, create_temp, is_file
+from facefusion.vision import restrict_video_fps, count_video_frame_total, unpack_resolution, detect_video_fps
 
-# 是否使用了历史帧
-is_use_history_frame = False
-def run_ffmpeg(args: List[str], must_done: bool = False, skip_cuda: bool = False) -> bool:
+# 使用历史帧的目标路径,批处理时可能同时提取多个目标
+HISTORY_FRAME_TARGETS : Set[str] = set()
+
+
+def run_ffmpeg(args: List[str], must_done: bool = False, skip_cuda: bool = False, until_done: bool = False) -> bool:
 	# commands = [ 'ffmpeg']
 	commands = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
 	# 增加 '-hwaccel', 'cuda'
@@ -26,7 +30,8 @@ def run_ffmpeg(args: List[str], must_done: bool = False, skip_cuda: bool = False
 		return os.system(' '.join(commands)) == 0
 	process = subprocess.Popen(commands, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
 
-	while process_manager.is_processing():
+	# until_done: 不依赖处理状态等待完成(后台预取),仅在停止时放弃
+	while process_manager.is_processing() or (until_done and not process_manager.is_stopping()):
 		try:
 			if facefusion.globals.log_level == 'debug':
 				log_debug(process)
@@ -37,10 +42,10 @@ def run_ffmpeg(args: List[str], must_done: bool = False, skip_cuda: bool = False
 	return process.returncode == 0
 
 
-def open_ffmpeg(args: List[str]) -> subprocess.Popen[bytes]:
+def open_ffmpeg(args: List[str], skip_cuda: bool = False) -> subprocess.Popen[bytes]:
 	commands = ['ffmpeg', '-hide_banner', '-loglevel', 'quiet']
 	# 增加 '-hwaccel', 'cuda'
-	if facefusion.globals.hwaccel_cuda:
+	if not skip_cuda and facefusion.globals.hwaccel_cuda:
 		commands.extend(['-hwaccel', 'cuda'])
 	commands.extend(args)
 	return subprocess.Popen(commands, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
@@ -55,33 +60,113 @@ def log_debug(process: subprocess.Popen[bytes]) -> None:
 			logger.debug(error.strip(), __name__.upper())
 
 
-def extract_frames(target_path: str, temp_video_resolution: str, temp_video_fps: Fps) -> bool:
-	global is_use_history_frame
+def extract_frames(target_path: str, temp_video_resolution: str, temp_video_fps: Fps, until_done: bool = False) -> bool:
 	trim_frame_start = facefusion.globals.trim_frame_start
 	trim_frame_end = facefusion.globals.trim_frame_end
 	temp_frames_pattern = get_temp_frames_pattern(target_path, '%04d')
 	# 如果是跳过的情况判断,是否有目录并且有图片
 	if facefusion.globals.skip_extract_frames and exist_temp_directory(target_path):
-		is_use_history_frame = True
+		HISTORY_FRAME_TARGETS.add(target_path)
 		return True
-	is_use_history_frame = False
-	commands = ['-i', target_path, '-s', str(temp_video_resolution), '-q:v', '0']
+	HISTORY_FRAME_TARGETS.discard(target_path)
+	seek_commands, trim_filter = create_trim_commands(target_path, trim_frame_start, trim_frame_end, temp_video_fps)
+	commands = seek_commands + ['-i', target_path, '-s', str(temp_video_resolution), '-q:v', '0']
 	# 重新提取之前清理目录,删除目录中所有文件
 	shutil.rmtree(get_temp_directory_path(target_path), ignore_errors=True)
 	# 重建
 	create_temp(target_path)
 	write_frame_range_file(target_path, trim_frame_start, trim_frame_end)
-	if trim_frame_start is not None and trim_frame_end is not None:
-		commands.extend(['-vf', 'trim=start_frame=' + str(trim_frame_start) + ':end_frame=' + str(
-			trim_frame_end) + ',fps=' + str(temp_video_fps)])
-	elif trim_frame_start is not None:
-		commands.extend(['-vf', 'trim=start_frame=' + str(trim_frame_start) + ',fps=' + str(temp_video_fps)])
-	elif trim_frame_end is not None:
-		commands.extend(['-vf', 'trim=end_frame=' + str(trim_frame_end) + ',fps=' + str(temp_video_fps)])
-	else:
-		commands.extend(['-vf', 'fps=' + str(temp_video_fps)])
+	commands.extend(['-vf', trim_filter])
 	commands.extend(['-vsync', '0', temp_frames_pattern])
-	return run_ffmpeg(commands)
+	return run_ffmpeg(commands, until_done = until_done)
+
+
+def create_trim_filter(trim_frame_start: Optional[int], trim_frame_end: Optional[int], temp_video_fps: Fps) -> str:
+	if trim_frame_start is not None and trim_frame_end is not None:
+		return 'trim=start_frame=' + str(trim_frame_start) + ':end_frame=' + str(trim_frame_end) + ',fps=' + str(temp_video_fps)
+	if trim_frame_start is not None:
+		return 'trim=start_frame=' + str(trim_frame_start) + ',fps=' + str(temp_video_fps)
+	if trim_frame_end is not None:
+		return 'trim=end_frame=' + str(trim_frame_end) + ',fps=' + str(temp_video_fps)
+	return 'fps=' + str(temp_video_fps)
+
+
+# 有起始帧时先在输入端跳转到起始帧之前的关键帧,只解码需要的部分,trim滤镜改为相对跳转位置
+# 跳转时间取起始帧前半帧,避免时间戳取整丢失起始帧
+def create_trim_commands(target_path: str, trim_frame_start: Optional[int], trim_frame_end: Optional[int], temp_video_fps: Fps) -> Tuple[List[str], str]:
+	video_fps = detect_video_fps(target_path) if trim_frame_start else None
+
+	if trim_frame_start and video_fps:
+		seek_commands = ['-ss', str((trim_frame_start - 0.5) / video_fps)]
+		if trim_frame_end is not None:
+			return seek_commands, create_trim_filter(None, trim_frame_end - trim_frame_start, temp_video_fps)
+		return seek_commands, create_trim_filter(None, None, temp_video_fps)
+	return [], create_trim_filter(trim_frame_start, trim_frame_end, temp_video_fps)
+
+
+# 通过管道读取原始视频帧,不写入临时图片
+def open_video_reader(target_path: str, temp_video_resolution: str, temp_video_fps: Fps) -> subprocess.Popen[bytes]:
+	trim_frame_start = facefusion.globals.trim_frame_start
+	trim_frame_end = facefusion.globals.trim_frame_end
+	seek_commands, trim_filter = create_trim_commands(target_path, trim_frame_start, trim_frame_end, temp_video_fps)
+	commands = seek_commands + ['-i', target_path, '-s', str(temp_video_resolution), '-vf', trim_filter, '-vsync', '0', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+	return open_ffmpeg(commands)
+
+
+def read_video_frames(process: subprocess.Popen[bytes], temp_video_resolution: str) -> Generator[VisionFrame, None, None]:
+	temp_video_width, temp_video_height = unpack_resolution(temp_video_resolution)
+	frame_size = temp_video_width * temp_video_height * 3
+
+	while True:
+		frame_buffer = process.stdout.read(frame_size)
+		if len(frame_buffer) < frame_size:
+			break
+		yield numpy.frombuffer(frame_buffer, dtype=numpy.uint8).reshape(temp_video_height, temp_video_width, 3).copy()
+
+
+def close_video_reader(process: subprocess.Popen[bytes]) -> None:
+	if process.poll() is None:
+		process.kill()
+	process.wait()
+
+
+# 通过管道把处理后的帧直接写入编码器
+def open_video_writer(target_path: str, output_video_resolution: str, output_video_fps: Fps) -> subprocess.Popen[bytes]:
+	temp_video_fps = restrict_video_fps(target_path, output_video_fps)
+	temp_output_video_path = get_temp_output_video_path(target_path)
+	commands = ['-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', str(output_video_resolution), '-r', str(temp_video_fps), '-i', '-', '-c:v', facefusion.globals.output_video_encoder]
+	commands.extend(create_video_compression_commands())
+	commands.extend(['-vf', 'framerate=fps=' + str(output_video_fps), '-pix_fmt', 'yuv420p', '-colorspace', 'bt709', '-y', temp_output_video_path])
+	return open_ffmpeg(commands, skip_cuda=True)
+
+
+def write_video_frame(process: subprocess.Popen[bytes], vision_frame: VisionFrame, output_video_resolution: str) -> bool:
+	output_video_width, output_video_height = unpack_resolution(output_video_resolution)
+	# 帧处理器(如frame_enhancer)可能放大了帧,这里统一到输出分辨率
+	if vision_frame.shape[1] != output_video_width or vision_frame.shape[0] != output_video_height:
+		vision_frame = cv2.resize(vision_frame, (output_video_width, output_video_height))
+	try:
+		process.stdin.write(numpy.ascontiguousarray(vision_frame, dtype=numpy.uint8).tobytes())
+		return True
+	except (BrokenPipeError, OSError):
+		return False
+
+
+def close_video_writer(process: subprocess.Popen[bytes]) -> bool:
+	try:
+		process.stdin.close()
+	except (BrokenPipeError, OSError):
+		pass
+	return process.wait() == 0
+
+
+# 中途失败时终止编码器,并删除写了一半的视频
+def discard_video_writer(process: subprocess.Popen[bytes], target_path: str) -> None:
+	process.kill()
+	process.wait()
+	temp_output_video_path = get_temp_output_video_path(target_path)
+	if is_file(temp_output_video_path):
+		os.remove(temp_output_video_path)
 
 
 def merge_video(target_path: str, output_video_resolution: str, output_video_fps: Fps) -> bool:
@@ -89,7 +174,7 @@ def merge_video(target_path: str, output_video_resolution: str, output_video_fps
 	temp_output_video_path = get_temp_output_video_path(target_path)
 	total_frame = count_video_frame_total(target_path)
 	# 需要范围控制,写入文件列表后作为参数运行
-	if is_need_range(total_frame):
+	if is_need_range(target_path, total_frame):
 		temp_frames_pattern = get_temp_frame_paths_range(target_path,
 														 facefusion.globals.trim_frame_start or 1,
 														 facefusion.globals.trim_frame_end or total_frame) if not facefusion.globals.out_new_dir else get_out_temp_frame_paths_range(
@@ -116,6 +201,48 @@ def merge_video(target_path: str, output_video_resolution: str, output_video_fps
 		commands = ['-r', str(temp_video_fps), '-i', temp_frames_pattern, '-s', str(output_video_resolution), '-c:v',
 					facefusion.globals.output_video_encoder]
 
+	commands.extend(create_video_compression_commands())
+	commands.extend(
+		['-vf', 'framerate=fps=' + str(output_video_fps), '-pix_fmt', 'yuv420p', '-colorspace', 'bt709', '-y',
+		 temp_output_video_path])
+	return run_ffmpeg(commands)
+
+
+# 按列表无损拼接多个视频片段,与merge_video的source.txt方式相同
+def concat_video(target_path: str, segment_paths: List[str]) -> bool:
+	temp_output_video_path = get_temp_output_video_path(target_path)
+	concat_txt_path = os.path.join(get_temp_directory_path(target_path), 'segments.txt')
+	with open(concat_txt_path, 'w') as f:
+		for segment_path in segment_paths:
+			f.write(f"file '{os.path.abspath(segment_path)}'" + '\n')
+	commands = ['-f', 'concat', '-safe', '0', '-i', concat_txt_path, '-c', 'copy', '-y', temp_output_video_path]
+	return run_ffmpeg(commands, skip_cuda=True)
+
+
+# 通过ffprobe读取关键帧的帧序号,只读取数据包不解码
+def detect_video_keyframes(target_path: str) -> List[int]:
+	commands = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', target_path]
+	try:
+		output = subprocess.run(commands, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode()
+	except OSError:
+		return []
+	packet_times = []
+	keyframe_times = []
+	for line in output.splitlines():
+		values = line.strip().split(',')
+		if len(values) >= 2 and values[0] not in ['', 'N/A']:
+			packet_time = float(values[0])
+			packet_times.append(packet_time)
+			if values[1].startswith('K'):
+				keyframe_times.append(packet_time)
+	# 数据包按解码顺序排列,按显示时间排序后得到帧序号
+	packet_times.sort()
+	frame_numbers = { packet_time: frame_number for frame_number, packet_time in enumerate(packet_times) }
+	return sorted(frame_numbers[keyframe_time] for keyframe_time in keyframe_times)
+
+
+def create_video_compression_commands() -> List[str]:
+	commands = []
 	if facefusion.globals.output_video_encoder in ['libx264', 'libx265']:
 		output_video_compression = round(51 - (facefusion.globals.output_video_quality * 0.51))
 		commands.extend(['-crf', str(output_video_compression), '-preset', facefusion.globals.output_video_preset])
@@ -130,10 +257,7 @@ def merge_video(target_path: str, output_video_resolution: str, output_video_fps
 		output_video_compression = round(51 - (facefusion.globals.output_video_quality * 0.51))
 		commands.extend(['-qp_i', str(output_video_compression), '-qp_p', str(output_video_compression), '-quality',
 						 map_amf_preset(facefusion.globals.output_video_preset)])
-	commands.extend(
-		['-vf', 'framerate=fps=' + str(output_video_fps), '-pix_fmt', 'yuv420p', '-colorspace', 'bt709', '-y',
-		 temp_output_video_path])
-	return run_ffmpeg(commands)
+	return commands
 
 
 def copy_image(target_path: str, output_path: str, temp_image_resolution: str) -> bool:
@@ -1,6 +1,6 @@
 import base64
 import fnmatch
-from typing import List, Optional
+from typing import Dict, List, Optional, Set
 import glob
 import os
 import shutil
@@ -15,6 +15,8 @@ from facefusion import logger
 
 TEMP_DIRECTORY_PATH = os.path.join(tempfile.gettempdir(), 'facefusion')
 TEMP_OUTPUT_VIDEO_NAME = 'temp.mp4'
+FRAME_JOURNAL_NAME = 'frame_journal.txt'
+FRAME_JOURNAL_STAGING_NAME = 'frame_journal'
 
 
 # 判断是否存在输出的临时目录,并且里面有文件
@@ -26,11 +28,11 @@ def exist_temp_directory(target_path: str) -> bool:
 
 
 # 判断是否需要范围取帧
-def is_need_range(total_frame) -> bool:
-	from facefusion.ffmpeg import is_use_history_frame
-	if is_use_history_frame:
+def is_need_range(target_path: str, total_frame) -> bool:
+	from facefusion.ffmpeg import HISTORY_FRAME_TARGETS
+	if target_path in HISTORY_FRAME_TARGETS:
 		# 需要判断范围帧是否满足
-		old_start, old_end = read_frame_range_file(facefusion.globals.target_path)
+		old_start, old_end = read_frame_range_file(target_path)
 		if old_start or old_end:
 			old_start = old_start or 1
 			old_end = old_end or total_frame
@@ -103,7 +105,7 @@ def get_temp_frame_paths(target_path: str) -> List[str]:
 	from facefusion.vision import count_video_frame_total
 	total_frame = count_video_frame_total(target_path)
 	# 如果是跳过的情况判断,并且临时目录有文件,并且指定开始帧结束帧,需要去手动匹配
-	if is_need_range(total_frame):
+	if is_need_range(target_path, total_frame):
 		return get_temp_frame_paths_range(target_path, facefusion.globals.trim_frame_start or 1,
 										  facefusion.globals.trim_frame_end or total_frame)
 	temp_frames_pattern = get_temp_frames_pattern(target_path, '*')
@@ -121,7 +123,7 @@ def get_out_temp_frame_paths(target_path: str) -> List[str]:
 	from facefusion.vision import count_video_frame_total
 	total_frame = count_video_frame_total(target_path)
 	# 如果是跳过的情况判断,并且临时目录有文件,并且指定开始帧结束帧,需要去手动匹配
-	if is_need_range(total_frame):
+	if is_need_range(target_path, total_frame):
 		return get_out_temp_frame_paths_range(target_path, facefusion.globals.trim_frame_start or 1,
 											  facefusion.globals.trim_frame_end or total_frame)
 	temp_frames_pattern = get_out_temp_frames_pattern(target_path, '*')
@@ -158,6 +160,80 @@ def read_frame_range_file(target_path: str) -> Optional[tuple[int, int]]:
 	return (None, None)
 
 
+def get_frame_journal_path(target_path: str) -> str:
+	return os.path.join(get_temp_directory_path(target_path), FRAME_JOURNAL_NAME)
+
+
+# 原地写入的帧先写到暂存目录,按处理器分目录,记录完成后再替换原帧
+def get_frame_journal_staging_path(target_path: str, frame_processors: List[str], frame_path: str) -> str:
+	return os.path.join(get_temp_directory_path(target_path), FRAME_JOURNAL_STAGING_NAME, '-'.join(frame_processors), os.path.basename(frame_path))
+
+
+# 新建帧处理记录,首行记录处理设置的指纹,设置变化后旧的记录不再使用
+def create_frame_journal(target_path: str, journal_fingerprint: str) -> None:
+	shutil.rmtree(os.path.join(get_temp_directory_path(target_path), FRAME_JOURNAL_STAGING_NAME), ignore_errors=True)
+	with open(get_frame_journal_path(target_path), 'w') as frame_journal_file:
+		frame_journal_file.write('# ' + journal_fingerprint + '\n')
+
+
+def read_frame_journal_fingerprint(target_path: str) -> Optional[str]:
+	frame_journal_path = get_frame_journal_path(target_path)
+	if is_file(frame_journal_path):
+		with open(frame_journal_path, 'rb') as frame_journal_file:
+			journal_header = frame_journal_file.readline().decode(errors='ignore')
+		if journal_header.startswith('# ') and journal_header.endswith('\n'):
+			return journal_header[2:-1]
+	return None
+
+
+# 追加帧处理完成记录,每行格式: <帧处理器> <帧文件名>
+def append_frame_journal(target_path: str, frame_processors: List[str], frame_path: str) -> None:
+	frame_name = os.path.basename(frame_path)
+	journal_content = ''.join(frame_processor + ' ' + frame_name + '\n' for frame_processor in frame_processors)
+	# O_APPEND单次写入,多线程与多进程同时追加也不会交错
+	journal_descriptor = os.open(get_frame_journal_path(target_path), os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+	try:
+		os.write(journal_descriptor, journal_content.encode())
+	finally:
+		os.close(journal_descriptor)
+
+
+# 读取帧处理完成记录,忽略崩溃时写了一半的行
+def read_frame_journal(target_path: str) -> Dict[str, Set[str]]:
+	frame_journal: Dict[str, Set[str]] = {}
+	frame_journal_path = get_frame_journal_path(target_path)
+	if is_file(frame_journal_path):
+		with open(frame_journal_path, 'rb') as frame_journal_file:
+			journal_lines = frame_journal_file.read().decode(errors='ignore').split('\n')
+		for journal_line in journal_lines[:-1]:
+			journal_values = journal_line.split(' ')
+			if len(journal_values) == 2 and all(journal_values) and journal_values[0] != '#':
+				frame_processor, frame_name = journal_values
+				frame_journal.setdefault(frame_processor, set()).add(frame_name)
+	return frame_journal
+
+
+# 中断后处理暂存的帧: 已记录完成的替换原帧,未记录的丢弃,原帧保持未处理
+def restore_frame_journal(target_path: str, frame_journal: Dict[str, Set[str]]) -> None:
+	staging_directory_path = os.path.join(get_temp_directory_path(target_path), FRAME_JOURNAL_STAGING_NAME)
+	if not os.path.isdir(staging_directory_path):
+		return
+	for processors_name in os.listdir(staging_directory_path):
+		frame_processors = processors_name.split('-')
+		for frame_name in os.listdir(os.path.join(staging_directory_path, processors_name)):
+			staging_path = os.path.join(staging_directory_path, processors_name, frame_name)
+			if all(frame_name in frame_journal.get(frame_processor, set()) for frame_processor in frame_processors):
+				os.replace(staging_path, os.path.join(get_temp_directory_path(target_path), frame_name))
+			else:
+				os.remove(staging_path)
+
+
+def clear_frame_journal(target_path: str) -> None:
+	shutil.rmtree(os.path.join(get_temp_directory_path(target_path), FRAME_JOURNAL_STAGING_NAME), ignore_errors=True)
+	if is_file(get_frame_journal_path(target_path)):
+		os.remove(get_frame_journal_path(target_path))
+
+
 def get_temp_frames_pattern(target_path: str, temp_frame_prefix: str) -> str:
 	temp_directory_path = get_temp_directory_path(target_path)
 	return os.path.join(temp_directory_path, temp_frame_prefix + '.' + facefusion.globals.temp_frame_format)
@@ -173,6 +249,13 @@ def get_out_temp_frames_pattern(target_path: str, temp_frame_prefix: str) -> str
 	return os.path.join(temp_directory_path, temp_frame_prefix + '.' + facefusion.globals.temp_frame_format)
 
 
+# 处理后帧的写入路径,写入新目录时替换为out目录
+def get_out_temp_frame_path(target_path: str, temp_frame_path: str) -> str:
+	if facefusion.globals.out_new_dir:
+		return temp_frame_path.replace(get_temp_directory_path(target_path), get_out_temp_directory_path(target_path))
+	return temp_frame_path
+
+
 import hashlib
 
 
@@ -227,6 +310,16 @@ def create_directory(directory_path: str) -> None:
 	Path(directory_path).mkdir(parents=True, exist_ok=True)
 
 
+# 优先使用硬链接,不支持时复制文件
+def link_file(file_path: str, link_path: str) -> None:
+	if os.path.lexists(link_path):
+		os.remove(link_path)
+	try:
+		os.link(file_path, link_path)
+	except OSError:
+		shutil.copyfile(file_path, link_path)
+
+
 # 移动临时文件
 def move_temp(target_path: str, output_path: str) -> None:
 	temp_output_video_path = get_temp_output_video_path(target_path)
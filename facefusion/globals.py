@@ -1,6 +1,6 @@
 from typing import List, Optional
 
-from facefusion.typing import LogLevel, VideoMemoryStrategy, FaceSelectorMode, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, FaceMaskType, FaceMaskRegion, OutputVideoEncoder, OutputVideoPreset, FaceDetectorModel, FaceRecognizerModel, TempFrameFormat, Padding
+from facefusion.typing import ExecutionBackend, ShardRole, LogLevel, VideoMemoryStrategy, FaceSelectorMode, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, FaceMaskType, FaceMaskRegion, OutputVideoEncoder, OutputVideoPreset, FaceDetectorModel, FaceRecognizerModel, TempFrameFormat, Padding
 
 # general
 source_paths : Optional[List[str]] = None
@@ -17,14 +17,28 @@ out_new_dir : Optional[bool] = None
 skip_extract_frames : Optional[bool] = None
 shutdown : Optional[bool] = None
 headless : Optional[bool] = None
+shard_directory : Optional[str] = None
+shard_role : Optional[ShardRole] = None
+shard_count : Optional[int] = None
+server : Optional[bool] = None
+server_port : Optional[int] = None
 log_level : Optional[LogLevel] = None
 # execution
 execution_providers : List[str] = []
 execution_thread_count : Optional[int] = None
 execution_queue_count : Optional[int] = None
+execution_backend : Optional[ExecutionBackend] = None
+execution_model_limits : Optional[List[str]] = None
+execution_model_replicas : Optional[List[str]] = None
+execution_intra_op_threads : Optional[List[str]] = None
+execution_inter_op_threads : Optional[List[str]] = None
+execution_modes : Optional[List[str]] = None
+execution_graph_optimizations : Optional[List[str]] = None
+execution_cache_directory : Optional[str] = None
 # memory
 video_memory_strategy : Optional[VideoMemoryStrategy] = None
 system_memory_limit : Optional[int] = None
+static_face_limit : Optional[int] = None
 # face analyser
 face_analyser_order : Optional[FaceAnalyserOrder] = None
 face_analyser_age : Optional[FaceAnalyserAge] = None
@@ -33,6 +47,9 @@ face_detector_model : Optional[FaceDetectorModel] = None
 face_detector_size : Optional[str] = None
 face_detector_score : Optional[float] = None
 face_landmarker_score : Optional[float] = None
+face_detector_interval : Optional[int] = None
+face_presence_interval : Optional[int] = None
+face_cache_directory : Optional[str] = None
 face_recognizer_model : Optional[FaceRecognizerModel] = None
 # face selector
 face_selector_mode : Optional[FaceSelectorMode] = None
@@ -47,8 +64,13 @@ face_mask_regions : Optional[List[FaceMaskRegion]] = None
 # frame extraction
 trim_frame_start : Optional[int] = None
 trim_frame_end : Optional[int] = None
+# 片段在整个任务中的起始帧偏移,音频与人脸跟踪按任务内的帧序号对齐
+trim_frame_offset : Optional[int] = None
 temp_frame_format : Optional[TempFrameFormat] = None
 keep_temp : Optional[bool] = None
+stream_frames : Optional[bool] = None
+video_segment_count : Optional[int] = None
+duplicate_frame_distance : Optional[int] = None
 # output creation
 output_image_quality : Optional[int] = None
 output_image_resolution : Optional[str] = None
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import nullcontext
+from itertools import cycle
+from time import perf_counter
+from typing import Any, ContextManager, Dict, List, Optional, Tuple, Union
+
+import onnxruntime
+
+import facefusion.globals
+from facefusion import logger, wording
+from facefusion.execution import apply_execution_provider_options, encode_execution_providers
+from facefusion.filesystem import create_directory, is_file
+from facefusion.typing import InferenceStat
+
+INFERENCE_SESSIONS : Dict[Tuple[str, ...], Any] = {}
+INFERENCE_STATS : Dict[Tuple[str, ...], InferenceStat] = {}
+INFERENCE_LOCKS : Dict[Tuple[str, ...], threading.Lock] = {}
+INFERENCE_LOCK : threading.Lock = threading.Lock()
+EXECUTION_MODES : Dict[str, onnxruntime.ExecutionMode] =\
+{
+	'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+	'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL
+}
+GRAPH_OPTIMIZATION_LEVELS : Dict[str, onnxruntime.GraphOptimizationLevel] =\
+{
+	'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+	'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+	'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+	'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+}
+
+
+# 进程内共享的会话: 相同模型文件与执行设备只创建一次,首次使用时才加载
+def get_inference_session(model_path : str) -> Any:
+	inference_key = create_inference_key(model_path, facefusion.globals.execution_providers)
+	inference_session = INFERENCE_SESSIONS.get(inference_key)
+
+	if inference_session is None:
+		with get_inference_lock(inference_key):
+			inference_session = INFERENCE_SESSIONS.get(inference_key)
+			if inference_session is None:
+				inference_session = create_inference_session(inference_key, model_path, facefusion.globals.execution_providers)
+	return inference_session
+
+
+def create_inference_session(inference_key : Tuple[str, ...], model_path : str, execution_providers : List[str]) -> Any:
+	model_name = get_model_name(model_path)
+	replica_total = get_model_value(facefusion.globals.execution_model_replicas, model_name) or 1
+	inference_limit = get_model_value(facefusion.globals.execution_model_limits, model_name)
+	start_time = perf_counter()
+	inference_sessions = create_inference_sessions(model_path, model_name, replica_total, execution_providers)
+	load_time = perf_counter() - start_time
+	inference_stat : InferenceStat =\
+	{
+		'model_path': model_path,
+		'execution_providers': encode_execution_providers(execution_providers),
+		'model_size': os.path.getsize(model_path),
+		'load_time': load_time,
+		'replica_total': replica_total,
+		'run_total': 0,
+		'wait_time': 0.0
+	}
+	inference_session = InferencePool(inference_sessions, inference_limit, inference_stat)
+	INFERENCE_SESSIONS[inference_key] = inference_session
+	INFERENCE_STATS[inference_key] = inference_stat
+	logger.debug(wording.get('inference_session_loaded').format(model_name = model_name, load_time = round(load_time, 2)), __name__.upper())
+	return inference_session
+
+
+# 有优化后的模型缓存时直接加载并跳过图优化,没有时由第一个副本写入缓存
+def create_inference_sessions(model_path : str, model_name : str, replica_total : int, execution_providers : List[str]) -> List[Any]:
+	optimized_model_path = get_optimized_model_path(model_path, model_name, execution_providers)
+	temp_optimized_model_path = optimized_model_path + '.' + str(os.getpid()) + '.tmp.onnx' if optimized_model_path else None
+	inference_sessions = []
+
+	for _ in range(replica_total):
+		session_options = create_session_options(model_name, replica_total)
+		inference_model_path = model_path
+		if optimized_model_path and is_file(optimized_model_path):
+			session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+			inference_model_path = optimized_model_path
+		elif optimized_model_path:
+			create_directory(os.path.dirname(optimized_model_path))
+			session_options.optimized_model_filepath = temp_optimized_model_path
+		inference_sessions.append(onnxruntime.InferenceSession(inference_model_path, sess_options = session_options, providers = apply_execution_provider_options(execution_providers)))
+		if temp_optimized_model_path and is_file(temp_optimized_model_path):
+			os.replace(temp_optimized_model_path, optimized_model_path)
+	return inference_sessions
+
+
+# 多个副本默认平分CPU线程,避免副本之间互相争抢,按模型配置的线程数优先
+def create_session_options(model_name : str, replica_total : int) -> onnxruntime.SessionOptions:
+	session_options = onnxruntime.SessionOptions()
+	intra_op_thread_count = get_model_value(facefusion.globals.execution_intra_op_threads, model_name)
+	inter_op_thread_count = get_model_value(facefusion.globals.execution_inter_op_threads, model_name)
+	execution_mode = get_model_option(facefusion.globals.execution_modes, model_name)
+	graph_optimization = get_model_option(facefusion.globals.execution_graph_optimizations, model_name)
+
+	if intra_op_thread_count:
+		session_options.intra_op_num_threads = intra_op_thread_count
+	elif replica_total > 1:
+		session_options.intra_op_num_threads = max((os.cpu_count() or 1) // replica_total, 1)
+	if inter_op_thread_count:
+		session_options.inter_op_num_threads = inter_op_thread_count
+	if execution_mode in EXECUTION_MODES:
+		session_options.execution_mode = EXECUTION_MODES.get(execution_mode)
+	if graph_optimization in GRAPH_OPTIMIZATION_LEVELS:
+		session_options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS.get(graph_optimization)
+	return session_options
+
+
+# 优化后的图与硬件相关,只缓存纯CPU执行的模型,按运行时版本、模型文件与优化选项区分
+def get_optimized_model_path(model_path : str, model_name : str, execution_providers : List[str]) -> Optional[str]:
+	if facefusion.globals.execution_cache_directory and encode_execution_providers(execution_providers) == [ 'cpu' ]:
+		cache_values =\
+		[
+			onnxruntime.__version__,
+			os.path.realpath(model_path),
+			os.path.getsize(model_path),
+			os.path.getmtime(model_path),
+			get_model_option(facefusion.globals.execution_modes, model_name),
+			get_model_option(facefusion.globals.execution_graph_optimizations, model_name)
+		]
+		cache_key = hashlib.md5(json.dumps(cache_values).encode()).hexdigest()
+		return os.path.join(facefusion.globals.execution_cache_directory, model_name + '.' + cache_key + '.onnx')
+	return None
+
+
+def get_model_name(model_path : str) -> str:
+	model_name, _ = os.path.splitext(os.path.basename(model_path))
+	return model_name
+
+
+# 解析 模型名=数量 形式的配置
+def get_model_value(model_values : Optional[List[str]], model_name : str) -> Optional[int]:
+	value = get_model_option(model_values, model_name)
+	if value and value.isdigit() and int(value) > 0:
+		return int(value)
+	return None
+
+
+# 模型名为*时作用于所有模型,单独指定的模型优先
+def get_model_option(model_values : Optional[List[str]], model_name : str) -> Optional[str]:
+	model_options = dict(model_value.partition('=')[::2] for model_value in model_values or [])
+	return model_options.get(model_name) or model_options.get('*')
+
+
+# 会话设置不同的同一模型分别创建会话,设置变化后不会复用旧的会话
+def create_inference_key(model_path : str, execution_providers : List[str]) -> Tuple[str, ...]:
+	model_name = get_model_name(model_path)
+	session_values =\
+	[
+		facefusion.globals.execution_model_replicas,
+		facefusion.globals.execution_model_limits,
+		facefusion.globals.execution_intra_op_threads,
+		facefusion.globals.execution_inter_op_threads,
+		facefusion.globals.execution_modes,
+		facefusion.globals.execution_graph_optimizations
+	]
+	session_options = [ str(get_model_option(session_value, model_name)) for session_value in session_values ]
+	return (os.path.realpath(model_path), *execution_providers, *session_options, str(facefusion.globals.execution_cache_directory))
+
+
+def get_inference_lock(inference_key : Tuple[str, ...]) -> threading.Lock:
+	with INFERENCE_LOCK:
+		return INFERENCE_LOCKS.setdefault(inference_key, threading.Lock())
+
+
+def clear_inference_sessions(model_paths : List[str]) -> None:
+	real_model_paths = [ os.path.realpath(model_path) for model_path in model_paths ]
+
+	with INFERENCE_LOCK:
+		for inference_key in list(INFERENCE_SESSIONS.keys()):
+			if inference_key[0] in real_model_paths:
+				INFERENCE_SESSIONS.pop(inference_key, None)
+				INFERENCE_STATS.pop(inference_key, None)
+
+
+def get_inference_stats() -> List[InferenceStat]:
+	return list(INFERENCE_STATS.values())
+
+
+# 会话副本池: 轮流分配副本,按模型限制并发数并统计排队等待的时间
+class InferencePool:
+	def __init__(self, inference_sessions : List[Any], inference_limit : Optional[int], inference_stat : InferenceStat) -> None:
+		self.inference_sessions = inference_sessions
+		self.inference_cycle = cycle(inference_sessions)
+		self.inference_semaphore : Union[threading.Semaphore, ContextManager[None]] = threading.Semaphore(inference_limit) if inference_limit else nullcontext()
+		self.inference_stat = inference_stat
+		self.lock = threading.Lock()
+
+	def get_inputs(self) -> Any:
+		return self.inference_sessions[0].get_inputs()
+
+	def get_outputs(self) -> Any:
+		return self.inference_sessions[0].get_outputs()
+
+	def run(self, output_names : Optional[List[str]], input_feed : Dict[str, Any]) -> Any:
+		start_time = perf_counter()
+		with self.inference_semaphore:
+			with self.lock:
+				inference_session = next(self.inference_cycle)
+				self.inference_stat['run_total'] += 1
+				self.inference_stat['wait_time'] += perf_counter() - start_time
+			return inference_session.run(output_names, input_feed)
@@ -1,18 +1,39 @@
 import os
 import sys
 import importlib
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
+import json
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, Future
+from queue import Queue, Empty, Full
 from types import ModuleType
-from typing import Any, List
+from typing import Any, Callable, Deque, Dict, Generator, Iterable, List, Optional, Set, Tuple
+import cv2
+import numpy
 from tqdm import tqdm
 
 import facefusion.globals
-from facefusion.typing import ProcessFrames, QueuePayload
+from facefusion.typing import ProcessFrames, QueuePayload, Fps, AudioFrame, VisionFrame, FrameSignature
 from facefusion.execution import encode_execution_providers
-from facefusion import logger, wording
+from facefusion import logger, wording, process_manager
+from facefusion.audio import read_static_voice, get_voice_frame, create_empty_audio_frame
+from facefusion.common_helper import get_first
+from facefusion.face_analyser import get_source_face, detect_face_presence
+from facefusion.face_store import get_reference_faces
+from facefusion.face_tracker import track_frame_number, clear_face_tracks
+from facefusion.ffmpeg import open_video_reader, read_video_frames, close_video_reader, open_video_writer, write_video_frame, close_video_writer, discard_video_writer
+from facefusion.filesystem import filter_audio_paths, get_out_temp_frame_path, get_out_temp_frame_paths, read_frame_journal, append_frame_journal, link_file, get_str_md5, \
+	create_frame_journal, read_frame_journal_fingerprint, restore_frame_journal, get_frame_journal_staging_path
+from facefusion.processors.frame.typings import FrameProcessorInputs
+from facefusion.state_helper import export_globals_state
+from facefusion.vision import read_image, write_image, detect_video_fps, restrict_video_fps, count_video_frame_total, create_frame_signature, read_frame_signature, count_dhash_distance, count_thumbnail_difference
 
 FRAME_PROCESSORS_MODULES : List[ModuleType] = []
+FRAME_PROGRESS_LISTENER : Optional[Callable[[int, int], None]] = None
+FRAME_NUMBERS : Dict[str, int] = {}
+DUPLICATE_FRAME_DIFFERENCE = 3.0
+FACE_FRAME_PROCESSORS = [ 'face_debugger', 'face_enhancer', 'face_swapper', 'lip_syncer' ]
 FRAME_PROCESSORS_METHODS =\
 [
 	'get_frame_processor',
@@ -68,25 +89,465 @@ def clear_frame_processors_modules() -> None:
 
 
 def multi_process_frames(source_paths : List[str], temp_frame_paths : List[str], process_frames : ProcessFrames) -> None:
+	# 每一轮处理的帧内容不同,跟踪状态不能沿用
+	clear_face_tracks()
+	frame_processors = [ process_frames.__module__.split('.')[-1] ]
+	frame_journal = read_history_frame_journal()
 	queue_payloads = create_queue_payloads(temp_frame_paths)
-	with tqdm(total = len(queue_payloads), desc = wording.get('processing'), unit = 'frame', ascii = ' =', disable = facefusion.globals.log_level in [ 'warn', 'error' ]) as progress:
-		progress.set_postfix(
-		{
-			'execution_providers': encode_execution_providers(facefusion.globals.execution_providers),
-			'execution_thread_count': facefusion.globals.execution_thread_count,
-			'execution_queue_count': facefusion.globals.execution_queue_count
-		})
+	frame_total = len(queue_payloads)
+	queue_payloads = filter_journal_payloads(queue_payloads, frame_journal, frame_processors)
+	with create_frame_progress(frame_total, frame_total - len(queue_payloads)) as progress:
 		with ThreadPoolExecutor(max_workers = facefusion.globals.execution_thread_count) as executor:
 			futures = []
 			queue : Queue[QueuePayload] = create_queue(queue_payloads)
-			queue_per_future = max(len(queue_payloads) // facefusion.globals.execution_thread_count * facefusion.globals.execution_queue_count, 1)
-			while not queue.empty():
-				future = executor.submit(process_frames, source_paths, pick_queue(queue, queue_per_future), progress.update)
+			# 每个线程从共享队列按需取帧,避免静态分块导致的长尾
+			for _ in range(min(facefusion.globals.execution_thread_count, len(queue_payloads))):
+				future = executor.submit(process_frames, source_paths, journal_queue(pull_queue(queue), frame_processors), progress.update)
 				futures.append(future)
 			for future_done in as_completed(futures):
 				future_done.result()
 
 
+# 读取、推理、写入分为三个阶段,通过有界队列连接
+def multi_process_staged_frames(source_paths : List[str], temp_frame_paths : List[str]) -> None:
+	clear_face_tracks()
+	frame_journal = read_history_frame_journal()
+	queue_payloads = create_queue_payloads(temp_frame_paths)
+	frame_total = len(queue_payloads)
+	queue_payloads = filter_journal_payloads(queue_payloads, frame_journal, facefusion.globals.frame_processors)
+	temp_video_fps = restrict_video_fps(facefusion.globals.target_path, facefusion.globals.output_video_fps)
+	frame_processor_inputs = create_frame_processor_inputs(source_paths, temp_video_fps)
+	source_audio_path = get_source_audio_path(source_paths)
+	execution_thread_count = facefusion.globals.execution_thread_count
+	io_thread_count = get_io_thread_count()
+	payload_queue : Queue[QueuePayload] = create_queue(queue_payloads)
+	read_queue : Queue[Optional[Tuple[QueuePayload, VisionFrame]]] = Queue(maxsize = execution_thread_count * facefusion.globals.execution_queue_count)
+	write_queue : Queue[Optional[Tuple[QueuePayload, VisionFrame]]] = Queue(maxsize = execution_thread_count * facefusion.globals.execution_queue_count)
+	abort_event = threading.Event()
+
+	def read_stage() -> None:
+		for queue_payload in process_manager.manage(pull_queue(payload_queue)):
+			frame_processors = get_pending_frame_processors(frame_journal, queue_payload['frame_path'])
+			target_vision_frame = read_image(resolve_journal_frame_path(queue_payload['frame_path'], frame_processors))
+			if not put_stage_queue(read_queue, (queue_payload, target_vision_frame), abort_event):
+				return
+
+	def infer_stage() -> None:
+		while True:
+			stage_item = get_stage_queue(read_queue, abort_event)
+			if stage_item is None:
+				return
+			queue_payload, target_vision_frame = stage_item
+			source_audio_frame = get_source_audio_frame(source_audio_path, temp_video_fps, queue_payload['frame_number'])
+			frame_processors = get_pending_frame_processors(frame_journal, queue_payload['frame_path'])
+			output_vision_frame = process_vision_frame(frame_processor_inputs, source_audio_frame, target_vision_frame, frame_processors, queue_payload['frame_number'])
+			if not put_stage_queue(write_queue, (queue_payload, output_vision_frame), abort_event):
+				return
+
+	def write_stage() -> None:
+		while True:
+			stage_item = get_stage_queue(write_queue, abort_event)
+			if stage_item is None:
+				return
+			queue_payload, output_vision_frame = stage_item
+			write_journal_frame(queue_payload['frame_path'], output_vision_frame, facefusion.globals.frame_processors)
+			progress.update()
+
+	with create_frame_progress(frame_total, frame_total - len(queue_payloads)) as progress:
+		with ThreadPoolExecutor(max_workers = execution_thread_count + io_thread_count * 2) as executor:
+			read_futures = [ executor.submit(run_stage, read_stage, abort_event) for _ in range(io_thread_count) ]
+			infer_futures = [ executor.submit(run_stage, infer_stage, abort_event) for _ in range(execution_thread_count) ]
+			write_futures = [ executor.submit(run_stage, write_stage, abort_event) for _ in range(io_thread_count) ]
+			# 上一阶段结束后,给下一阶段的每个线程发送结束标记
+			wait(read_futures)
+			for _ in infer_futures:
+				put_stage_queue(read_queue, None, abort_event)
+			wait(infer_futures)
+			for _ in write_futures:
+				put_stage_queue(write_queue, None, abort_event)
+			for future_done in as_completed(read_futures + infer_futures + write_futures):
+				future_done.result()
+
+
+def run_stage(stage : Any, abort_event : threading.Event) -> None:
+	try:
+		stage()
+	except BaseException:
+		abort_event.set()
+		raise
+
+
+def put_stage_queue(queue : Queue[Any], stage_item : Any, abort_event : threading.Event) -> bool:
+	while not abort_event.is_set():
+		try:
+			queue.put(stage_item, timeout = 0.1)
+			return True
+		except Full:
+			continue
+	return False
+
+
+def get_stage_queue(queue : Queue[Any], abort_event : threading.Event) -> Any:
+	while not abort_event.is_set():
+		try:
+			return queue.get(timeout = 0.1)
+		except Empty:
+			continue
+	return None
+
+
+def get_io_thread_count() -> int:
+	return max(facefusion.globals.execution_thread_count // 4, 1)
+
+
+def multi_process_stream(source_paths : List[str], target_path : str, temp_video_resolution : str, temp_video_fps : Fps) -> bool:
+	clear_face_tracks()
+	frame_processor_inputs = create_frame_processor_inputs(source_paths, temp_video_fps)
+	source_audio_path = get_source_audio_path(source_paths)
+	video_reader = open_video_reader(target_path, temp_video_resolution, temp_video_fps)
+	video_writer = open_video_writer(target_path, facefusion.globals.output_video_resolution, facefusion.globals.output_video_fps)
+	future_limit = facefusion.globals.execution_thread_count * facefusion.globals.execution_queue_count
+	is_written = True
+	reference_future = None
+	reference_frame_signature = None
+	duplicate_frame_total = 0
+
+	try:
+		with create_frame_progress(estimate_frame_total(target_path, temp_video_fps)) as progress:
+			with ThreadPoolExecutor(max_workers = facefusion.globals.execution_thread_count) as executor:
+				futures : Deque[Future[VisionFrame]] = deque()
+				for frame_number, target_vision_frame in enumerate(read_video_frames(video_reader, temp_video_resolution), get_frame_number_offset(temp_video_fps)):
+					if not process_manager.is_processing() or not is_written:
+						break
+					frame_signature = create_frame_signature(target_vision_frame) if is_duplicate_frame_enabled() else None
+					# 近似重复帧直接复用代表帧的处理结果
+					if reference_future and is_duplicate_frame(frame_signature, reference_frame_signature):
+						futures.append(reference_future)
+						duplicate_frame_total += 1
+					else:
+						source_audio_frame = get_source_audio_frame(source_audio_path, temp_video_fps, frame_number)
+						reference_future = executor.submit(process_vision_frame, frame_processor_inputs, source_audio_frame, target_vision_frame, None, frame_number)
+						reference_frame_signature = frame_signature
+						futures.append(reference_future)
+					# 按顺序写出已完成的帧,同时限制内存中的帧数量
+					while futures and is_written and (futures[0].done() or len(futures) >= future_limit):
+						is_written = write_video_frame(video_writer, futures.popleft().result(), facefusion.globals.output_video_resolution)
+						progress.update()
+				while futures and is_written and process_manager.is_processing():
+					is_written = write_video_frame(video_writer, futures.popleft().result(), facefusion.globals.output_video_resolution)
+					progress.update()
+				for future in futures:
+					future.cancel()
+	except BaseException:
+		discard_video_writer(video_writer, target_path)
+		raise
+	finally:
+		close_video_reader(video_reader)
+	if duplicate_frame_total:
+		logger.info(wording.get('skipping_duplicate_frames').format(frame_total = duplicate_frame_total), __name__.upper())
+	if is_written and process_manager.is_processing():
+		return close_video_writer(video_writer)
+	discard_video_writer(video_writer, target_path)
+	return False
+
+
+# 每帧只读写一次,依次执行所有帧处理器
+def multi_process_fused_frames(source_paths : List[str], temp_frame_paths : List[str]) -> List[str]:
+	multi_process_staged_frames(source_paths, temp_frame_paths)
+	if facefusion.globals.out_new_dir:
+		return get_out_temp_frame_paths(facefusion.globals.target_path)
+	return temp_frame_paths
+
+
+def create_frame_processor_inputs(source_paths : List[str], temp_video_fps : Fps) -> FrameProcessorInputs:
+	reference_faces = get_reference_faces() if 'reference' in facefusion.globals.face_selector_mode else None
+	source_face = get_source_face(source_paths)
+
+	# 预先读取音频,避免多个线程同时解析
+	if 'lip_syncer' in facefusion.globals.frame_processors:
+		for source_audio_path in filter_audio_paths(source_paths):
+			read_static_voice(source_audio_path, temp_video_fps)
+	frame_processor_inputs : FrameProcessorInputs =\
+	{
+		'reference_faces': reference_faces,
+		'source_face': source_face,
+		'source_audio_frame': create_empty_audio_frame(),
+		'target_vision_frame': None
+	}
+	return frame_processor_inputs
+
+
+def get_source_audio_path(source_paths : List[str]) -> Optional[str]:
+	if 'lip_syncer' in facefusion.globals.frame_processors:
+		return get_first(filter_audio_paths(source_paths))
+	return None
+
+
+def get_source_audio_frame(source_audio_path : Optional[str], temp_video_fps : Fps, frame_number : int) -> AudioFrame:
+	if source_audio_path:
+		source_audio_frame = get_voice_frame(source_audio_path, temp_video_fps, frame_number)
+		if numpy.any(source_audio_frame):
+			return source_audio_frame
+	return create_empty_audio_frame()
+
+
+def process_vision_frame(frame_processor_inputs : FrameProcessorInputs, source_audio_frame : AudioFrame, target_vision_frame : VisionFrame, frame_processors : Optional[List[str]] = None, frame_number : Optional[int] = None) -> VisionFrame:
+	with track_frame_number(frame_number):
+		for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
+			if frame_processors is not None and get_frame_processor_name(frame_processor_module) not in frame_processors:
+				continue
+			target_vision_frame = frame_processor_module.process_frame(
+			{
+				'reference_faces': frame_processor_inputs.get('reference_faces'),
+				'source_face': frame_processor_inputs.get('source_face'),
+				'source_audio_frame': source_audio_frame,
+				'target_vision_frame': target_vision_frame
+			})
+	return target_vision_frame
+
+
+def get_frame_processor_name(frame_processor_module : ModuleType) -> str:
+	return frame_processor_module.__name__.split('.')[-1]
+
+
+# 开启跳过提取帧时记录每帧的完成情况,中断后可以从未完成的帧继续
+def is_frame_journal_enabled() -> bool:
+	return bool(facefusion.globals.skip_extract_frames and facefusion.globals.target_path)
+
+
+# 处理设置与上次不同时,已有的记录作废
+def read_history_frame_journal() -> Dict[str, Set[str]]:
+	if is_frame_journal_enabled():
+		journal_fingerprint = create_frame_journal_fingerprint()
+		if read_frame_journal_fingerprint(facefusion.globals.target_path) != journal_fingerprint:
+			create_frame_journal(facefusion.globals.target_path, journal_fingerprint)
+		frame_journal = read_frame_journal(facefusion.globals.target_path)
+		restore_frame_journal(facefusion.globals.target_path, frame_journal)
+		if frame_journal:
+			logger.info(wording.get('resuming_frames').format(frame_total = max(len(frame_names) for frame_names in frame_journal.values())), __name__.upper())
+		return frame_journal
+	return {}
+
+
+def create_frame_journal_fingerprint() -> str:
+	globals_state = export_globals_state()
+	journal_values =\
+	[
+		facefusion.globals.source_paths,
+		facefusion.globals.frame_processors,
+		{ key: value for key, value in globals_state.get('globals').items() if key.startswith(('face_', 'reference_')) },
+		globals_state.get('frame_processors_globals')
+	]
+	return get_str_md5(json.dumps(journal_values, sort_keys = True))
+
+
+# 原地写入时先写暂存文件,记录完成后再替换原帧,中断时不会留下已处理但未记录的帧
+def is_frame_journal_staged() -> bool:
+	return is_frame_journal_enabled() and not facefusion.globals.out_new_dir
+
+
+def create_journal_staging_path(frame_processors : List[str], frame_path : str) -> str:
+	staging_path = get_frame_journal_staging_path(facefusion.globals.target_path, frame_processors, frame_path)
+	os.makedirs(os.path.dirname(staging_path), exist_ok = True)
+	return staging_path
+
+
+def commit_journal_frame(staging_path : str, frame_path : str, frame_processors : List[str]) -> None:
+	append_frame_journal(facefusion.globals.target_path, frame_processors, frame_path)
+	os.replace(staging_path, frame_path)
+
+
+def write_journal_frame(frame_path : str, output_vision_frame : VisionFrame, frame_processors : List[str]) -> None:
+	if is_frame_journal_staged():
+		staging_path = create_journal_staging_path(frame_processors, frame_path)
+		write_image(staging_path, output_vision_frame)
+		commit_journal_frame(staging_path, frame_path, frame_processors)
+		return
+	write_image(get_out_temp_frame_path(facefusion.globals.target_path, frame_path), output_vision_frame)
+	if is_frame_journal_enabled():
+		append_frame_journal(facefusion.globals.target_path, frame_processors, frame_path)
+
+
+def get_pending_frame_processors(frame_journal : Dict[str, Set[str]], frame_path : str) -> List[str]:
+	frame_name = os.path.basename(frame_path)
+	return [ frame_processor for frame_processor in facefusion.globals.frame_processors if frame_name not in frame_journal.get(frame_processor, set()) ]
+
+
+def filter_journal_payloads(queue_payloads : List[QueuePayload], frame_journal : Dict[str, Set[str]], frame_processors : List[str]) -> List[QueuePayload]:
+	if not frame_journal:
+		return queue_payloads
+	return [ queue_payload for queue_payload in queue_payloads if any(os.path.basename(queue_payload['frame_path']) not in frame_journal.get(frame_processor, set()) for frame_processor in frame_processors) ]
+
+
+# 写入新目录时,已被部分处理器处理过的帧需要从out目录读取
+def resolve_journal_frame_path(frame_path : str, frame_processors : List[str]) -> str:
+	if facefusion.globals.out_new_dir and frame_processors != facefusion.globals.frame_processors:
+		return get_out_temp_frame_path(facefusion.globals.target_path, frame_path)
+	return frame_path
+
+
+# 调用方处理完当前帧并请求下一帧时,记录当前帧已完成
+# 原地写入时调用方处理的是暂存副本,记录后再替换原帧
+def journal_queue(queue_payloads : Iterable[QueuePayload], frame_processors : List[str]) -> Generator[QueuePayload, None, None]:
+	for queue_payload in queue_payloads:
+		if is_frame_journal_staged():
+			staging_path = create_journal_staging_path(frame_processors, queue_payload['frame_path'])
+			shutil.copyfile(queue_payload['frame_path'], staging_path)
+			staging_payload : QueuePayload =\
+			{
+				'frame_number': queue_payload['frame_number'],
+				'frame_path': staging_path
+			}
+			yield staging_payload
+			if process_manager.is_processing():
+				commit_journal_frame(staging_path, queue_payload['frame_path'], frame_processors)
+		else:
+			yield queue_payload
+			if is_frame_journal_enabled() and process_manager.is_processing():
+				append_frame_journal(facefusion.globals.target_path, frame_processors, queue_payload['frame_path'])
+
+
+def estimate_frame_total(target_path : str, temp_video_fps : Fps) -> int:
+	video_frame_total = count_video_frame_total(target_path)
+	trim_frame_start = facefusion.globals.trim_frame_start or 0
+	trim_frame_end = facefusion.globals.trim_frame_end or video_frame_total
+	video_fps = detect_video_fps(target_path)
+
+	if video_fps:
+		return max(round((trim_frame_end - trim_frame_start) * temp_video_fps / video_fps), 0)
+	return max(trim_frame_end - trim_frame_start, 0)
+
+
+def is_duplicate_frame_enabled() -> bool:
+	# 口型同步每帧的音频不同,不能复用输出
+	return facefusion.globals.duplicate_frame_distance is not None and 'lip_syncer' not in facefusion.globals.frame_processors
+
+
+# 哈希只反映整帧的明暗结构,再逐块比较像素差,确认口型、眼睛等细小变化
+def is_duplicate_frame(frame_signature : Optional[FrameSignature], reference_frame_signature : Optional[FrameSignature]) -> bool:
+	if frame_signature is None or reference_frame_signature is None:
+		return False
+	frame_dhash, frame_thumbnail = frame_signature
+	reference_frame_dhash, reference_frame_thumbnail = reference_frame_signature
+	return count_dhash_distance(frame_dhash, reference_frame_dhash) <= facefusion.globals.duplicate_frame_distance and count_thumbnail_difference(frame_thumbnail, reference_frame_thumbnail) <= DUPLICATE_FRAME_DIFFERENCE
+
+
+# 连续的近似重复帧只处理第一帧,返回重复帧到代表帧的映射
+def create_duplicate_frame_paths(temp_frame_paths : List[str]) -> Dict[str, str]:
+	duplicate_frame_paths : Dict[str, str] = {}
+	if not is_duplicate_frame_enabled():
+		return duplicate_frame_paths
+
+	with ThreadPoolExecutor(max_workers = get_io_thread_count()) as executor:
+		frame_signatures = list(executor.map(read_frame_signature, temp_frame_paths))
+	reference_frame_path = None
+	reference_frame_signature = None
+	for temp_frame_path, frame_signature in zip(temp_frame_paths, frame_signatures):
+		# 始终与代表帧比较,避免缓慢变化被逐帧累积
+		if reference_frame_path and is_duplicate_frame(frame_signature, reference_frame_signature):
+			duplicate_frame_paths[temp_frame_path] = reference_frame_path
+		else:
+			reference_frame_path = temp_frame_path
+			reference_frame_signature = frame_signature
+	return duplicate_frame_paths
+
+
+def copy_duplicate_frames(target_path : str, duplicate_frame_paths : Dict[str, str]) -> None:
+	for temp_frame_path, reference_frame_path in duplicate_frame_paths.items():
+		# 记录到日志,恢复时不会再次处理
+		if is_frame_journal_staged():
+			staging_path = create_journal_staging_path(facefusion.globals.frame_processors, temp_frame_path)
+			link_file(reference_frame_path, staging_path)
+			commit_journal_frame(staging_path, temp_frame_path, facefusion.globals.frame_processors)
+			continue
+		link_file(get_out_temp_frame_path(target_path, reference_frame_path), get_out_temp_frame_path(target_path, temp_frame_path))
+		if is_frame_journal_enabled():
+			append_frame_journal(target_path, facefusion.globals.frame_processors, temp_frame_path)
+
+
+# 只有全部处理器都作用于人脸时,没有人脸的帧才可以跳过
+def is_face_presence_enabled() -> bool:
+	return bool(facefusion.globals.face_presence_interval) and all(frame_processor in FACE_FRAME_PROCESSORS for frame_processor in facefusion.globals.frame_processors)
+
+
+# 每隔N帧抽样检测,相邻两个抽样帧都没有人脸时,中间的帧视为空帧
+def create_empty_frame_paths(temp_frame_paths : List[str]) -> List[str]:
+	empty_frame_paths : List[str] = []
+	if not is_face_presence_enabled() or not temp_frame_paths:
+		return empty_frame_paths
+
+	face_presence_interval = facefusion.globals.face_presence_interval
+	sample_indices = list(range(0, len(temp_frame_paths), face_presence_interval))
+	if sample_indices[-1] != len(temp_frame_paths) - 1:
+		sample_indices.append(len(temp_frame_paths) - 1)
+	with ThreadPoolExecutor(max_workers = facefusion.globals.execution_thread_count) as executor:
+		sample_presences = list(executor.map(detect_frame_face_presence, [ temp_frame_paths[sample_index] for sample_index in sample_indices ]))
+	for frame_index, temp_frame_path in enumerate(temp_frame_paths):
+		sample_index = frame_index // face_presence_interval
+		if frame_index % face_presence_interval == 0:
+			is_empty_frame = not sample_presences[sample_index]
+		else:
+			is_empty_frame = not sample_presences[sample_index] and not sample_presences[sample_index + 1]
+		if is_empty_frame:
+			empty_frame_paths.append(temp_frame_path)
+	return empty_frame_paths
+
+
+def detect_frame_face_presence(temp_frame_path : str) -> bool:
+	# 抽样检测按1/2尺寸解码即可
+	vision_frame = cv2.imread(temp_frame_path, cv2.IMREAD_REDUCED_COLOR_2)
+	if vision_frame is None:
+		vision_frame = read_image(temp_frame_path)
+	return vision_frame is not None and detect_face_presence(vision_frame)
+
+
+# 空帧不需要处理,新目录模式下直接链接原帧
+def copy_empty_frames(target_path : str, empty_frame_paths : List[str]) -> None:
+	for temp_frame_path in empty_frame_paths:
+		out_temp_frame_path = get_out_temp_frame_path(target_path, temp_frame_path)
+		if out_temp_frame_path != temp_frame_path:
+			link_file(temp_frame_path, out_temp_frame_path)
+		if is_frame_journal_enabled():
+			append_frame_journal(target_path, facefusion.globals.frame_processors, temp_frame_path)
+
+
+# 帧处理进度,同时通知监听者(如服务模式下推送任务进度)
+class FrameProgress(tqdm):
+	def update(self, n : int = 1) -> Optional[bool]:
+		is_displayed = None
+		# 关闭显示时tqdm不计数,这里自行累加
+		if self.disable:
+			self.n += n
+		else:
+			is_displayed = super().update(n)
+		if FRAME_PROGRESS_LISTENER:
+			FRAME_PROGRESS_LISTENER(self.n, self.total)
+		return is_displayed
+
+
+def create_frame_progress(frame_total : int, frame_initial : int = 0) -> FrameProgress:
+	progress = FrameProgress(total = frame_total, initial = frame_initial, desc = wording.get('processing'), unit = 'frame', ascii = ' =', disable = facefusion.globals.log_level in [ 'warn', 'error' ])
+	progress.set_postfix(create_progress_postfix())
+	progress.update(0)
+	return progress
+
+
+def set_frame_progress_listener(frame_progress_listener : Optional[Callable[[int, int], None]]) -> None:
+	global FRAME_PROGRESS_LISTENER
+
+	FRAME_PROGRESS_LISTENER = frame_progress_listener
+
+
+def create_progress_postfix() -> Dict[str, Any]:
+	progress_postfix =\
+	{
+		'execution_providers': encode_execution_providers(facefusion.globals.execution_providers),
+		'execution_thread_count': facefusion.globals.execution_thread_count,
+		'execution_queue_count': facefusion.globals.execution_queue_count
+	}
+	return progress_postfix
+
+
 def create_queue(queue_payloads : List[QueuePayload]) -> Queue[QueuePayload]:
 	queue : Queue[QueuePayload] = Queue()
 	for queue_payload in queue_payloads:
@@ -94,22 +555,42 @@ def create_queue(queue_payloads : List[QueuePayload]) -> Queue[QueuePayload]:
 	return queue
 
 
-def pick_queue(queue : Queue[QueuePayload], queue_per_future : int) -> List[QueuePayload]:
-	queues = []
-	for _ in range(queue_per_future):
-		if not queue.empty():
-			queues.append(queue.get())
-	return queues
+def pull_queue(queue : Queue[QueuePayload]) -> Generator[QueuePayload, None, None]:
+	while True:
+		try:
+			queue_payload = queue.get_nowait()
+		except Empty:
+			return
+		# 消费者在当前线程处理该帧,期间人脸跟踪使用该帧序号
+		with track_frame_number(queue_payload['frame_number']):
+			yield queue_payload
+
+
+# 跳过空帧与重复帧之前记录每帧的序号,过滤后音频与跟踪窗口仍按原序号对齐
+def register_frame_numbers(temp_frame_paths : List[str], frame_number_offset : int = 0) -> None:
+	FRAME_NUMBERS.clear()
+	for frame_number, frame_path in enumerate(sorted(temp_frame_paths, key = os.path.basename), frame_number_offset):
+		FRAME_NUMBERS[os.path.basename(frame_path)] = frame_number
+
+
+# 片段只处理任务的一部分,偏移按目标帧率记录,需要换算为临时帧率
+def get_frame_number_offset(temp_video_fps : Fps) -> int:
+	trim_frame_offset = facefusion.globals.trim_frame_offset or 0
+	video_fps = detect_video_fps(facefusion.globals.target_path) if trim_frame_offset else None
+
+	if video_fps:
+		return round(trim_frame_offset * temp_video_fps / video_fps)
+	return trim_frame_offset
 
 
 def create_queue_payloads(temp_frame_paths : List[str]) -> List[QueuePayload]:
 	queue_payloads = []
 	temp_frame_paths = sorted(temp_frame_paths, key = os.path.basename)
 
-	for frame_number, frame_path in enumerate(temp_frame_paths):
+	for frame_index, frame_path in enumerate(temp_frame_paths):
 		frame_payload : QueuePayload =\
 		{
-			'frame_number': frame_number,
+			'frame_number': FRAME_NUMBERS.get(os.path.basename(frame_path), frame_index),
 			'frame_path': frame_path
 		}
 		queue_payloads.append(frame_payload)
@@ -1,9 +1,8 @@
-from typing import Any, List, Literal, Optional
+from typing import Any, Iterable, List, Literal, Optional
 from argparse import ArgumentParser
 from time import sleep
 import cv2
 import numpy
-import onnxruntime
 
 import facefusion.globals
 import facefusion.processors.frame.core as frame_processors
@@ -11,11 +10,11 @@ from facefusion import config, process_manager, logger, wording
 from facefusion.face_analyser import get_many_faces, clear_face_analyser, find_similar_faces, get_one_face
 from facefusion.face_masker import create_static_box_mask, create_occlusion_mask, clear_face_occluder
 from facefusion.face_helper import warp_face_by_face_landmark_5, paste_back
-from facefusion.execution import apply_execution_provider_options
+from facefusion.inference_manager import get_inference_session, clear_inference_sessions
 from facefusion.content_analyser import clear_content_analyser
 from facefusion.face_store import get_reference_faces
 from facefusion.normalizer import normalize_output_path
-from facefusion.thread_helper import thread_lock, thread_semaphore
+from facefusion.thread_helper import thread_lock, conditional_thread_semaphore
 from facefusion.typing import Face, VisionFrame, UpdateProgress, ProcessMode, ModelSet, OptionsWithModel, QueuePayload
 from facefusion.common_helper import create_metavar
 from facefusion.filesystem import is_file, is_image, is_video, resolve_relative_path
@@ -99,18 +98,21 @@ OPTIONS : Optional[OptionsWithModel] = None
 def get_frame_processor() -> Any:
 	global FRAME_PROCESSOR
 
-	with thread_lock():
-		while process_manager.is_checking():
-			sleep(0.5)
-		if FRAME_PROCESSOR is None:
-			model_path = get_options('model').get('path')
-			FRAME_PROCESSOR = onnxruntime.InferenceSession(model_path, providers = apply_execution_provider_options(facefusion.globals.execution_providers))
+	if FRAME_PROCESSOR is None:
+		with thread_lock():
+			while process_manager.is_checking():
+				sleep(0.5)
+			if FRAME_PROCESSOR is None:
+				model_path = get_options('model').get('path')
+				FRAME_PROCESSOR = get_inference_session(model_path)
 	return FRAME_PROCESSOR
 
 
 def clear_frame_processor() -> None:
 	global FRAME_PROCESSOR
 
+	if FRAME_PROCESSOR is not None:
+		clear_inference_sessions([ get_options('model').get('path') ])
 	FRAME_PROCESSOR = None
 
 
@@ -219,7 +221,7 @@ def apply_enhance(crop_vision_frame : VisionFrame) -> VisionFrame:
 		if frame_processor_input.name == 'weight':
 			weight = numpy.array([ 1 ]).astype(numpy.double)
 			frame_processor_inputs[frame_processor_input.name] = weight
-	with thread_semaphore():
+	with conditional_thread_semaphore(facefusion.globals.execution_providers):
 		crop_vision_frame = frame_processor.run(None, frame_processor_inputs)[0][0]
 	return crop_vision_frame
 
@@ -271,7 +273,7 @@ def process_frame(inputs : FaceEnhancerInputs) -> VisionFrame:
 	return target_vision_frame
 
 
-def process_frames(source_path : List[str], queue_payloads : List[QueuePayload], update_progress : UpdateProgress) -> None:
+def process_frames(source_path : List[str], queue_payloads : Iterable[QueuePayload], update_progress : UpdateProgress) -> None:
 	reference_faces = get_reference_faces() if 'reference' in facefusion.globals.face_selector_mode else None
 
 	for queue_payload in process_manager.manage(queue_payloads):
@@ -1,18 +1,17 @@
 import os.path
-from typing import Any, List, Literal, Optional
+from typing import Any, Iterable, List, Literal, Optional, Tuple
 from argparse import ArgumentParser
 from time import sleep
 import platform
 import numpy
 import onnx
-import onnxruntime
 from onnx import numpy_helper
 
 import facefusion.globals
 import facefusion.processors.frame.core as frame_processors
 from facefusion import config, process_manager, logger, wording
-from facefusion.execution import apply_execution_provider_options
-from facefusion.face_analyser import get_one_face, get_average_face, get_many_faces, find_similar_faces, clear_face_analyser
+from facefusion.inference_manager import get_inference_session, clear_inference_sessions
+from facefusion.face_analyser import get_one_face, get_source_face, get_many_faces, find_similar_faces, clear_face_analyser
 from facefusion.face_masker import create_static_box_mask, create_occlusion_mask, create_region_mask, clear_face_occluder, clear_face_parser
 from facefusion.face_helper import warp_face_by_face_landmark_5, paste_back
 from facefusion.face_store import get_reference_faces
@@ -21,7 +20,7 @@ from facefusion.normalizer import normalize_output_path
 from facefusion.thread_helper import thread_lock, conditional_thread_semaphore
 from facefusion.typing import Face, Embedding, VisionFrame, UpdateProgress, ProcessMode, ModelSet, OptionsWithModel, QueuePayload
 from facefusion.filesystem import is_file, is_image, has_image, is_video, filter_image_paths, resolve_relative_path, \
-	get_temp_directory_path, get_out_temp_frames_pattern, get_out_temp_frame_paths, get_out_temp_directory_path
+	get_out_temp_frames_pattern, get_out_temp_frame_paths, get_out_temp_frame_path
 from facefusion.download import conditional_download, is_download_done
 from facefusion.vision import read_image, read_static_image, read_static_images, write_image
 from facefusion.processors.frame.typings import FaceSwapperInputs
@@ -30,6 +29,7 @@ from facefusion.processors.frame import choices as frame_processors_choices
 
 FRAME_PROCESSOR = None
 MODEL_INITIALIZER = None
+SOURCE_INPUT : Optional[Tuple[Face, str, Any]] = None
 NAME = __name__.upper()
 MODELS : ModelSet =\
 {
@@ -100,38 +100,68 @@ OPTIONS : Optional[OptionsWithModel] = None
 def get_frame_processor() -> Any:
 	global FRAME_PROCESSOR
 
-	with thread_lock():
-		while process_manager.is_checking():
-			sleep(0.5)
-		if FRAME_PROCESSOR is None:
-			model_path = get_options('model').get('path')
-			FRAME_PROCESSOR = onnxruntime.InferenceSession(model_path, providers = apply_execution_provider_options(facefusion.globals.execution_providers))
+	if FRAME_PROCESSOR is None:
+		with thread_lock():
+			while process_manager.is_checking():
+				sleep(0.5)
+			if FRAME_PROCESSOR is None:
+				model_path = get_options('model').get('path')
+				FRAME_PROCESSOR = get_inference_session(model_path)
 	return FRAME_PROCESSOR
 
 
 def clear_frame_processor() -> None:
 	global FRAME_PROCESSOR
 
+	if FRAME_PROCESSOR is not None:
+		clear_inference_sessions([ get_options('model').get('path') ])
 	FRAME_PROCESSOR = None
 
 
 def get_model_initializer() -> Any:
 	global MODEL_INITIALIZER
 
-	with thread_lock():
-		while process_manager.is_checking():
-			sleep(0.5)
-		if MODEL_INITIALIZER is None:
-			model_path = get_options('model').get('path')
-			model = onnx.load(model_path)
-			MODEL_INITIALIZER = numpy_helper.to_array(model.graph.initializer[-1])
+	if MODEL_INITIALIZER is None:
+		with thread_lock():
+			while process_manager.is_checking():
+				sleep(0.5)
+			if MODEL_INITIALIZER is None:
+				model_path = get_options('model').get('path')
+				MODEL_INITIALIZER = load_model_initializer(model_path)
 	return MODEL_INITIALIZER
 
 
+# 初始化矩阵只需从模型中提取一次,之后通过内存映射读取旁路文件,不再解析整个模型
+def load_model_initializer(model_path : str) -> Any:
+	initializer_path = get_model_initializer_path(model_path)
+
+	if is_file(initializer_path) and os.path.getmtime(initializer_path) >= os.path.getmtime(model_path):
+		try:
+			return numpy.load(initializer_path, mmap_mode = 'r')
+		except (OSError, ValueError):
+			pass
+	model = onnx.load(model_path)
+	model_initializer = numpy_helper.to_array(model.graph.initializer[-1])
+	try:
+		temp_initializer_path = initializer_path + '.tmp.npy'
+		numpy.save(temp_initializer_path, model_initializer)
+		os.replace(temp_initializer_path, initializer_path)
+	except OSError:
+		logger.debug(wording.get('model_initializer_not_saved').format(initializer_path = initializer_path), NAME)
+	return model_initializer
+
+
+def get_model_initializer_path(model_path : str) -> str:
+	model_name, _ = os.path.splitext(model_path)
+	return model_name + '.initializer.npy'
+
+
 def clear_model_initializer() -> None:
 	global MODEL_INITIALIZER
+	global SOURCE_INPUT
 
 	MODEL_INITIALIZER = None
+	SOURCE_INPUT = None
 
 
 def get_options(key : Literal['model']) -> Any:
@@ -253,15 +283,11 @@ def swap_face(source_face : Face, target_face : Face, temp_vision_frame : Vision
 
 def apply_swap(source_face : Face, crop_vision_frame : VisionFrame) -> VisionFrame:
 	frame_processor = get_frame_processor()
-	model_type = get_options('model').get('type')
 	frame_processor_inputs = {}
 
 	for frame_processor_input in frame_processor.get_inputs():
 		if frame_processor_input.name == 'source':
-			if model_type == 'blendswap' or model_type == 'uniface':
-				frame_processor_inputs[frame_processor_input.name] = prepare_source_frame(source_face)
-			else:
-				frame_processor_inputs[frame_processor_input.name] = prepare_source_embedding(source_face)
+			frame_processor_inputs[frame_processor_input.name] = get_source_input(source_face)
 		if frame_processor_input.name == 'target':
 			frame_processor_inputs[frame_processor_input.name] = crop_vision_frame
 	with conditional_thread_semaphore(facefusion.globals.execution_providers):
@@ -269,6 +295,22 @@ def apply_swap(source_face : Face, crop_vision_frame : VisionFrame) -> VisionFra
 	return crop_vision_frame
 
 
+# 同一源人脸与模型的输入只准备一次,所有帧与所有目标人脸共用
+def get_source_input(source_face : Face) -> Any:
+	global SOURCE_INPUT
+
+	model_name = frame_processors_globals.face_swapper_model
+	source_input = SOURCE_INPUT
+	if source_input is None or source_input[0] is not source_face or source_input[1] != model_name:
+		model_type = get_options('model').get('type')
+		if model_type == 'blendswap' or model_type == 'uniface':
+			source_input = (source_face, model_name, prepare_source_frame(source_face))
+		else:
+			source_input = (source_face, model_name, prepare_source_embedding(source_face))
+		SOURCE_INPUT = source_input
+	return source_input[2]
+
+
 def prepare_source_frame(source_face : Face) -> VisionFrame:
 	model_type = get_options('model').get('type')
 	source_vision_frame = read_static_image(facefusion.globals.source_paths[0])
@@ -336,10 +378,9 @@ def process_frame(inputs : FaceSwapperInputs) -> VisionFrame:
 	return target_vision_frame
 
 
-def process_frames(source_paths : List[str], queue_payloads : List[QueuePayload], update_progress : UpdateProgress) -> None:
+def process_frames(source_paths : List[str], queue_payloads : Iterable[QueuePayload], update_progress : UpdateProgress) -> None:
 	reference_faces = get_reference_faces() if 'reference' in facefusion.globals.face_selector_mode else None
-	source_frames = read_static_images(source_paths)
-	source_face = get_average_face(source_frames)
+	source_face = get_source_face(source_paths)
 
 	for queue_payload in process_manager.manage(queue_payloads):
 		target_vision_path = queue_payload['frame_path']
@@ -350,11 +391,8 @@ def process_frames(source_paths : List[str], queue_payloads : List[QueuePayload]
 			'source_face': source_face,
 			'target_vision_frame': target_vision_frame
 		})
-		write_vision_path = target_vision_path
 		# 如果是写入新文件,需要替换目录
-		if facefusion.globals.out_new_dir:
-			write_vision_path = target_vision_path.replace(get_temp_directory_path(facefusion.globals.target_path), get_out_temp_directory_path(facefusion.globals.target_path))
-
+		write_vision_path = get_out_temp_frame_path(facefusion.globals.target_path, target_vision_path)
 		# 写入换脸后的图片帧
 		write_image(write_vision_path, output_vision_frame)
 		update_progress(1)
@@ -362,8 +400,7 @@ def process_frames(source_paths : List[str], queue_payloads : List[QueuePayload]
 
 def process_image(source_paths : List[str], target_path : str, output_path : str) -> None:
 	reference_faces = get_reference_faces() if 'reference' in facefusion.globals.face_selector_mode else None
-	source_frames = read_static_images(source_paths)
-	source_face = get_average_face(source_frames)
+	source_face = get_source_face(source_paths)
 	target_vision_frame = read_static_image(target_path)
 	output_vision_frame = process_frame(
 	{
@@ -1,18 +1,17 @@
-from typing import Any, List, Literal, Optional
+from typing import Any, Iterable, List, Literal, Optional
 from argparse import ArgumentParser
 from time import sleep
 import cv2
 import numpy
-import onnxruntime
 
 import facefusion.globals
 import facefusion.processors.frame.core as frame_processors
 from facefusion import config, process_manager, logger, wording
 from facefusion.face_analyser import clear_face_analyser
 from facefusion.content_analyser import clear_content_analyser
-from facefusion.execution import apply_execution_provider_options
+from facefusion.inference_manager import get_inference_session, clear_inference_sessions
 from facefusion.normalizer import normalize_output_path
-from facefusion.thread_helper import thread_lock, thread_semaphore
+from facefusion.thread_helper import thread_lock, conditional_thread_semaphore
 from facefusion.typing import Face, VisionFrame, UpdateProgress, ProcessMode, ModelSet, OptionsWithModel, QueuePayload
 from facefusion.common_helper import create_metavar
 from facefusion.filesystem import is_file, resolve_relative_path, is_image, is_video
@@ -63,18 +62,21 @@ OPTIONS : Optional[OptionsWithModel] = None
 def get_frame_processor() -> Any:
 	global FRAME_PROCESSOR
 
-	with thread_lock():
-		while process_manager.is_checking():
-			sleep(0.5)
-		if FRAME_PROCESSOR is None:
-			model_path = get_options('model').get('path')
-			FRAME_PROCESSOR = onnxruntime.InferenceSession(model_path, providers = apply_execution_provider_options(facefusion.globals.execution_providers))
+	if FRAME_PROCESSOR is None:
+		with thread_lock():
+			while process_manager.is_checking():
+				sleep(0.5)
+			if FRAME_PROCESSOR is None:
+				model_path = get_options('model').get('path')
+				FRAME_PROCESSOR = get_inference_session(model_path)
 	return FRAME_PROCESSOR
 
 
 def clear_frame_processor() -> None:
 	global FRAME_PROCESSOR
 
+	if FRAME_PROCESSOR is not None:
+		clear_inference_sessions([ get_options('model').get('path') ])
 	FRAME_PROCESSOR = None
 
 
@@ -155,7 +157,7 @@ def post_process() -> None:
 def colorize_frame(temp_vision_frame : VisionFrame) -> VisionFrame:
 	frame_processor = get_frame_processor()
 	prepare_vision_frame = prepare_temp_frame(temp_vision_frame)
-	with thread_semaphore():
+	with conditional_thread_semaphore(facefusion.globals.execution_providers):
 		color_vision_frame = frame_processor.run(None,
 		{
 			frame_processor.get_inputs()[0].name: prepare_vision_frame
@@ -216,7 +218,7 @@ def process_frame(inputs : FrameColorizerInputs) -> VisionFrame:
 	return colorize_frame(target_vision_frame)
 
 
-def process_frames(source_paths : List[str], queue_payloads : List[QueuePayload], update_progress : UpdateProgress) -> None:
+def process_frames(source_paths : List[str], queue_payloads : Iterable[QueuePayload], update_progress : UpdateProgress) -> None:
 	for queue_payload in process_manager.manage(queue_payloads):
 		target_vision_path = queue_payload['frame_path']
 		target_vision_frame = read_image(target_vision_path)
@@ -0,0 +1,181 @@
+import atexit
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Deque, List, Optional, Set
+import cv2
+import numpy
+
+import facefusion.globals
+from facefusion import logger, process_manager
+from facefusion.face_cache import flush_face_cache
+from facefusion.face_store import get_reference_faces, append_reference_face
+from facefusion.ffmpeg import open_video_reader, read_video_frames, close_video_reader, open_video_writer, write_video_frame, close_video_writer
+from facefusion.processors.frame.core import get_frame_processors_modules, create_queue_payloads, read_history_frame_journal, filter_journal_payloads, get_pending_frame_processors, resolve_journal_frame_path, write_journal_frame, create_frame_processor_inputs, get_source_audio_path, get_source_audio_frame, process_vision_frame, estimate_frame_total, create_frame_progress, get_frame_number_offset
+from facefusion.processors.frame.typings import FrameProcessorInputs
+from facefusion.state_helper import export_globals_state, import_globals_state
+from facefusion.typing import Fps, FaceSet, GlobalsState, QueuePayload, VisionFrame
+from facefusion.vision import read_image, restrict_video_fps, unpack_resolution
+
+PROCESS_CONTEXT = multiprocessing.get_context('spawn')
+# 以下为子进程内的状态
+FRAME_PROCESSOR_INPUTS : Optional[FrameProcessorInputs] = None
+SOURCE_AUDIO_PATH : Optional[str] = None
+TEMP_VIDEO_FPS : Optional[Fps] = None
+SHARED_MEMORIES : List[SharedMemory] = []
+
+
+def create_process_pool(source_paths : List[str], temp_video_fps : Fps, shared_memory_names : List[str]) -> ProcessPoolExecutor:
+	return ProcessPoolExecutor(max_workers = facefusion.globals.execution_thread_count, mp_context = PROCESS_CONTEXT, initializer = init_process_worker, initargs = (export_globals_state(), get_reference_faces(), source_paths, temp_video_fps, shared_memory_names))
+
+
+# 每个子进程拥有独立的人脸分析与帧处理模型
+def init_process_worker(globals_state : GlobalsState, reference_faces : Optional[FaceSet], source_paths : List[str], temp_video_fps : Fps, shared_memory_names : List[str]) -> None:
+	global FRAME_PROCESSOR_INPUTS, SOURCE_AUDIO_PATH, TEMP_VIDEO_FPS
+
+	import_globals_state(globals_state)
+	logger.init(facefusion.globals.log_level)
+	process_manager.start()
+	# 进程池关闭时子进程正常退出,写入子进程中剩余的人脸缓存
+	atexit.register(flush_face_cache)
+	if reference_faces:
+		for reference_name, faces in reference_faces.items():
+			for face in faces:
+				append_reference_face(reference_name, face)
+	get_frame_processors_modules(facefusion.globals.frame_processors)
+	FRAME_PROCESSOR_INPUTS = create_frame_processor_inputs(source_paths, temp_video_fps)
+	SOURCE_AUDIO_PATH = get_source_audio_path(source_paths)
+	TEMP_VIDEO_FPS = temp_video_fps
+	for shared_memory_name in shared_memory_names:
+		SHARED_MEMORIES.append(SharedMemory(name = shared_memory_name))
+
+
+def process_frame_paths(queue_payloads : List[QueuePayload], payload_frame_processors : List[List[str]]) -> int:
+	for queue_payload, frame_processors in zip(queue_payloads, payload_frame_processors):
+		target_vision_path = queue_payload['frame_path']
+		source_audio_frame = get_source_audio_frame(SOURCE_AUDIO_PATH, TEMP_VIDEO_FPS, queue_payload['frame_number'])
+		target_vision_frame = read_image(resolve_journal_frame_path(target_vision_path, frame_processors))
+		output_vision_frame = process_vision_frame(FRAME_PROCESSOR_INPUTS, source_audio_frame, target_vision_frame, frame_processors, queue_payload['frame_number'])
+		write_journal_frame(target_vision_path, output_vision_frame, facefusion.globals.frame_processors)
+	return len(queue_payloads)
+
+
+def process_frame_slot(slot_index : int, frame_number : int, temp_video_resolution : str, output_video_resolution : str) -> int:
+	input_memory, output_memory = SHARED_MEMORIES
+	output_video_width, output_video_height = unpack_resolution(output_video_resolution)
+	source_audio_frame = get_source_audio_frame(SOURCE_AUDIO_PATH, TEMP_VIDEO_FPS, frame_number)
+	target_vision_frame = get_slot_frame(input_memory, slot_index, temp_video_resolution).copy()
+	output_vision_frame = process_vision_frame(FRAME_PROCESSOR_INPUTS, source_audio_frame, target_vision_frame, None, frame_number)
+	if output_vision_frame.shape[1] != output_video_width or output_vision_frame.shape[0] != output_video_height:
+		output_vision_frame = cv2.resize(output_vision_frame, (output_video_width, output_video_height))
+	set_slot_frame(output_memory, slot_index, output_video_resolution, output_vision_frame)
+	return slot_index
+
+
+def multi_process_pool_frames(source_paths : List[str], temp_frame_paths : List[str]) -> None:
+	frame_journal = read_history_frame_journal()
+	queue_payloads = create_queue_payloads(temp_frame_paths)
+	frame_total = len(queue_payloads)
+	queue_payloads = filter_journal_payloads(queue_payloads, frame_journal, facefusion.globals.frame_processors)
+	queue_per_future = facefusion.globals.execution_queue_count
+	temp_video_fps = restrict_video_fps(facefusion.globals.target_path, facefusion.globals.output_video_fps)
+
+	# 每个进程最多两块在途,空闲的进程按需领取下一小块,避免一次提交全部帧导致末尾负载不均
+	future_limit = facefusion.globals.execution_thread_count * 2
+
+	with create_frame_progress(frame_total, frame_total - len(queue_payloads)) as progress:
+		with create_process_pool(source_paths, temp_video_fps, []) as executor:
+			futures : Set[Future[int]] = set()
+			for index in range(0, len(queue_payloads), queue_per_future):
+				futures = wait_process_futures(futures, progress.update, future_limit)
+				if not process_manager.is_processing():
+					return
+				future_payloads = queue_payloads[index:index + queue_per_future]
+				future_frame_processors = [ get_pending_frame_processors(frame_journal, queue_payload['frame_path']) for queue_payload in future_payloads ]
+				futures.add(executor.submit(process_frame_paths, future_payloads, future_frame_processors))
+			wait_process_futures(futures, progress.update, 1)
+
+
+# 等待到在途任务少于上限,停止处理时取消剩余的任务
+def wait_process_futures(futures : Set[Future[int]], update_progress : Callable[[int], None], future_limit : int) -> Set[Future[int]]:
+	while len(futures) >= future_limit:
+		futures_done, futures = wait(futures, timeout = 0.5, return_when = FIRST_COMPLETED)
+		for future_done in futures_done:
+			update_progress(future_done.result())
+		if not process_manager.is_processing():
+			for future in futures:
+				future.cancel()
+			return set()
+	return futures
+
+
+# 帧通过共享内存的环形槽位在进程间传递,不做序列化
+def multi_process_pool_stream(source_paths : List[str], target_path : str, temp_video_resolution : str, temp_video_fps : Fps) -> bool:
+	output_video_resolution = facefusion.globals.output_video_resolution
+	slot_total = facefusion.globals.execution_thread_count * facefusion.globals.execution_queue_count
+	input_memory = SharedMemory(create = True, size = slot_total * get_slot_size(temp_video_resolution))
+	output_memory = SharedMemory(create = True, size = slot_total * get_slot_size(output_video_resolution))
+	video_reader = open_video_reader(target_path, temp_video_resolution, temp_video_fps)
+	video_writer = open_video_writer(target_path, output_video_resolution, facefusion.globals.output_video_fps)
+	free_slots : Deque[int] = deque(range(slot_total))
+	futures : Deque[Future[int]] = deque()
+	is_written = True
+
+	try:
+		with create_frame_progress(estimate_frame_total(target_path, temp_video_fps)) as progress:
+			with create_process_pool(source_paths, temp_video_fps, [ input_memory.name, output_memory.name ]) as executor:
+				for frame_number, target_vision_frame in enumerate(read_video_frames(video_reader, temp_video_resolution), get_frame_number_offset(temp_video_fps)):
+					if not process_manager.is_processing() or not is_written:
+						break
+					# 槽位用完时先按顺序写出最早的帧
+					while futures and is_written and (futures[0].done() or not free_slots):
+						slot_index = futures.popleft().result()
+						is_written = write_slot_frame(video_writer, output_memory, slot_index, output_video_resolution)
+						free_slots.append(slot_index)
+						progress.update()
+					if not is_written:
+						break
+					slot_index = free_slots.popleft()
+					set_slot_frame(input_memory, slot_index, temp_video_resolution, target_vision_frame)
+					futures.append(executor.submit(process_frame_slot, slot_index, frame_number, temp_video_resolution, output_video_resolution))
+				while futures and is_written and process_manager.is_processing():
+					slot_index = futures.popleft().result()
+					is_written = write_slot_frame(video_writer, output_memory, slot_index, output_video_resolution)
+					progress.update()
+				for future in futures:
+					future.cancel()
+	finally:
+		close_video_reader(video_reader)
+		input_memory.close()
+		input_memory.unlink()
+		output_memory.close()
+		output_memory.unlink()
+	if is_written and process_manager.is_processing():
+		return close_video_writer(video_writer)
+	video_writer.kill()
+	video_writer.wait()
+	return False
+
+
+def get_slot_size(resolution : str) -> int:
+	width, height = unpack_resolution(resolution)
+	return width * height * 3
+
+
+def get_slot_frame(shared_memory : SharedMemory, slot_index : int, resolution : str) -> VisionFrame:
+	width, height = unpack_resolution(resolution)
+	return numpy.ndarray((height, width, 3), dtype = numpy.uint8, buffer = shared_memory.buf, offset = slot_index * get_slot_size(resolution))
+
+
+def set_slot_frame(shared_memory : SharedMemory, slot_index : int, resolution : str, vision_frame : VisionFrame) -> None:
+	slot_frame = get_slot_frame(shared_memory, slot_index, resolution)
+	slot_frame[:] = vision_frame
+	del slot_frame
+
+
+def write_slot_frame(video_writer : Any, shared_memory : SharedMemory, slot_index : int, resolution : str) -> bool:
+	slot_frame = get_slot_frame(shared_memory, slot_index, resolution)
+	is_written = write_video_frame(video_writer, slot_frame, resolution)
+	del slot_frame
+	return is_written
@@ -39,3 +39,10 @@ LipSyncerInputs = TypedDict('LipSyncerInputs',
 	'source_audio_frame' : AudioFrame,
 	'target_vision_frame' : VisionFrame
 })
+FrameProcessorInputs = TypedDict('FrameProcessorInputs',
+{
+	'reference_faces' : FaceSet,
+	'source_face' : Face,
+	'source_audio_frame' : AudioFrame,
+	'target_vision_frame' : VisionFrame
+})
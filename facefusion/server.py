@@ -0,0 +1,205 @@
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue
+from typing import Any, Callable, Dict, List, Optional
+
+import facefusion.globals
+from facefusion import content_analyser, face_analyser, face_masker, logger, wording
+from facefusion.face_store import clear_reference_faces
+from facefusion.filesystem import is_file, is_image, is_video
+from facefusion.normalizer import normalize_output_path
+from facefusion.processors.frame.core import get_frame_processors_modules, set_frame_progress_listener
+from facefusion.typing import ServerJob, ServerJobStatus, ServerJobUpdate
+
+SERVER_HOST = '127.0.0.1'
+SERVER_JOBS : Dict[str, ServerJob] = {}
+SERVER_QUEUE : Queue[Optional[str]] = Queue()
+SERVER_CONDITION = threading.Condition()
+SERVER_JOB_ID : Optional[str] = None
+
+
+# 常驻服务: 模型只加载一次,任务按顺序在同一个工作线程中处理
+def run_server(process_target : Callable[[], None]) -> None:
+	# 常驻期间不释放模型
+	facefusion.globals.video_memory_strategy = 'tolerant'
+	preload_models()
+	set_frame_progress_listener(update_job_progress)
+	worker_thread = threading.Thread(target = run_job_worker, args = (process_target,), daemon = True)
+	worker_thread.start()
+	http_server = ThreadingHTTPServer((SERVER_HOST, facefusion.globals.server_port), ServerRequestHandler)
+	logger.info(wording.get('server_started').format(host = SERVER_HOST, port = http_server.server_port), __name__.upper())
+
+	try:
+		http_server.serve_forever()
+	finally:
+		http_server.server_close()
+		SERVER_QUEUE.put(None)
+		set_frame_progress_listener(None)
+
+
+def preload_models() -> None:
+	face_analyser.get_face_analyser()
+	content_analyser.get_content_analyser()
+	face_mask_types = facefusion.globals.face_mask_types or []
+	if 'occlusion' in face_mask_types:
+		face_masker.get_face_occluder()
+	if 'region' in face_mask_types:
+		face_masker.get_face_parser()
+	for frame_processor_module in get_frame_processors_modules(facefusion.globals.frame_processors):
+		frame_processor_module.get_frame_processor()
+
+
+def create_job(target_path : str, source_paths : Optional[List[str]] = None, output_path : Optional[str] = None) -> ServerJob:
+	server_job : ServerJob =\
+	{
+		'job_id': uuid.uuid4().hex,
+		'status': 'queued',
+		'source_paths': source_paths or facefusion.globals.source_paths or [],
+		'target_path': target_path,
+		'output_path': output_path or facefusion.globals.output_path,
+		'frame_done': 0,
+		'frame_total': 0
+	}
+	with SERVER_CONDITION:
+		SERVER_JOBS[server_job.get('job_id')] = server_job
+	SERVER_QUEUE.put(server_job.get('job_id'))
+	return server_job
+
+
+def get_job(job_id : str) -> Optional[ServerJob]:
+	with SERVER_CONDITION:
+		server_job = SERVER_JOBS.get(job_id)
+		if server_job:
+			return server_job.copy()
+	return None
+
+
+def update_job(job_id : str, server_job_update : ServerJobUpdate) -> None:
+	with SERVER_CONDITION:
+		SERVER_JOBS[job_id].update(server_job_update)
+		SERVER_CONDITION.notify_all()
+
+
+def update_job_progress(frame_done : int, frame_total : int) -> None:
+	if SERVER_JOB_ID:
+		update_job(SERVER_JOB_ID,
+		{
+			'frame_done': frame_done,
+			'frame_total': frame_total
+		})
+
+
+def run_job_worker(process_target : Callable[[], None]) -> None:
+	while True:
+		job_id = SERVER_QUEUE.get()
+		if job_id is None:
+			return
+		process_job(job_id, process_target)
+
+
+def process_job(job_id : str, process_target : Callable[[], None]) -> None:
+	global SERVER_JOB_ID
+
+	server_job = get_job(job_id)
+	source_paths = facefusion.globals.source_paths
+	target_path = facefusion.globals.target_path
+	output_path = facefusion.globals.output_path
+	SERVER_JOB_ID = job_id
+	update_job(job_id,
+	{
+		'status': 'processing'
+	})
+
+	try:
+		facefusion.globals.source_paths = server_job.get('source_paths')
+		facefusion.globals.target_path = server_job.get('target_path')
+		facefusion.globals.output_path = server_job.get('output_path')
+		# 参考人脸来自上一个目标,需要重新选取
+		clear_reference_faces()
+		process_target()
+		normed_output_path = normalize_output_path(server_job.get('target_path'), server_job.get('output_path'))
+		job_status : ServerJobStatus = 'completed' if is_file(normed_output_path) else 'failed'
+		update_job(job_id,
+		{
+			'status': job_status,
+			'output_path': normed_output_path
+		})
+	except Exception as exception:
+		logger.error(wording.get('server_job_failed').format(job_id = job_id), __name__.upper())
+		logger.debug(str(exception), __name__.upper())
+		update_job(job_id,
+		{
+			'status': 'failed'
+		})
+	finally:
+		SERVER_JOB_ID = None
+		facefusion.globals.source_paths = source_paths
+		facefusion.globals.target_path = target_path
+		facefusion.globals.output_path = output_path
+
+
+def is_job_finished(server_job : ServerJob) -> bool:
+	return server_job.get('status') in [ 'completed', 'failed' ]
+
+
+class ServerRequestHandler(BaseHTTPRequestHandler):
+	# POST /jobs 提交任务, GET /jobs/<job_id> 查询状态, GET /jobs/<job_id>/progress 按行推送进度直到结束
+	def do_POST(self) -> None:
+		if self.path.rstrip('/') != '/jobs':
+			self.send_json(404, { 'error': 'not found' })
+			return
+		try:
+			content_length = int(self.headers.get('Content-Length', 0))
+			job_args = json.loads(self.rfile.read(content_length) or b'{}')
+		except ValueError:
+			self.send_json(400, { 'error': 'invalid json' })
+			return
+		target_path = job_args.get('target_path')
+		if not is_image(target_path) and not is_video(target_path):
+			self.send_json(400, { 'error': wording.get('select_image_or_video_target') })
+			return
+		self.send_json(202, create_job(target_path, job_args.get('source_paths'), job_args.get('output_path')))
+
+	def do_GET(self) -> None:
+		path_parts = self.path.strip('/').split('/')
+		server_job = get_job(path_parts[1]) if len(path_parts) > 1 and path_parts[0] == 'jobs' else None
+		if not server_job:
+			self.send_json(404, { 'error': 'not found' })
+			return
+		if len(path_parts) == 3 and path_parts[2] == 'progress':
+			self.stream_job(server_job.get('job_id'))
+			return
+		self.send_json(200, server_job)
+
+	def stream_job(self, job_id : str) -> None:
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/x-ndjson')
+		self.end_headers()
+		last_job = None
+		while True:
+			with SERVER_CONDITION:
+				server_job = get_job(job_id)
+				if server_job == last_job:
+					SERVER_CONDITION.wait(timeout = 1)
+					continue
+			try:
+				self.wfile.write(json.dumps(server_job).encode() + b'\n')
+				self.wfile.flush()
+			except OSError:
+				return
+			if is_job_finished(server_job):
+				return
+			last_job = server_job
+
+	def send_json(self, status_code : int, content : Any) -> None:
+		body = json.dumps(content).encode()
+		self.send_response(status_code)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format : str, *args : Any) -> None:
+		logger.debug(format % args, __name__.upper())
@@ -0,0 +1,197 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from time import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union, cast
+
+import facefusion.globals
+from facefusion import logger, wording
+from facefusion.filesystem import get_str_md5, is_file
+from facefusion.state_helper import export_globals_state
+from facefusion.typing import Shard, ShardJob
+
+SHARD_STATES = [ 'pending', 'claimed', 'done' ]
+# 认领文件的修改时间作为租约,处理期间定时续约,超时未续约的分片重新放回待处理
+SHARD_CLAIM_TIMEOUT = 300
+SHARD_CLAIM_RENEWAL = 30
+
+
+# 任务目录: job.json, pending/claimed/done 三个状态目录, segments 存放编码后的片段
+# 目标文件、分片区间与处理器设置共同决定任务,任一变化都会创建新的任务
+def get_job_directory_path(shard_directory : str, target_path : str, shard_ranges : List[Tuple[int, int]]) -> str:
+	job_values =\
+	[
+		os.path.abspath(target_path),
+		get_file_identity(target_path),
+		shard_ranges,
+		facefusion.globals.source_paths,
+		facefusion.globals.frame_processors,
+		export_globals_state().get('frame_processors_globals')
+	]
+	return os.path.join(shard_directory, get_str_md5(json.dumps(job_values, sort_keys = True)))
+
+
+def get_file_identity(file_path : str) -> List[Any]:
+	if is_file(file_path):
+		file_stat = os.stat(file_path)
+		return [ file_stat.st_size, file_stat.st_mtime_ns ]
+	return []
+
+
+def get_shard_file_path(job_directory : str, shard_state : str, shard_name : str) -> str:
+	return os.path.join(job_directory, shard_state, shard_name)
+
+
+def get_shard_segment_path(job_directory : str, shard_index : int) -> str:
+	return os.path.join(job_directory, 'segments', str(shard_index).zfill(4) + '.mp4')
+
+
+def create_shard_job(shard_directory : str, target_path : str, shard_ranges : List[Tuple[int, int]]) -> str:
+	job_directory = get_job_directory_path(shard_directory, target_path, shard_ranges)
+	job_file_path = os.path.join(job_directory, 'job.json')
+
+	# 已存在的任务直接复用,已完成的分片不会重复处理
+	if is_file(job_file_path):
+		return job_directory
+	for shard_state in SHARD_STATES + [ 'segments' ]:
+		os.makedirs(os.path.join(job_directory, shard_state), exist_ok = True)
+	for shard_index, (trim_frame_start, trim_frame_end) in enumerate(shard_ranges):
+		shard : Shard =\
+		{
+			'index': shard_index,
+			'trim_frame_start': trim_frame_start,
+			'trim_frame_end': trim_frame_end
+		}
+		write_json_file(get_shard_file_path(job_directory, 'pending', get_shard_name(shard_index)), shard)
+	shard_job : ShardJob =\
+	{
+		'target_path': os.path.abspath(target_path),
+		'trim_frame_start': shard_ranges[0][0],
+		'shard_total': len(shard_ranges)
+	}
+	# job.json最后写入,代表任务已创建完成
+	write_json_file(job_file_path, shard_job)
+	return job_directory
+
+
+def read_shard_job(job_directory : str) -> Optional[ShardJob]:
+	return cast(Optional[ShardJob], read_json_file(os.path.join(job_directory, 'job.json')))
+
+
+def list_job_directories(shard_directory : str) -> List[str]:
+	job_directories = []
+	if os.path.isdir(shard_directory):
+		for job_name in sorted(os.listdir(shard_directory)):
+			job_directory = os.path.join(shard_directory, job_name)
+			if is_file(os.path.join(job_directory, 'job.json')):
+				job_directories.append(job_directory)
+	return job_directories
+
+
+# 通过原子重命名认领分片,多个节点同时认领时只有一个能成功
+def claim_shard(shard_directory : str, job_directories : Optional[List[str]] = None) -> Optional[Tuple[str, Shard]]:
+	for job_directory in job_directories or list_job_directories(shard_directory):
+		pending_directory = os.path.join(job_directory, 'pending')
+		if not os.path.isdir(pending_directory):
+			continue
+		requeue_expired_shards(job_directory)
+		for shard_name in sorted(os.listdir(pending_directory)):
+			claimed_file_path = get_shard_file_path(job_directory, 'claimed', shard_name)
+			try:
+				os.rename(get_shard_file_path(job_directory, 'pending', shard_name), claimed_file_path)
+				os.utime(claimed_file_path)
+			except OSError:
+				continue
+			shard = cast(Optional[Shard], read_json_file(claimed_file_path))
+			if shard:
+				return job_directory, shard
+	return None
+
+
+# 认领后崩溃或断开的节点不再续约,其分片超时后由其它节点接手
+def requeue_expired_shards(job_directory : str, claim_timeout : int = SHARD_CLAIM_TIMEOUT) -> None:
+	claimed_directory = os.path.join(job_directory, 'claimed')
+	if not os.path.isdir(claimed_directory):
+		return
+	for shard_name in sorted(os.listdir(claimed_directory)):
+		claimed_file_path = get_shard_file_path(job_directory, 'claimed', shard_name)
+		try:
+			if os.path.getmtime(claimed_file_path) < time() - claim_timeout:
+				os.rename(claimed_file_path, get_shard_file_path(job_directory, 'pending', shard_name))
+				logger.warn(wording.get('requeuing_shard').format(shard_name = shard_name), __name__.upper())
+		except OSError:
+			continue
+
+
+def renew_shard(job_directory : str, shard : Shard) -> None:
+	try:
+		os.utime(get_shard_file_path(job_directory, 'claimed', get_shard_name(shard.get('index'))))
+	except OSError:
+		pass
+
+
+# 处理分片期间在后台线程中续约
+@contextmanager
+def keep_shard_claimed(job_directory : str, shard : Shard) -> Iterator[None]:
+	renewal_event = threading.Event()
+
+	def renew_shard_claim() -> None:
+		while not renewal_event.wait(SHARD_CLAIM_RENEWAL):
+			renew_shard(job_directory, shard)
+
+	renewal_thread = threading.Thread(target = renew_shard_claim, daemon = True)
+	renewal_thread.start()
+	try:
+		yield
+	finally:
+		renewal_event.set()
+		renewal_thread.join()
+
+
+# 租约过期后分片可能已被重新放回,此时交给其它节点的结果为准
+def complete_shard(job_directory : str, shard : Shard) -> None:
+	move_claimed_shard(job_directory, shard, 'done')
+
+
+def release_shard(job_directory : str, shard : Shard) -> None:
+	move_claimed_shard(job_directory, shard, 'pending')
+
+
+def move_claimed_shard(job_directory : str, shard : Shard, shard_state : str) -> None:
+	shard_name = get_shard_name(shard.get('index'))
+	try:
+		os.rename(get_shard_file_path(job_directory, 'claimed', shard_name), get_shard_file_path(job_directory, shard_state, shard_name))
+	except OSError:
+		pass
+
+
+def is_shard_job_done(job_directory : str) -> bool:
+	shard_job = read_shard_job(job_directory)
+	done_directory = os.path.join(job_directory, 'done')
+	return bool(shard_job and os.path.isdir(done_directory) and len(os.listdir(done_directory)) == shard_job.get('shard_total'))
+
+
+def get_shard_segment_paths(job_directory : str) -> List[str]:
+	shard_job = read_shard_job(job_directory)
+	return [ get_shard_segment_path(job_directory, shard_index) for shard_index in range(shard_job.get('shard_total')) ]
+
+
+def get_shard_name(shard_index : int) -> str:
+	return str(shard_index).zfill(4) + '.json'
+
+
+# 先写临时文件再重命名,避免其它节点读到写了一半的文件
+def write_json_file(file_path : str, content : Union[Shard, ShardJob]) -> None:
+	temp_file_path = file_path + '.tmp'
+	with open(temp_file_path, 'w') as json_file:
+		json.dump(content, json_file)
+	os.replace(temp_file_path, file_path)
+
+
+def read_json_file(file_path : str) -> Optional[Dict[str, Any]]:
+	try:
+		with open(file_path, 'r') as json_file:
+			return json.load(json_file)
+	except (OSError, ValueError):
+		return None
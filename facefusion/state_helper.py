@@ -0,0 +1,39 @@
+from types import ModuleType
+from typing import Dict
+
+import facefusion.globals
+from facefusion.processors.frame import globals as frame_processors_globals
+from facefusion.typing import GlobalsState
+
+GLOBALS_STATE_TYPES = (type(None), bool, int, float, str, list, tuple, dict)
+
+
+def get_globals_modules() -> Dict[str, ModuleType]:
+	globals_modules =\
+	{
+		'globals': facefusion.globals,
+		'frame_processors_globals': frame_processors_globals
+	}
+	return globals_modules
+
+
+# 导出全局参数,用于在子进程中还原运行状态
+def export_globals_state() -> GlobalsState:
+	globals_state : GlobalsState = {}
+
+	for globals_name, globals_module in get_globals_modules().items():
+		globals_state[globals_name] = {}
+		for key, value in vars(globals_module).items():
+			if not key.startswith('_') and isinstance(value, GLOBALS_STATE_TYPES):
+				globals_state[globals_name][key] = value
+	return globals_state
+
+
+def import_globals_state(globals_state : GlobalsState) -> None:
+	globals_modules = get_globals_modules()
+
+	for globals_name, globals_values in globals_state.items():
+		if globals_name in globals_modules:
+			for key, value in globals_values.items():
+				setattr(globals_modules[globals_name], key, value)
+
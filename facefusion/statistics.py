@@ -1,8 +1,11 @@
+import os
 from typing import Any, Dict
 import numpy
 
 import facefusion.globals
-from facefusion.face_store import FACE_STORE
+from facefusion.face_store import FACE_STORE, get_static_faces_stats
+from facefusion.inference_manager import get_inference_stats
+from facefusion.thread_helper import get_thread_lock_contentions, get_thread_lock_wait_time
 from facefusion.typing import FaceSet
 from facefusion import logger
 
@@ -49,3 +52,9 @@ def conditional_log_statistics() -> None:
 
 		for name, value in statistics.items():
 			logger.debug(str(name) + ': ' + str(value), __name__.upper())
+		for name, value in get_static_faces_stats().items():
+			logger.debug('static_faces_' + name + ': ' + str(value), __name__.upper())
+		logger.debug('thread_lock_contentions: ' + str(get_thread_lock_contentions()), __name__.upper())
+		logger.debug('thread_lock_wait_time: ' + str(round(get_thread_lock_wait_time(), 2)) + ' s', __name__.upper())
+		for inference_stat in get_inference_stats():
+			logger.debug(os.path.basename(inference_stat.get('model_path')) + ': model_size ' + str(round(inference_stat.get('model_size') / 1024 ** 2)) + ' MB, ' + str(round(inference_stat.get('load_time'), 2)) + ' s, ' + str(inference_stat.get('replica_total')) + ' replicas, ' + str(inference_stat.get('run_total')) + ' runs, ' + str(round(inference_stat.get('wait_time'), 2)) + ' s waiting', __name__.upper())
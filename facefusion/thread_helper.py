@@ -1,16 +1,45 @@
-from typing import List, Union, ContextManager
+from typing import Any, List, Union, ContextManager
 import threading
 from contextlib import nullcontext
+from time import perf_counter
 
-THREAD_LOCK : threading.Lock = threading.Lock()
+
+# 非阻塞获取失败时才计为一次竞争,并累计实际等待的时间,用于确认热路径上没有锁竞争
+class ThreadLock:
+	def __init__(self) -> None:
+		self.lock = threading.Lock()
+		self.contentions = 0
+		self.wait_time = 0.0
+
+	def __enter__(self) -> None:
+		if not self.lock.acquire(blocking = False):
+			start_time = perf_counter()
+			self.lock.acquire()
+			# 持有锁时更新计数,不需要额外的锁
+			self.contentions += 1
+			self.wait_time += perf_counter() - start_time
+
+	def __exit__(self, *exception : Any) -> None:
+		self.lock.release()
+
+
+THREAD_LOCK : ThreadLock = ThreadLock()
 THREAD_SEMAPHORE : threading.Semaphore = threading.Semaphore()
 NULL_CONTEXT : ContextManager[None] = nullcontext()
 
 
-def thread_lock() -> threading.Lock:
+def thread_lock() -> ThreadLock:
 	return THREAD_LOCK
 
 
+def get_thread_lock_contentions() -> int:
+	return THREAD_LOCK.contentions
+
+
+def get_thread_lock_wait_time() -> float:
+	return THREAD_LOCK.wait_time
+
+
 def thread_semaphore() -> threading.Semaphore:
 	return THREAD_SEMAPHORE
 
@@ -1,5 +1,6 @@
-from typing import Any, Literal, Callable, List, Tuple, Dict, TypedDict
-from collections import namedtuple
+from typing import Any, Literal, Callable, Iterable, List, Optional, Tuple, Dict, TypedDict, Union
+from collections import namedtuple, OrderedDict
+import threading
 import numpy
 
 BoundingBox = numpy.ndarray[Any, Any]
@@ -19,7 +20,35 @@ FaceScoreSet = TypedDict('FaceScoreSet',
 	'landmarker' : Score
 })
 Embedding = numpy.ndarray[Any, Any]
-Face = namedtuple('Face',
+# 检测结果按行堆叠: 边框(N, 4), 五点关键点(N, 5, 2), 分数(N)
+FaceDetection = Tuple[BoundingBox, FaceLandmark5, numpy.ndarray[Any, Any]]
+FaceAttribute = Literal['embedding', 'gender_age']
+
+
+# 延迟计算的字段,首次访问时求值并缓存
+class LazyFaceValue:
+	__slots__ = ('loader', 'value', 'lock')
+
+	def __init__(self, loader : Callable[[], Any]) -> None:
+		self.loader : Optional[Callable[[], Any]] = loader
+		self.value : Any = None
+		self.lock = threading.Lock()
+
+	def resolve(self) -> Any:
+		if self.loader:
+			with self.lock:
+				if self.loader:
+					self.value = self.loader()
+					self.loader = None
+		return self.value
+
+
+LazyEmbedding = Union[Embedding, LazyFaceValue]
+LazyGenderAge = Tuple[Union[int, LazyFaceValue], Union[int, LazyFaceValue]]
+
+
+# embedding、normed_embedding、gender、age可以是LazyFaceValue,访问时透明求值
+class Face(namedtuple('Face',
 [
 	'bounding_box',
 	'landmarks',
@@ -28,11 +57,40 @@ Face = namedtuple('Face',
 	'normed_embedding',
 	'gender',
 	'age'
-])
+])):
+	__slots__ = ()
+
+	@property
+	def embedding(self) -> Any:
+		return self.resolve_field(3)
+
+	@property
+	def normed_embedding(self) -> Any:
+		return self.resolve_field(4)
+
+	@property
+	def gender(self) -> Any:
+		return self.resolve_field(5)
+
+	@property
+	def age(self) -> Any:
+		return self.resolve_field(6)
+
+	def resolve_field(self, index : int) -> Any:
+		field_value = tuple.__getitem__(self, index)
+		if isinstance(field_value, LazyFaceValue):
+			return field_value.resolve()
+		return field_value
+
+	# 序列化时求出全部延迟字段,子进程不需要模型
+	def __getnewargs__(self) -> Tuple[Any, ...]:
+		return tuple(self.resolve_field(index) for index in range(len(self)))
+
+
 FaceSet = Dict[str, List[Face]]
 FaceStore = TypedDict('FaceStore',
 {
-	'static_faces' : FaceSet,
+	'static_faces' : OrderedDict[str, List[Face]],
 	'reference_faces': FaceSet
 })
 
@@ -40,6 +98,12 @@ VisionFrame = numpy.ndarray[Any, Any]
 Mask = numpy.ndarray[Any, Any]
 Matrix = numpy.ndarray[Any, Any]
 Translation = numpy.ndarray[Any, Any]
+FrameSignature = Tuple[int, VisionFrame]
+FaceTrack = TypedDict('FaceTrack',
+{
+	'vision_frame' : VisionFrame,
+	'faces' : List[Face]
+})
 
 AudioBuffer = bytes
 Audio = numpy.ndarray[Any, Any]
@@ -59,11 +123,70 @@ QueuePayload = TypedDict('QueuePayload',
 	'frame_path' : str
 })
 UpdateProgress = Callable[[int], None]
-ProcessFrames = Callable[[List[str], List[QueuePayload], UpdateProgress], None]
+ProcessFrames = Callable[[List[str], Iterable[QueuePayload], UpdateProgress], None]
 
 WarpTemplate = Literal['arcface_112_v1', 'arcface_112_v2', 'arcface_128_v2', 'ffhq_512']
 WarpTemplateSet = Dict[WarpTemplate, numpy.ndarray[Any, Any]]
 ProcessMode = Literal['output', 'preview', 'stream']
+ExecutionBackend = Literal['thread', 'process']
+ExecutionMode = Literal['sequential', 'parallel']
+ExecutionGraphOptimization = Literal['disable', 'basic', 'extended', 'all']
+ShardRole = Literal['coordinator', 'worker']
+Shard = TypedDict('Shard',
+{
+	'index' : int,
+	'trim_frame_start' : int,
+	'trim_frame_end' : int
+})
+ShardJob = TypedDict('ShardJob',
+{
+	'target_path' : str,
+	'trim_frame_start' : int,
+	'shard_total' : int
+})
+GlobalsState = Dict[str, Dict[str, Any]]
+ServerJobStatus = Literal['queued', 'processing', 'completed', 'failed']
+ServerJob = TypedDict('ServerJob',
+{
+	'job_id' : str,
+	'status' : ServerJobStatus,
+	'source_paths' : List[str],
+	'target_path' : str,
+	'output_path' : Optional[str],
+	'frame_done' : int,
+	'frame_total' : int
+})
+ServerJobUpdate = TypedDict('ServerJobUpdate',
+{
+	'status' : ServerJobStatus,
+	'output_path' : Optional[str],
+	'frame_done' : int,
+	'frame_total' : int
+}, total = False)
+FaceIndex = TypedDict('FaceIndex',
+{
+	'embeddings' : Embedding,
+	'centroids' : Embedding,
+	'clusters' : numpy.ndarray[Any, Any]
+})
+FaceCache = TypedDict('FaceCache',
+{
+	'target_path' : str,
+	'cache_path' : str,
+	'frame_indices' : Dict[str, Tuple[int, int]],
+	'chunk_paths' : List[str],
+	'chunks' : List[Dict[str, numpy.ndarray[Any, Any]]]
+})
+InferenceStat = TypedDict('InferenceStat',
+{
+	'model_path' : str,
+	'execution_providers' : List[str],
+	'model_size' : int,
+	'load_time' : float,
+	'replica_total' : int,
+	'run_total' : int,
+	'wait_time' : float
+})
 
 LogLevel = Literal['error', 'warn', 'info', 'debug']
 VideoMemoryStrategy = Literal['strict', 'moderate', 'tolerant']
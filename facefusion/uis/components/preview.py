@@ -9,10 +9,10 @@ from facefusion import logger, wording
 from facefusion.audio import get_audio_frame, create_empty_audio_frame
 from facefusion.common_helper import get_first
 from facefusion.core import conditional_append_reference_faces
-from facefusion.face_analyser import get_average_face, clear_face_analyser
+from facefusion.face_analyser import get_source_face, clear_face_analyser
 from facefusion.face_store import clear_static_faces, get_reference_faces, clear_reference_faces
 from facefusion.typing import Face, FaceSet, AudioFrame, VisionFrame
-from facefusion.vision import get_video_frame, count_video_frame_total, normalize_frame_color, resize_frame_resolution, read_static_image, read_static_images
+from facefusion.vision import get_video_frame, count_video_frame_total, normalize_frame_color, resize_frame_resolution, read_static_image
 from facefusion.filesystem import is_image, is_video, filter_audio_paths
 from facefusion.content_analyser import analyse_frame
 from facefusion.processors.frame.core import load_frame_processor_module
@@ -41,8 +41,7 @@ def render() -> None:
 	}
 	conditional_append_reference_faces()
 	reference_faces = get_reference_faces() if 'reference' in facefusion.globals.face_selector_mode else None
-	source_frames = read_static_images(facefusion.globals.source_paths)
-	source_face = get_average_face(source_frames)
+	source_face = get_source_face(facefusion.globals.source_paths)
 	source_audio_path = get_first(filter_audio_paths(facefusion.globals.source_paths))
 	source_audio_frame = create_empty_audio_frame()
 	if source_audio_path and facefusion.globals.output_video_fps and facefusion.globals.reference_frame_number:
@@ -157,8 +156,7 @@ def update_preview_image(frame_number : int = 0) -> gradio.Image:
 		logger.enable()
 	conditional_append_reference_faces()
 	reference_faces = get_reference_faces() if 'reference' in facefusion.globals.face_selector_mode else None
-	source_frames = read_static_images(facefusion.globals.source_paths)
-	source_face = get_average_face(source_frames)
+	source_face = get_source_face(facefusion.globals.source_paths)
 	source_audio_path = get_first(filter_audio_paths(facefusion.globals.source_paths))
 	source_audio_frame = create_empty_audio_frame()
 	if source_audio_path and facefusion.globals.output_video_fps and facefusion.globals.reference_frame_number:
@@ -0,0 +1,82 @@
+import multiprocessing
+import os
+from time import sleep, time
+from typing import List, Optional, Tuple
+
+import facefusion.globals
+from facefusion import logger, process_manager
+from facefusion.face_store import get_reference_faces, append_reference_face
+from facefusion.filesystem import get_temp_directory_path, is_video
+from facefusion.state_helper import export_globals_state, import_globals_state
+from facefusion.typing import FaceSet, GlobalsState
+
+PROCESS_CONTEXT = multiprocessing.get_context('spawn')
+
+
+# 按关键帧切分区间,区间为左闭右开,与trim滤镜的start_frame/end_frame一致
+def create_segment_ranges(trim_frame_start : int, trim_frame_end : int, keyframes : List[int], segment_count : int) -> List[Tuple[int, int]]:
+	segment_boundaries = [ trim_frame_start ]
+
+	for segment_index in range(1, segment_count):
+		segment_boundary = trim_frame_start + round((trim_frame_end - trim_frame_start) * segment_index / segment_count)
+		segment_keyframes = [ keyframe for keyframe in keyframes if segment_boundaries[-1] < keyframe < trim_frame_end ]
+		if segment_keyframes:
+			segment_boundary = min(segment_keyframes, key = lambda keyframe : abs(keyframe - segment_boundary))
+		if segment_boundaries[-1] < segment_boundary < trim_frame_end:
+			segment_boundaries.append(segment_boundary)
+	segment_boundaries.append(trim_frame_end)
+	return list(zip(segment_boundaries[:-1], segment_boundaries[1:]))
+
+
+def get_segment_paths(target_path : str, segment_total : int) -> List[str]:
+	segments_directory_path = os.path.join(get_temp_directory_path(target_path), 'segments')
+	return [ os.path.join(segments_directory_path, str(segment_index).zfill(4) + '.mp4') for segment_index in range(segment_total) ]
+
+
+# 每个片段在独立进程中完整执行提取、处理、编码
+def multi_process_segments(target_path : str, segment_ranges : List[Tuple[int, int]]) -> Optional[List[str]]:
+	segment_paths = get_segment_paths(target_path, len(segment_ranges))
+	globals_state = export_globals_state()
+	reference_faces = get_reference_faces()
+	process_pool = PROCESS_CONTEXT.Pool(processes = len(segment_ranges))
+
+	try:
+		async_results = []
+		for segment_path, (trim_frame_start, trim_frame_end) in zip(segment_paths, segment_ranges):
+			async_result = process_pool.apply_async(process_video_segment, (globals_state, reference_faces, trim_frame_start, trim_frame_end, segment_path, len(segment_ranges)))
+			async_results.append(async_result)
+		while not all(async_result.ready() for async_result in async_results):
+			if not process_manager.is_processing():
+				process_pool.terminate()
+				return None
+			sleep(0.5)
+		if all(async_result.get() for async_result in async_results):
+			return segment_paths
+		return None
+	finally:
+		process_pool.terminate()
+		process_pool.join()
+
+
+def process_video_segment(globals_state : GlobalsState, reference_faces : Optional[FaceSet], trim_frame_start : int, trim_frame_end : int, segment_path : str, segment_total : int) -> bool:
+	from facefusion import core
+
+	import_globals_state(globals_state)
+	logger.init(facefusion.globals.log_level)
+	facefusion.globals.trim_frame_offset = (facefusion.globals.trim_frame_offset or 0) + trim_frame_start - (facefusion.globals.trim_frame_start or 0)
+	facefusion.globals.trim_frame_start = trim_frame_start
+	facefusion.globals.trim_frame_end = trim_frame_end
+	facefusion.globals.output_path = segment_path
+	facefusion.globals.temp_dir = os.path.splitext(segment_path)[0]
+	facefusion.globals.skip_audio = True
+	facefusion.globals.video_segment_count = 1
+	# 进程池中的进程不能再创建子进程,并按片段数平分线程
+	facefusion.globals.execution_backend = 'thread'
+	facefusion.globals.execution_thread_count = max(facefusion.globals.execution_thread_count // segment_total, 1)
+	if reference_faces:
+		for reference_name, faces in reference_faces.items():
+			for face in faces:
+				append_reference_face(reference_name, face)
+	os.makedirs(os.path.dirname(segment_path), exist_ok = True)
+	core.process_video(time())
+	return is_video(segment_path)
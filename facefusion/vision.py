@@ -6,7 +6,7 @@ import numpy
 import numpy as np
 from cv2.typing import Size
 
-from facefusion.typing import VisionFrame, Resolution, Fps
+from facefusion.typing import VisionFrame, Resolution, Fps, FrameSignature
 from facefusion.choices import image_template_sizes, video_template_sizes
 from facefusion.filesystem import is_image, is_video
 
@@ -46,6 +46,44 @@ def write_image(image_path : str, vision_frame : VisionFrame) -> bool:
 	return False
 
 
+# 差值感知哈希: 缩小为17x16的灰度图,比较相邻像素明暗得到256位哈希
+def create_frame_dhash(vision_frame : VisionFrame) -> int:
+	if vision_frame.ndim == 3:
+		vision_frame = cv2.cvtColor(vision_frame, cv2.COLOR_BGR2GRAY)
+	hash_frame = cv2.resize(vision_frame, (17, 16), interpolation = cv2.INTER_AREA)
+	hash_bits = hash_frame[:, 1:] > hash_frame[:, :-1]
+	return int.from_bytes(numpy.packbits(hash_bits).tobytes(), 'big')
+
+
+# 帧签名由哈希与128x128的灰度缩略图组成,缩略图用于逐块比较像素差
+def create_frame_signature(vision_frame : VisionFrame) -> FrameSignature:
+	if vision_frame.ndim == 3:
+		vision_frame = cv2.cvtColor(vision_frame, cv2.COLOR_BGR2GRAY)
+	frame_thumbnail = cv2.resize(vision_frame, (128, 128), interpolation = cv2.INTER_AREA)
+	return create_frame_dhash(vision_frame), frame_thumbnail
+
+
+def read_frame_signature(image_path : str) -> Optional[FrameSignature]:
+	# 只计算签名时按1/8尺寸解码灰度图
+	vision_frame = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+	if vision_frame is None:
+		vision_frame = read_image(image_path)
+	if vision_frame is not None:
+		return create_frame_signature(vision_frame)
+	return None
+
+
+def count_dhash_distance(frame_dhash : int, other_frame_dhash : int) -> int:
+	return bin(frame_dhash ^ other_frame_dhash).count('1')
+
+
+# 按8x8像素分块求平均绝对差,返回差异最大的块,口型、眨眼等局部变化不会被整帧平均掉
+def count_thumbnail_difference(frame_thumbnail : VisionFrame, other_frame_thumbnail : VisionFrame) -> float:
+	thumbnail_difference = cv2.absdiff(frame_thumbnail, other_frame_thumbnail).astype(numpy.float32)
+	block_difference = cv2.resize(thumbnail_difference, (16, 16), interpolation = cv2.INTER_AREA)
+	return float(block_difference.max())
+
+
 def detect_image_resolution(image_path : str) -> Optional[Resolution]:
 	if is_image(image_path):
 		image = read_image(image_path)
@@ -9,6 +9,27 @@ WORDING : Dict[str, Any] =\
 	'extracting_frames': 'Extracting frames with a resolution of {resolution} and {fps} frames per second',
 	'extracting_frames_succeed': 'Extracting frames succeed',
 	'extracting_frames_failed': 'Extracting frames failed',
+	'prefetching_frames': 'Prefetching frames of {target_path}',
+	'streaming_frames': 'Streaming frames with a resolution of {resolution} and {fps} frames per second',
+	'streaming_frames_succeed': 'Streaming frames succeed',
+	'streaming_frames_failed': 'Streaming frames failed',
+	'skipping_duplicate_frames': 'Skipping {frame_total} duplicate frames',
+	'skipping_empty_frames': 'Skipping {frame_total} frames without faces',
+	'processing_segments': 'Processing the video in {segment_total} parallel segments',
+	'processing_segments_succeed': 'Processing segments succeed',
+	'processing_segments_failed': 'Processing segments failed',
+	'processing_shards': 'Processing the video in {shard_total} shards',
+	'processing_shard': 'Processing shard {shard_index} with the frames {trim_frame_start} to {trim_frame_end}',
+	'processing_shard_failed': 'Processing shard {shard_index} failed',
+	'waiting_for_shards': 'Waiting for the remaining shards of other workers',
+	'requeuing_shard': 'Requeuing the shard {shard_name} after its claim expired',
+	'server_started': 'Server listening on http://{host}:{port}',
+	'server_job_failed': 'Processing job {job_id} failed',
+	'inference_session_loaded': 'Loaded {model_name} in {load_time} seconds',
+	'face_cache_loaded': 'Loaded the cached faces of {frame_total} frames',
+	'face_cache_saved': 'Saved the cached faces of {frame_total} frames',
+	'model_initializer_not_saved': 'Could not save the model initializer to {initializer_path}',
+	'resuming_frames': 'Resuming with {frame_total} frames already processed',
 	'analysing': 'Analysing',
 	'processing': 'Processing',
 	'downloading': 'Downloading',
@@ -68,14 +89,28 @@ WORDING : Dict[str, Any] =\
 		'out_new_dir': 'use a new directory for the exported video frames',
 		'hwaccel_cuda': 'use the CUDA hardware acceleration for the model inference',
 		'headless': 'run the program without a user interface',
+		'shard_directory': 'specify the shared directory used to split a video across multiple machines',
+		'shard_role': 'choose whether to create the shards of the target or to only process claimed shards',
+		'shard_count': 'specify the amount of shards the target video is split into',
+		'server': 'run as a local service that keeps the models loaded and accepts jobs over http',
+		'server_port': 'specify the port of the local service',
 		'log_level': 'adjust the message severity displayed in the terminal',
 		# execution
 		'execution_providers': 'accelerate the model inference using different providers (choices: {choices}, ...)',
 		'execution_thread_count': 'specify the amount of parallel threads while processing',
 		'execution_queue_count': 'specify the amount of frames each thread is processing',
+		'execution_backend': 'choose whether the frames are processed by threads or by worker processes',
+		'execution_model_limits': 'limit the parallel inferences of a model (e.g. gfpgan_1.4=2)',
+		'execution_model_replicas': 'create several sessions of a model that split the cpu threads (e.g. real_esrgan_x4=4)',
+		'execution_intra_op_threads': 'specify the threads used inside an operator of a model, * applies to all models (e.g. *=4)',
+		'execution_inter_op_threads': 'specify the threads used across the operators of a model (e.g. gfpgan_1.4=2)',
+		'execution_modes': 'run the operators of a model sequential or parallel (choices: {choices})',
+		'execution_graph_optimizations': 'specify the graph optimization level of a model (choices: {choices})',
+		'execution_cache_directory': 'keep the optimized cpu models in the directory and load them directly next time',
 		# memory
 		'video_memory_strategy': 'balance fast frame processing and low VRAM usage',
 		'system_memory_limit': 'limit the available RAM that can be used while processing',
+		'static_face_limit': 'limit the amount of frames kept in the static face cache, counted in entries rather than bytes (0 = unlimited)',
 		# face analyser
 		'face_analyser_order': 'specify the order in which the face analyser detects faces',
 		'face_analyser_age': 'filter the detected faces based on their age',
@@ -84,6 +119,9 @@ WORDING : Dict[str, Any] =\
 		'face_detector_size': 'specify the size of the frame provided to the face detector',
 		'face_detector_score': 'filter the detected faces base on the confidence score',
 		'face_landmarker_score': 'filter the detected landmarks base on the confidence score',
+		'face_detector_interval': 'detect the faces every n frames and track the landmarks with optical flow in between',
+		'face_presence_interval': 'scan every n frames for faces beforehand and skip the frames without faces',
+		'face_cache_directory': 'keep the analysed faces of each target in the directory and reuse them for later runs',
 		# face selector
 		'face_selector_mode': 'use reference based tracking or simple matching',
 		'reference_face_position': 'specify the position used to create the reference face',
@@ -99,6 +137,9 @@ WORDING : Dict[str, Any] =\
 		'trim_frame_end': 'specify the the end frame of the target video',
 		'temp_frame_format': 'specify the temporary resources format',
 		'keep_temp': 'keep the temporary resources after processing',
+		'video_segment_count': 'split the target video into segments that are processed by parallel worker processes',
+		'stream_frames': 'decode, process and encode the video frames in memory without temporary frames',
+		'duplicate_frame_distance': 'reuse the output of the previous frame when the perceptual hash distance is within this tolerance',
 		# output creation
 		'output_image_quality': 'specify the image quality which translates to the compression factor',
 		'output_image_resolution': 'specify the image output resolution based on the target image',
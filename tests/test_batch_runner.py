@@ -0,0 +1,21 @@
+from typing import List
+
+import facefusion.globals
+from facefusion.batch_runner import run_batch, submit_finalize
+
+
+def test_run_batch() -> None:
+	facefusion.globals.video_memory_strategy = 'strict'
+	processed_paths : List[str] = []
+	finalized_paths : List[str] = []
+
+	def process_target(target_path : str) -> None:
+		processed_paths.append(target_path)
+		assert submit_finalize(finalized_paths.append, target_path)
+
+	run_batch([ 'a.jpg', 'b.jpg', 'c.jpg' ], process_target)
+
+	assert processed_paths == [ 'a.jpg', 'b.jpg', 'c.jpg' ]
+	assert finalized_paths == [ 'a.jpg', 'b.jpg', 'c.jpg' ]
+	assert facefusion.globals.video_memory_strategy == 'strict'
+	assert submit_finalize(finalized_paths.append, 'd.jpg') is False
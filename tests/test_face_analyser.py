@@ -1,10 +1,14 @@
+from typing import Any, Dict, List, Tuple
+import pickle
 import subprocess
+import numpy
 import pytest
 
 import facefusion.globals
 from facefusion.download import conditional_download
-from facefusion.face_analyser import pre_check, clear_face_analyser, get_one_face
-from facefusion.typing import Face
+from facefusion import face_analyser
+from facefusion.face_analyser import pre_check, clear_face_analyser, get_one_face, find_similar_faces, run_batch
+from facefusion.typing import Face, LazyFaceValue
 from facefusion.vision import read_static_image
 
 
@@ -101,3 +105,74 @@ def test_get_one_face_with_yunet() -> None:
 		face = get_one_face(source_frame)
 
 		assert isinstance(face, Face)
+
+
+def test_run_batch() -> None:
+	class InferenceInput:
+		def __init__(self, shape : List[Any]) -> None:
+			self.name = 'input'
+			self.shape = shape
+
+	class InferenceSession:
+		def __init__(self, shape : List[Any]) -> None:
+			self.batch_sizes : List[int] = []
+			self.shape = shape
+
+		def get_inputs(self) -> List[InferenceInput]:
+			return [ InferenceInput(self.shape) ]
+
+		def run(self, output_names : None, input_feed : Dict[str, numpy.ndarray[Any, Any]]) -> List[numpy.ndarray[Any, Any]]:
+			input_batch = input_feed.get('input')
+			self.batch_sizes.append(len(input_batch))
+			return [ input_batch * 2, input_batch.sum(axis = 1) ]
+
+	facefusion.globals.execution_providers = [ 'CPUExecutionProvider' ]
+	input_batch = numpy.arange(6, dtype = numpy.float32).reshape(3, 2)
+	dynamic_session = InferenceSession([ 'batch', 2 ])
+	static_session = InferenceSession([ 1, 2 ])
+
+	for inference_session in [ dynamic_session, static_session ]:
+		output_batch, output_sum = run_batch(inference_session, input_batch)
+		assert numpy.array_equal(output_batch, input_batch * 2)
+		assert numpy.array_equal(output_sum, [ 1, 5, 9 ])
+	assert dynamic_session.batch_sizes == [ 3 ]
+	assert static_session.batch_sizes == [ 1, 1, 1 ]
+
+
+def test_lazy_face() -> None:
+	loader_calls : List[int] = []
+
+	def load_gender_age() -> Tuple[int, int]:
+		loader_calls.append(1)
+		return 1, 30
+
+	gender_age_value = LazyFaceValue(load_gender_age)
+	face = Face(
+		bounding_box = numpy.array([ 0, 0, 10, 10 ]),
+		landmarks = {},
+		scores = {},
+		embedding = numpy.ones(512),
+		normed_embedding = numpy.ones(512),
+		gender = LazyFaceValue(lambda : gender_age_value.resolve()[0]),
+		age = LazyFaceValue(lambda : gender_age_value.resolve()[1])
+	)
+
+	assert loader_calls == []
+	assert face.gender == 1
+	assert face.age == 30
+	assert loader_calls == [ 1 ]
+	assert pickle.loads(pickle.dumps(face._replace(embedding = numpy.zeros(512)))).age == 30
+
+
+def test_find_similar_faces(monkeypatch : pytest.MonkeyPatch) -> None:
+	def create_face(axis : int) -> Face:
+		return Face(bounding_box = numpy.array([ 0, 0, 10, 10 ]), landmarks = {}, scores = {}, embedding = numpy.eye(512)[axis], normed_embedding = numpy.eye(512)[axis], gender = 0, age = 20)
+
+	many_faces = [ create_face(0), create_face(1), create_face(2) ]
+	monkeypatch.setattr(face_analyser, 'get_many_faces', lambda vision_frame : many_faces)
+	reference_faces =\
+	{
+		'origin': [ create_face(1), create_face(0), create_face(1) ]
+	}
+
+	assert find_similar_faces(reference_faces, numpy.zeros((10, 10, 3)), 0.6) == [ many_faces[1], many_faces[0], many_faces[1] ]
@@ -0,0 +1,106 @@
+import os
+import pathlib
+
+import numpy
+import pytest
+
+import facefusion.globals
+from facefusion import face_cache
+from facefusion.face_cache import clear_face_cache, create_source_key, get_face_cache, read_cached_faces, read_source_face, save_face_cache, write_cached_faces, write_source_face
+from facefusion.face_tracker import track_frame_number
+from facefusion.typing import Face, LazyFaceValue
+
+
+def create_face() -> Face:
+	return Face(
+		bounding_box = numpy.array([ 1, 2, 3, 4 ]),
+		landmarks =
+		{
+			'5': numpy.ones((5, 2)),
+			'5/68': numpy.ones((5, 2)),
+			'68': numpy.ones((68, 2)),
+			'68/5': numpy.ones((68, 2))
+		},
+		scores =
+		{
+			'detector': 0.9,
+			'landmarker': 0.8
+		},
+		embedding = numpy.ones(512),
+		normed_embedding = numpy.ones(512),
+		gender = 1,
+		age = 30
+	)
+
+
+def test_save_face_cache(tmp_path : pathlib.Path) -> None:
+	target_path = tmp_path / 'target.mp4'
+	target_path.write_bytes(b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom' + bytes(1024))
+	facefusion.globals.target_path = str(target_path)
+	facefusion.globals.face_cache_directory = str(tmp_path / 'face_cache')
+	vision_frame = numpy.random.randint(1, 255, (64, 64, 3), dtype = numpy.uint8)
+	face = create_face()._replace(gender = LazyFaceValue(lambda : 1))
+	clear_face_cache()
+	write_cached_faces(vision_frame, [ face ])
+	write_cached_faces(numpy.full((64, 64, 3), 1, dtype = numpy.uint8), [])
+	save_face_cache()
+
+	assert len(get_face_cache().get('frame_indices')) == 2
+	cached_face = read_cached_faces(vision_frame)[0]
+	assert numpy.array_equal(cached_face.bounding_box, [ 1, 2, 3, 4 ])
+	assert cached_face.scores.get('detector') == numpy.float32(0.9)
+	assert numpy.array_equal(cached_face.normed_embedding, numpy.ones(512))
+	assert cached_face.gender is None
+	assert cached_face.age == 30
+	assert read_cached_faces(numpy.full((64, 64, 3), 1, dtype = numpy.uint8)) == []
+
+	facefusion.globals.target_path = None
+	facefusion.globals.face_cache_directory = None
+	clear_face_cache()
+
+
+def test_source_face(tmp_path : pathlib.Path) -> None:
+	source_path = tmp_path / 'source.jpg'
+	source_path.write_bytes(bytes(range(256)))
+	facefusion.globals.face_cache_directory = str(tmp_path / 'face_cache')
+	source_key = create_source_key([ str(source_path) ])
+	source_face = create_face()._replace(embedding = numpy.full(512, 2.0), gender = 0, age = 20)
+
+	assert read_source_face(source_key) is None
+	write_source_face(source_key, source_face)
+	assert numpy.array_equal(read_source_face(source_key).embedding, numpy.full(512, 2.0))
+	assert read_source_face(source_key).age == 20
+	source_path.write_bytes(bytes(range(128)))
+	assert create_source_key([ str(source_path) ]) != source_key
+
+	facefusion.globals.face_cache_directory = None
+
+
+def test_flush_face_cache_in_chunks(tmp_path : pathlib.Path, monkeypatch : pytest.MonkeyPatch) -> None:
+	target_path = tmp_path / 'target.mp4'
+	target_path.write_bytes(b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom' + bytes(1024))
+	facefusion.globals.target_path = str(target_path)
+	facefusion.globals.face_cache_directory = str(tmp_path / 'face_cache')
+	vision_frame = numpy.random.randint(1, 255, (64, 64, 3), dtype = numpy.uint8)
+	monkeypatch.setattr(face_cache, 'FACE_CACHE_CHUNK_SIZE', 2)
+	monkeypatch.setattr(face_cache, 'FACE_CACHE_CHUNK_LIMIT', 2)
+	clear_face_cache()
+
+	for frame_number in range(5):
+		with track_frame_number(frame_number):
+			write_cached_faces(vision_frame, [ create_face() ] * frame_number)
+	assert len(face_cache.FACE_CACHE_PENDING) == 1
+	assert len(get_face_cache().get('chunks')) == 2
+	with track_frame_number(3):
+		assert len(read_cached_faces(vision_frame)) == 3
+	assert read_cached_faces(vision_frame) is None
+
+	save_face_cache()
+	assert len(os.listdir(get_face_cache().get('cache_path'))) == 1
+	assert len(get_face_cache().get('frame_indices')) == 5
+	with track_frame_number(4):
+		assert len(read_cached_faces(vision_frame)) == 4
+
+	facefusion.globals.target_path = None
+	facefusion.globals.face_cache_directory = None
+	clear_face_cache()
@@ -0,0 +1,17 @@
+import numpy
+
+from facefusion.face_helper import apply_nms
+
+
+def test_apply_nms() -> None:
+	bounding_boxes = numpy.array(
+	[
+		[ 0, 0, 10, 10 ],
+		[ 1, 1, 10, 10 ],
+		[ 50, 50, 60, 60 ],
+		[ 0, 0, 10, 10 ]
+	])
+	scores = numpy.array([ 0.8, 0.9, 0.7, 0.95 ])
+
+	assert apply_nms(bounding_boxes, scores, 0.4).tolist() == [ 3, 2 ]
+	assert apply_nms(numpy.empty((0, 4)), numpy.empty(0), 0.4).size == 0
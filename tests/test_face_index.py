@@ -0,0 +1,24 @@
+import pathlib
+
+import numpy
+
+from facefusion.face_index import create_face_index, load_face_index, save_face_index, search_face_index
+
+
+def test_search_face_index(tmp_path : pathlib.Path) -> None:
+	embeddings = numpy.random.default_rng(0).normal(size = (300, 512)).astype(numpy.float32)
+	embeddings /= numpy.linalg.norm(embeddings, axis = 1, keepdims = True)
+	query_embeddings = numpy.concatenate([ embeddings[[ 10, 200 ]], -embeddings[[ 10 ]] ])
+	face_index = create_face_index(embeddings, 17)
+
+	assert search_face_index(create_face_index(embeddings, 0), query_embeddings, 0.6).any(axis = 1).tolist() == [ True, True, False ]
+	assert search_face_index(face_index, query_embeddings, 0.6).any(axis = 1).tolist() == [ True, True, False ]
+	save_face_index(str(tmp_path / 'face_index.npz'), face_index)
+	assert numpy.array_equal(load_face_index(str(tmp_path / 'face_index.npz')).get('clusters'), face_index.get('clusters'))
+
+
+def test_search_face_index_with_repeated_reference() -> None:
+	embeddings = numpy.eye(3, 512, dtype = numpy.float32)
+	reference_embeddings = embeddings[[ 1, 0, 1 ]]
+
+	assert search_face_index(create_face_index(reference_embeddings, 0), embeddings, 0.6).tolist() == [ [ False, True, False ], [ True, False, True ], [ False, False, False ] ]
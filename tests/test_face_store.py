@@ -0,0 +1,34 @@
+import numpy
+
+import facefusion.globals
+from facefusion.face_store import FACE_STORE, clear_static_faces, create_frame_hash, get_static_faces, get_static_faces_stats, set_static_faces
+from facefusion.face_tracker import track_frame_number
+
+
+def test_create_frame_hash() -> None:
+	vision_frame = numpy.random.randint(1, 255, (720, 1280, 3), dtype = numpy.uint8)
+
+	assert create_frame_hash(vision_frame) == create_frame_hash(vision_frame.copy())
+	assert create_frame_hash(vision_frame) != create_frame_hash(vision_frame[:, :640])
+	assert create_frame_hash(numpy.zeros((720, 1280, 3), dtype = numpy.uint8)) is None
+	with track_frame_number(10):
+		assert create_frame_hash(vision_frame).startswith('10-')
+
+
+def test_static_faces_limit() -> None:
+	facefusion.globals.static_face_limit = 2
+	vision_frames = [ numpy.full((64, 64, 3), index + 1, dtype = numpy.uint8) for index in range(3) ]
+	clear_static_faces()
+	stats = get_static_faces_stats()
+
+	set_static_faces(vision_frames[0], [])
+	set_static_faces(vision_frames[1], [])
+	assert get_static_faces(vision_frames[0]) == []
+	set_static_faces(vision_frames[2], [])
+
+	assert len(FACE_STORE['static_faces']) == 2
+	assert get_static_faces(vision_frames[1]) is None
+	assert get_static_faces(vision_frames[0]) == []
+	assert get_static_faces_stats().get('evictions') - stats.get('evictions') == 1
+	assert get_static_faces_stats().get('hits') - stats.get('hits') == 2
+	clear_static_faces()
@@ -0,0 +1,28 @@
+import pathlib
+
+import numpy
+import onnx
+from onnx import helper, numpy_helper
+
+from facefusion.processors.frame.modules.face_swapper import get_model_initializer_path, load_model_initializer
+
+
+def test_load_model_initializer(tmp_path : pathlib.Path) -> None:
+	model_path = str(tmp_path / 'inswapper.onnx')
+	model_initializer = numpy.arange(16, dtype = numpy.float32).reshape(4, 4)
+	graph = helper.make_graph([ helper.make_node('Identity', [ 'source' ], [ 'output' ]) ], 'inswapper',
+	[
+		helper.make_tensor_value_info('source', onnx.TensorProto.FLOAT, [ 1, 4 ])
+	],
+	[
+		helper.make_tensor_value_info('output', onnx.TensorProto.FLOAT, [ 1, 4 ])
+	],
+	[
+		numpy_helper.from_array(numpy.zeros(4, dtype = numpy.float32), 'bias'),
+		numpy_helper.from_array(model_initializer, 'initializer')
+	])
+	onnx.save(helper.make_model(graph), model_path)
+
+	assert numpy.array_equal(load_model_initializer(model_path), model_initializer)
+	assert numpy.array_equal(numpy.load(get_model_initializer_path(model_path)), model_initializer)
+	assert isinstance(load_model_initializer(model_path), numpy.memmap)
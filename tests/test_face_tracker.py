@@ -0,0 +1,52 @@
+import cv2
+import numpy
+
+import facefusion.globals
+from facefusion.face_tracker import track_frame_number, track_faces, set_face_track, clear_face_tracks
+from facefusion.typing import Face
+
+
+def create_face(face_landmark_68 : numpy.ndarray) -> Face:
+	face_landmark_5 = face_landmark_68[:5]
+	return Face(
+		bounding_box = numpy.array([ 100, 80, 220, 200 ], dtype = numpy.float32),
+		landmarks =
+		{
+			'5': face_landmark_5,
+			'5/68': face_landmark_5,
+			'68': face_landmark_68,
+			'68/5': face_landmark_68
+		},
+		scores =
+		{
+			'detector': 0.9,
+			'landmarker': 0.9
+		},
+		embedding = numpy.ones(512),
+		normed_embedding = numpy.ones(512),
+		gender = 0,
+		age = 30
+	)
+
+
+def test_track_faces() -> None:
+	facefusion.globals.face_detector_interval = 5
+	facefusion.globals.face_landmarker_score = 0.5
+	vision_frame = cv2.GaussianBlur(numpy.random.RandomState(0).randint(0, 255, (240, 320, 3), dtype = numpy.uint8), (5, 5), 0)
+	shift_vision_frame = numpy.roll(vision_frame, (2, 3), axis = (0, 1))
+	face_landmark_68 = numpy.random.RandomState(1).uniform(110, 190, (68, 2)).astype(numpy.float32)
+
+	with track_frame_number(10):
+		assert track_faces(vision_frame) is None
+		set_face_track(vision_frame, [ create_face(face_landmark_68) ])
+	with track_frame_number(12):
+		tracked_faces = track_faces(shift_vision_frame)
+		assert numpy.allclose(tracked_faces[0].landmarks.get('68'), face_landmark_68 + [ 3, 2 ], atol = 0.5)
+		assert numpy.allclose(tracked_faces[0].bounding_box, [ 103, 82, 223, 202 ], atol = 0.5)
+		assert tracked_faces[0].age == 30
+		assert track_faces(255 - vision_frame) is None
+	with track_frame_number(15):
+		assert track_faces(shift_vision_frame) is None
+	assert track_faces(shift_vision_frame) is None
+	clear_face_tracks()
+	facefusion.globals.face_detector_interval = None
@@ -6,7 +6,8 @@ import facefusion.globals
 from facefusion import process_manager
 from facefusion.filesystem import get_temp_directory_path, create_temp, clear_temp
 from facefusion.download import conditional_download
-from facefusion.ffmpeg import extract_frames, read_audio_buffer
+from facefusion import ffmpeg
+from facefusion.ffmpeg import extract_frames, read_audio_buffer, create_trim_filter, create_trim_commands, open_video_reader, read_video_frames, close_video_reader, detect_video_keyframes
 
 
 @pytest.fixture(scope = 'module', autouse = True)
@@ -111,3 +112,38 @@ def test_read_audio_buffer() -> None:
 	assert isinstance(read_audio_buffer('.assets/examples/source.mp3', 1, 1), bytes)
 	assert isinstance(read_audio_buffer('.assets/examples/source.wav', 1, 1), bytes)
 	assert read_audio_buffer('.assets/examples/invalid.mp3', 1, 1) is None
+
+
+def test_create_trim_filter() -> None:
+	assert create_trim_filter(None, None, 30.0) == 'fps=30.0'
+	assert create_trim_filter(10, None, 30.0) == 'trim=start_frame=10,fps=30.0'
+	assert create_trim_filter(None, 20, 30.0) == 'trim=end_frame=20,fps=30.0'
+	assert create_trim_filter(10, 20, 30.0) == 'trim=start_frame=10:end_frame=20,fps=30.0'
+
+
+def test_create_trim_commands(monkeypatch : pytest.MonkeyPatch) -> None:
+	monkeypatch.setattr(ffmpeg, 'detect_video_fps', lambda target_path : 25.0)
+
+	assert create_trim_commands('target.mp4', None, None, 30.0) == ([], 'fps=30.0')
+	assert create_trim_commands('target.mp4', None, 20, 30.0) == ([], 'trim=end_frame=20,fps=30.0')
+	assert create_trim_commands('target.mp4', 10, None, 30.0) == ([ '-ss', '0.38' ], 'fps=30.0')
+	assert create_trim_commands('target.mp4', 10, 20, 30.0) == ([ '-ss', '0.38' ], 'trim=end_frame=10,fps=30.0')
+
+
+def test_read_video_frames() -> None:
+	facefusion.globals.trim_frame_start = 124
+	facefusion.globals.trim_frame_end = 224
+	video_reader = open_video_reader('.assets/examples/target-240p-30fps.mp4', '426x240', 30.0)
+	vision_frames = list(read_video_frames(video_reader, '426x240'))
+	close_video_reader(video_reader)
+
+	assert len(vision_frames) == 100
+	assert vision_frames[0].shape == (240, 426, 3)
+
+
+def test_detect_video_keyframes() -> None:
+	keyframes = detect_video_keyframes('.assets/examples/target-240p.mp4')
+
+	assert keyframes[0] == 0
+	assert keyframes == sorted(keyframes)
+	assert detect_video_keyframes('.assets/examples/invalid.mp4') == []
@@ -1,7 +1,9 @@
+import os
 import pytest
 
+import facefusion.globals
 from facefusion.download import conditional_download
-from facefusion.filesystem import is_file, is_directory, is_audio, has_audio, is_image, has_image, is_video, filter_audio_paths, filter_image_paths, list_directory
+from facefusion.filesystem import is_file, is_directory, is_audio, has_audio, is_image, has_image, is_video, filter_audio_paths, filter_image_paths, list_directory, get_temp_directory_path, get_out_temp_directory_path, get_out_temp_frame_path, create_temp, clear_temp, get_frame_journal_path, append_frame_journal, read_frame_journal, create_frame_journal, read_frame_journal_fingerprint, restore_frame_journal, clear_frame_journal, get_frame_journal_staging_path
 
 
 @pytest.fixture(scope = 'module', autouse = True)
@@ -74,3 +76,61 @@ def test_list_directory() -> None:
 	assert list_directory('.assets/examples')
 	assert list_directory('.assets/examples/source.jpg') is None
 	assert list_directory('invalid') is None
+
+
+def test_get_out_temp_frame_path() -> None:
+	facefusion.globals.temp_frame_format = 'jpg'
+	temp_frame_path = os.path.join(get_temp_directory_path('.assets/examples/target-240p.mp4'), '0001.jpg')
+
+	facefusion.globals.out_new_dir = False
+	assert get_out_temp_frame_path('.assets/examples/target-240p.mp4', temp_frame_path) == temp_frame_path
+	facefusion.globals.out_new_dir = True
+	assert get_out_temp_frame_path('.assets/examples/target-240p.mp4', temp_frame_path) == os.path.join(get_out_temp_directory_path('.assets/examples/target-240p.mp4'), '0001.jpg')
+	facefusion.globals.out_new_dir = None
+
+
+def test_read_frame_journal() -> None:
+	facefusion.globals.keep_temp = False
+	create_temp('.assets/examples/target-240p.mp4')
+	append_frame_journal('.assets/examples/target-240p.mp4', [ 'face_swapper', 'face_enhancer' ], '/tmp/0001.jpg')
+	append_frame_journal('.assets/examples/target-240p.mp4', [ 'face_swapper' ], '/tmp/0002.jpg')
+	with open(get_frame_journal_path('.assets/examples/target-240p.mp4'), 'a') as frame_journal_file:
+		frame_journal_file.write('face_enhancer 000')
+
+	assert read_frame_journal('.assets/examples/target-240p.mp4') ==\
+	{
+		'face_swapper': { '0001.jpg', '0002.jpg' },
+		'face_enhancer': { '0001.jpg' }
+	}
+
+	clear_temp('.assets/examples/target-240p.mp4')
+
+
+def test_restore_frame_journal() -> None:
+	facefusion.globals.keep_temp = False
+	facefusion.globals.temp_frame_format = 'jpg'
+	create_temp('.assets/examples/target-240p.mp4')
+	create_frame_journal('.assets/examples/target-240p.mp4', 'fingerprint')
+	temp_directory_path = get_temp_directory_path('.assets/examples/target-240p.mp4')
+	for frame_name in [ '0001.jpg', '0002.jpg' ]:
+		staging_path = get_frame_journal_staging_path('.assets/examples/target-240p.mp4', [ 'face_swapper', 'face_enhancer' ], frame_name)
+		os.makedirs(os.path.dirname(staging_path), exist_ok = True)
+		with open(staging_path, 'w') as staging_file:
+			staging_file.write('processed')
+		with open(os.path.join(temp_directory_path, frame_name), 'w') as frame_file:
+			frame_file.write('original')
+	append_frame_journal('.assets/examples/target-240p.mp4', [ 'face_swapper', 'face_enhancer' ], '0001.jpg')
+	append_frame_journal('.assets/examples/target-240p.mp4', [ 'face_swapper' ], '0002.jpg')
+
+	assert read_frame_journal_fingerprint('.assets/examples/target-240p.mp4') == 'fingerprint'
+	restore_frame_journal('.assets/examples/target-240p.mp4', read_frame_journal('.assets/examples/target-240p.mp4'))
+	with open(os.path.join(temp_directory_path, '0001.jpg')) as frame_file:
+		assert frame_file.read() == 'processed'
+	with open(os.path.join(temp_directory_path, '0002.jpg')) as frame_file:
+		assert frame_file.read() == 'original'
+	assert os.listdir(os.path.dirname(get_frame_journal_staging_path('.assets/examples/target-240p.mp4', [ 'face_swapper', 'face_enhancer' ], '0001.jpg'))) == []
+
+	clear_frame_journal('.assets/examples/target-240p.mp4')
+	assert read_frame_journal_fingerprint('.assets/examples/target-240p.mp4') is None
+	assert read_frame_journal('.assets/examples/target-240p.mp4') == {}
+	clear_temp('.assets/examples/target-240p.mp4')
@@ -0,0 +1,85 @@
+import os
+import pathlib
+from typing import Any, Dict, List
+
+import onnx
+import onnxruntime
+import pytest
+from onnx import helper
+
+import facefusion.globals
+from facefusion import inference_manager
+from facefusion.inference_manager import InferencePool, get_inference_session, clear_inference_sessions, get_inference_stats, get_model_value, create_inference_sessions, create_session_options
+
+
+def test_get_inference_session(monkeypatch : pytest.MonkeyPatch, tmp_path : pathlib.Path) -> None:
+	model_path = str(tmp_path / 'model.onnx')
+	link_path = str(tmp_path / 'link.onnx')
+	with open(model_path, 'wb') as model_file:
+		model_file.write(b'model')
+	os.symlink(model_path, link_path)
+	facefusion.globals.execution_providers = [ 'CPUExecutionProvider' ]
+
+	monkeypatch.setattr(inference_manager.onnxruntime, 'InferenceSession', lambda model_path, sess_options, providers : object())
+
+	inference_session = get_inference_session(model_path)
+	assert get_inference_session(link_path) is inference_session
+	assert [ inference_stat.get('model_size') for inference_stat in get_inference_stats() ] == [ 5 ]
+	clear_inference_sessions([ link_path ])
+	assert get_inference_stats() == []
+	assert get_inference_session(model_path) is not inference_session
+	inference_session = get_inference_session(model_path)
+	facefusion.globals.execution_intra_op_threads = [ 'model=2' ]
+	assert get_inference_session(model_path) is not inference_session
+	assert len(get_inference_stats()) == 2
+	facefusion.globals.execution_intra_op_threads = None
+	clear_inference_sessions([ model_path ])
+
+
+def test_inference_pool() -> None:
+	class InferenceSession:
+		def __init__(self, session_name : str) -> None:
+			self.session_name = session_name
+
+		def run(self, output_names : None, input_feed : Dict[str, Any]) -> List[str]:
+			return [ self.session_name ]
+
+	inference_stat =\
+	{
+		'run_total': 0,
+		'wait_time': 0.0
+	}
+	inference_pool = InferencePool([ InferenceSession('a'), InferenceSession('b') ], 1, inference_stat) # type: ignore[arg-type]
+
+	assert [ inference_pool.run(None, {}) for _ in range(3) ] == [ [ 'a' ], [ 'b' ], [ 'a' ] ]
+	assert inference_stat.get('run_total') == 3
+	assert get_model_value([ 'gfpgan_1.4=2', 'real_esrgan_x4=4' ], 'real_esrgan_x4') == 4
+	assert get_model_value([ 'real_esrgan_x4=0', 'gfpgan_1.4' ], 'real_esrgan_x4') is None
+
+
+def test_create_inference_sessions(tmp_path : pathlib.Path) -> None:
+	model_path = str(tmp_path / 'model.onnx')
+	graph = helper.make_graph([ helper.make_node('Relu', [ 'input' ], [ 'output' ]) ], 'model',
+	[
+		helper.make_tensor_value_info('input', onnx.TensorProto.FLOAT, [ 1, 4 ])
+	],
+	[
+		helper.make_tensor_value_info('output', onnx.TensorProto.FLOAT, [ 1, 4 ])
+	])
+	onnx.save(helper.make_model(graph, ir_version = 8, opset_imports = [ helper.make_opsetid('', 13) ]), model_path)
+	facefusion.globals.execution_intra_op_threads = [ '*=2', 'model=3' ]
+	facefusion.globals.execution_graph_optimizations = [ '*=basic' ]
+	facefusion.globals.execution_cache_directory = str(tmp_path / 'models')
+	session_options = create_session_options('model', 1)
+
+	assert session_options.intra_op_num_threads == 3
+	assert session_options.graph_optimization_level == onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC
+	assert create_session_options('other', 1).intra_op_num_threads == 2
+	assert len(create_inference_sessions(model_path, 'model', 2, [ 'CPUExecutionProvider' ])) == 2
+	assert len(os.listdir(str(tmp_path / 'models'))) == 1
+	inference_session = create_inference_sessions(model_path, 'model', 1, [ 'CPUExecutionProvider' ])[0]
+	assert inference_session.run(None, { 'input': [ [ -1.0, 0.0, 1.0, 2.0 ] ] })[0].tolist() == [ [ 0.0, 0.0, 1.0, 2.0 ] ]
+
+	facefusion.globals.execution_intra_op_threads = None
+	facefusion.globals.execution_graph_optimizations = None
+	facefusion.globals.execution_cache_directory = None
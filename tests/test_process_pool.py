@@ -0,0 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from typing import List
+
+from facefusion import process_manager
+from facefusion.processors.frame.process_pool import wait_process_futures
+
+
+def test_wait_process_futures() -> None:
+	release_event = Event()
+	progress_values : List[int] = []
+	process_manager.start()
+
+	with ThreadPoolExecutor(max_workers = 4) as executor:
+		futures = { executor.submit(lambda : 1) for _ in range(2) }
+		futures.add(executor.submit(lambda : release_event.wait() and 2))
+		futures = wait_process_futures(futures, progress_values.append, 2)
+
+		assert len(futures) == 1
+		assert progress_values == [ 1, 1 ]
+		release_event.set()
+		assert wait_process_futures(futures, progress_values.append, 1) == set()
+		assert progress_values == [ 1, 1, 2 ]
+	process_manager.end()
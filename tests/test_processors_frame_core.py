@@ -0,0 +1,236 @@
+import os
+import pathlib
+from typing import Any, Iterable, Iterator, List
+from threading import Lock
+import cv2
+import numpy
+import pytest
+
+import facefusion.globals
+from facefusion import process_manager
+from facefusion.filesystem import create_temp, clear_temp, append_frame_journal, create_frame_journal, get_temp_directory_path, read_frame_journal
+from facefusion.processors.frame import core as frame_processors_core
+from facefusion.processors.frame.core import multi_process_frames, create_duplicate_frame_paths, create_empty_frame_paths, register_frame_numbers, create_queue_payloads, get_frame_number_offset, create_frame_journal_fingerprint, is_duplicate_frame
+from facefusion.vision import write_image, create_frame_signature, count_dhash_distance
+from facefusion.typing import QueuePayload, UpdateProgress, VisionFrame
+
+
+@pytest.fixture(autouse = True)
+def before_each() -> Iterator[None]:
+	execution_thread_count = facefusion.globals.execution_thread_count
+	execution_queue_count = facefusion.globals.execution_queue_count
+	execution_providers = facefusion.globals.execution_providers
+	log_level = facefusion.globals.log_level
+	frame_processors = facefusion.globals.frame_processors
+	output_video_resolution = facefusion.globals.output_video_resolution
+	yield
+	facefusion.globals.execution_thread_count = execution_thread_count
+	facefusion.globals.execution_queue_count = execution_queue_count
+	facefusion.globals.execution_providers = execution_providers
+	facefusion.globals.log_level = log_level
+	facefusion.globals.frame_processors = frame_processors
+	facefusion.globals.output_video_resolution = output_video_resolution
+
+
+def test_multi_process_frames() -> None:
+	facefusion.globals.execution_thread_count = 4
+	facefusion.globals.execution_queue_count = 1
+	facefusion.globals.execution_providers = [ 'CPUExecutionProvider' ]
+	facefusion.globals.log_level = 'error'
+	temp_frame_paths = [ str(index).zfill(4) + '.jpg' for index in range(100) ]
+	frame_numbers : List[int] = []
+	frame_numbers_lock = Lock()
+
+	def process_frames(source_paths : List[str], queue_payloads : Iterable[QueuePayload], update_progress : UpdateProgress) -> None:
+		for queue_payload in process_manager.manage(queue_payloads):
+			with frame_numbers_lock:
+				frame_numbers.append(queue_payload['frame_number'])
+			update_progress(1)
+
+	process_manager.start()
+	multi_process_frames([], temp_frame_paths, process_frames)
+	process_manager.end()
+
+	assert sorted(frame_numbers) == list(range(100))
+
+
+def test_multi_process_frames_with_frame_journal() -> None:
+	facefusion.globals.execution_thread_count = 4
+	facefusion.globals.execution_queue_count = 1
+	facefusion.globals.execution_providers = [ 'CPUExecutionProvider' ]
+	facefusion.globals.log_level = 'error'
+	facefusion.globals.skip_extract_frames = True
+	facefusion.globals.keep_temp = False
+	facefusion.globals.target_path = '.assets/examples/target-240p.mp4'
+	facefusion.globals.out_new_dir = True
+	temp_frame_paths = [ str(index).zfill(4) + '.jpg' for index in range(10) ]
+	frame_numbers : List[int] = []
+	frame_numbers_lock = Lock()
+
+	def process_frames(source_paths : List[str], queue_payloads : Iterable[QueuePayload], update_progress : UpdateProgress) -> None:
+		for queue_payload in process_manager.manage(queue_payloads):
+			with frame_numbers_lock:
+				frame_numbers.append(queue_payload['frame_number'])
+			update_progress(1)
+
+	create_temp(facefusion.globals.target_path)
+	create_frame_journal(facefusion.globals.target_path, create_frame_journal_fingerprint())
+	for temp_frame_path in temp_frame_paths[:6]:
+		append_frame_journal(facefusion.globals.target_path, [ process_frames.__module__.split('.')[-1] ], temp_frame_path)
+	process_manager.start()
+	multi_process_frames([], temp_frame_paths, process_frames)
+	multi_process_frames([], temp_frame_paths, process_frames)
+	process_manager.end()
+	clear_temp(facefusion.globals.target_path)
+	facefusion.globals.skip_extract_frames = None
+	facefusion.globals.target_path = None
+	facefusion.globals.out_new_dir = None
+
+	assert sorted(frame_numbers) == [ 6, 7, 8, 9 ]
+
+
+def test_multi_process_frames_with_stale_frame_journal() -> None:
+	facefusion.globals.execution_thread_count = 2
+	facefusion.globals.execution_queue_count = 1
+	facefusion.globals.execution_providers = [ 'CPUExecutionProvider' ]
+	facefusion.globals.log_level = 'error'
+	facefusion.globals.skip_extract_frames = True
+	facefusion.globals.keep_temp = False
+	facefusion.globals.target_path = '.assets/examples/target-240p.mp4'
+	create_temp(facefusion.globals.target_path)
+	temp_frame_paths = [ os.path.join(get_temp_directory_path(facefusion.globals.target_path), str(index).zfill(4) + '.jpg') for index in range(4) ]
+	frame_paths : List[str] = []
+	frame_paths_lock = Lock()
+
+	def process_frames(source_paths : List[str], queue_payloads : Iterable[QueuePayload], update_progress : UpdateProgress) -> None:
+		for queue_payload in process_manager.manage(queue_payloads):
+			with open(queue_payload['frame_path'], 'w') as frame_file:
+				frame_file.write('processed')
+			with frame_paths_lock:
+				frame_paths.append(queue_payload['frame_path'])
+			update_progress(1)
+
+	for temp_frame_path in temp_frame_paths:
+		with open(temp_frame_path, 'w') as frame_file:
+			frame_file.write('original')
+	create_frame_journal(facefusion.globals.target_path, 'stale')
+	for temp_frame_path in temp_frame_paths[:2]:
+		append_frame_journal(facefusion.globals.target_path, [ process_frames.__module__.split('.')[-1] ], temp_frame_path)
+	process_manager.start()
+	multi_process_frames([], temp_frame_paths, process_frames)
+	process_manager.end()
+
+	assert len(frame_paths) == 4
+	assert all(frame_path not in temp_frame_paths for frame_path in frame_paths)
+	for temp_frame_path in temp_frame_paths:
+		with open(temp_frame_path) as frame_file:
+			assert frame_file.read() == 'processed'
+	assert len(read_frame_journal(facefusion.globals.target_path).get(process_frames.__module__.split('.')[-1])) == 4
+	clear_temp(facefusion.globals.target_path)
+	facefusion.globals.skip_extract_frames = None
+	facefusion.globals.target_path = None
+
+
+def test_create_duplicate_frame_paths(tmp_path : pathlib.Path) -> None:
+	facefusion.globals.execution_thread_count = 4
+	facefusion.globals.frame_processors = [ 'face_swapper' ]
+	facefusion.globals.duplicate_frame_distance = 2
+	first_vision_frame = numpy.random.RandomState(0).randint(0, 255, (240, 320, 3), dtype = numpy.uint8)
+	second_vision_frame = numpy.random.RandomState(1).randint(0, 255, (240, 320, 3), dtype = numpy.uint8)
+	temp_frame_paths = [ str(tmp_path / (str(index).zfill(4) + '.png')) for index in range(5) ]
+	for temp_frame_path, vision_frame in zip(temp_frame_paths, [ first_vision_frame, first_vision_frame, first_vision_frame, second_vision_frame, second_vision_frame ]):
+		write_image(temp_frame_path, vision_frame)
+
+	assert create_duplicate_frame_paths(temp_frame_paths) ==\
+	{
+		temp_frame_paths[1]: temp_frame_paths[0],
+		temp_frame_paths[2]: temp_frame_paths[0],
+		temp_frame_paths[4]: temp_frame_paths[3]
+	}
+	facefusion.globals.frame_processors = [ 'lip_syncer' ]
+	assert create_duplicate_frame_paths(temp_frame_paths) == {}
+	facefusion.globals.duplicate_frame_distance = None
+
+
+def test_is_duplicate_frame() -> None:
+	facefusion.globals.duplicate_frame_distance = 2
+	vision_frame = numpy.tile(numpy.linspace(60, 200, 320, dtype = numpy.uint8), (240, 1))[:, :, numpy.newaxis].repeat(3, axis = 2)
+	noise_vision_frame = numpy.clip(vision_frame + numpy.random.RandomState(0).randint(-2, 3, vision_frame.shape), 0, 255).astype(numpy.uint8)
+	mouth_vision_frame = cv2.ellipse(vision_frame.copy(), (160, 150), (10, 5), 0, 0, 360, (20, 20, 20), -1)
+
+	assert is_duplicate_frame(create_frame_signature(noise_vision_frame), create_frame_signature(vision_frame)) is True
+	assert count_dhash_distance(create_frame_signature(mouth_vision_frame)[0], create_frame_signature(vision_frame)[0]) <= 2
+	assert is_duplicate_frame(create_frame_signature(mouth_vision_frame), create_frame_signature(vision_frame)) is False
+	facefusion.globals.duplicate_frame_distance = None
+
+
+def test_create_empty_frame_paths(monkeypatch : pytest.MonkeyPatch) -> None:
+	facefusion.globals.execution_thread_count = 4
+	facefusion.globals.frame_processors = [ 'face_swapper' ]
+	facefusion.globals.face_presence_interval = 3
+	temp_frame_paths = [ str(index).zfill(4) + '.jpg' for index in range(8) ]
+	face_frame_paths = [ temp_frame_paths[3] ]
+
+	monkeypatch.setattr(frame_processors_core, 'detect_frame_face_presence', lambda temp_frame_path : temp_frame_path in face_frame_paths)
+
+	assert create_empty_frame_paths(temp_frame_paths) == [ temp_frame_paths[0], temp_frame_paths[6], temp_frame_paths[7] ]
+	facefusion.globals.frame_processors = [ 'face_swapper', 'frame_enhancer' ]
+	assert create_empty_frame_paths(temp_frame_paths) == []
+	facefusion.globals.face_presence_interval = None
+
+
+def test_create_queue_payloads(monkeypatch : pytest.MonkeyPatch) -> None:
+	facefusion.globals.execution_thread_count = 4
+	facefusion.globals.frame_processors = [ 'lip_syncer' ]
+	facefusion.globals.face_presence_interval = 2
+	temp_frame_paths = [ str(index).zfill(4) + '.jpg' for index in range(6) ]
+	face_frame_paths = [ temp_frame_paths[4], temp_frame_paths[5] ]
+
+	monkeypatch.setattr(frame_processors_core, 'detect_frame_face_presence', lambda temp_frame_path : temp_frame_path in face_frame_paths)
+
+	register_frame_numbers(temp_frame_paths)
+	empty_frame_paths = create_empty_frame_paths(temp_frame_paths)
+	queue_payloads = create_queue_payloads([ temp_frame_path for temp_frame_path in temp_frame_paths if temp_frame_path not in empty_frame_paths ])
+	assert [ queue_payload.get('frame_number') for queue_payload in queue_payloads ] == [ 3, 4, 5 ]
+	register_frame_numbers([])
+	assert [ queue_payload.get('frame_number') for queue_payload in create_queue_payloads(temp_frame_paths[3:]) ] == [ 0, 1, 2 ]
+	facefusion.globals.face_presence_interval = None
+
+
+def test_get_frame_number_offset(monkeypatch : pytest.MonkeyPatch) -> None:
+	monkeypatch.setattr(frame_processors_core, 'detect_video_fps', lambda target_path : 50.0)
+
+	assert get_frame_number_offset(25.0) == 0
+	facefusion.globals.trim_frame_offset = 100
+	assert get_frame_number_offset(25.0) == 50
+	assert get_frame_number_offset(50.0) == 100
+	register_frame_numbers([ '0000.jpg', '0001.jpg' ], get_frame_number_offset(25.0))
+	assert [ queue_payload.get('frame_number') for queue_payload in create_queue_payloads([ '0001.jpg' ]) ] == [ 51 ]
+	register_frame_numbers([])
+	facefusion.globals.trim_frame_offset = None
+
+
+def test_multi_process_stream_with_failed_frame(monkeypatch : pytest.MonkeyPatch) -> None:
+	facefusion.globals.execution_thread_count = 2
+	facefusion.globals.execution_queue_count = 1
+	facefusion.globals.output_video_resolution = '2x2'
+	closed_processes : List[str] = []
+
+	def process_vision_frame(*args : Any) -> VisionFrame:
+		raise RuntimeError
+
+	monkeypatch.setattr(frame_processors_core, 'create_frame_processor_inputs', lambda source_paths, temp_video_fps : {})
+	monkeypatch.setattr(frame_processors_core, 'estimate_frame_total', lambda target_path, temp_video_fps : 2)
+	monkeypatch.setattr(frame_processors_core, 'open_video_reader', lambda target_path, temp_video_resolution, temp_video_fps : 'reader')
+	monkeypatch.setattr(frame_processors_core, 'open_video_writer', lambda target_path, output_video_resolution, output_video_fps : 'writer')
+	monkeypatch.setattr(frame_processors_core, 'read_video_frames', lambda video_reader, temp_video_resolution : iter([ numpy.zeros((2, 2, 3), dtype = numpy.uint8) ] * 2))
+	monkeypatch.setattr(frame_processors_core, 'close_video_reader', closed_processes.append)
+	monkeypatch.setattr(frame_processors_core, 'discard_video_writer', lambda video_writer, target_path : closed_processes.append(video_writer))
+	monkeypatch.setattr(frame_processors_core, 'process_vision_frame', process_vision_frame)
+
+	process_manager.start()
+	with pytest.raises(RuntimeError):
+		frame_processors_core.multi_process_stream([], 'target.mp4', '2x2', 25.0)
+	process_manager.end()
+
+	assert sorted(closed_processes) == [ 'reader', 'writer' ]
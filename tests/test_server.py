@@ -0,0 +1,48 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import facefusion.globals
+from facefusion.server import ServerRequestHandler, create_job, get_job, process_job, update_job_progress, SERVER_QUEUE
+
+
+def test_process_job() -> None:
+	facefusion.globals.source_paths = [ 'source.jpg' ]
+	facefusion.globals.target_path = None
+	facefusion.globals.output_path = None
+	server_job = create_job('target.jpg', output_path = '.')
+	SERVER_QUEUE.get()
+
+	def process_target() -> None:
+		assert facefusion.globals.target_path == 'target.jpg'
+		assert facefusion.globals.source_paths == [ 'source.jpg' ]
+		update_job_progress(1, 2)
+
+	process_job(server_job.get('job_id'), process_target)
+	server_job = get_job(server_job.get('job_id'))
+
+	assert server_job.get('status') == 'failed'
+	assert server_job.get('frame_done') == 1
+	assert server_job.get('frame_total') == 2
+	assert facefusion.globals.target_path is None
+
+
+def test_server_request_handler() -> None:
+	http_server = ThreadingHTTPServer(('127.0.0.1', 0), ServerRequestHandler)
+	threading.Thread(target = http_server.serve_forever, daemon = True).start()
+	server_url = 'http://127.0.0.1:' + str(http_server.server_port)
+
+	try:
+		with pytest.raises(urllib.error.HTTPError) as exception:
+			urllib.request.urlopen(urllib.request.Request(server_url + '/jobs', data = json.dumps({ 'target_path': 'invalid.mp4' }).encode(), method = 'POST'))
+		assert exception.value.code == 400
+		with pytest.raises(urllib.error.HTTPError) as exception:
+			urllib.request.urlopen(server_url + '/jobs/invalid')
+		assert exception.value.code == 404
+	finally:
+		http_server.shutdown()
+		http_server.server_close()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+
+import facefusion.globals
+from facefusion.shard_manager import create_shard_job, read_shard_job, claim_shard, complete_shard, release_shard, is_shard_job_done, get_shard_segment_paths, requeue_expired_shards
+
+
+def test_claim_and_complete_shards() -> None:
+	shard_directory = tempfile.mkdtemp()
+	job_directory = create_shard_job(shard_directory, '.assets/examples/target-240p.mp4', [ (0, 100), (100, 200) ])
+
+	assert read_shard_job(job_directory).get('shard_total') == 2
+	assert read_shard_job(job_directory).get('trim_frame_start') == 0
+	assert create_shard_job(shard_directory, '.assets/examples/target-240p.mp4', [ (0, 100), (100, 200) ]) == job_directory
+	assert create_shard_job(shard_directory, '.assets/examples/target-240p.mp4', [ (0, 300) ]) != job_directory
+	assert get_shard_segment_paths(job_directory) == [ os.path.join(job_directory, 'segments', '0000.mp4'), os.path.join(job_directory, 'segments', '0001.mp4') ]
+
+	first_job_directory, first_shard = claim_shard(shard_directory, [ job_directory ])
+	second_job_directory, second_shard = claim_shard(shard_directory, [ job_directory ])
+
+	assert first_shard == { 'index': 0, 'trim_frame_start': 0, 'trim_frame_end': 100 }
+	assert second_shard.get('index') == 1
+	assert claim_shard(shard_directory, [ job_directory ]) is None
+
+	release_shard(second_job_directory, second_shard)
+	complete_shard(first_job_directory, first_shard)
+
+	assert is_shard_job_done(job_directory) is False
+
+	third_job_directory, third_shard = claim_shard(shard_directory, [ job_directory ])
+	complete_shard(third_job_directory, third_shard)
+
+	assert third_shard.get('index') == 1
+	assert is_shard_job_done(job_directory) is True
+
+
+def test_create_shard_job_per_settings() -> None:
+	shard_directory = tempfile.mkdtemp()
+	target_path = os.path.join(shard_directory, 'target.mp4')
+	with open(target_path, 'wb') as target_file:
+		target_file.write(b'target')
+	facefusion.globals.frame_processors = [ 'face_swapper' ]
+	job_directory = create_shard_job(shard_directory, target_path, [ (0, 100) ])
+
+	assert create_shard_job(shard_directory, target_path, [ (0, 100) ]) == job_directory
+	facefusion.globals.frame_processors = [ 'face_enhancer' ]
+	assert create_shard_job(shard_directory, target_path, [ (0, 100) ]) != job_directory
+	facefusion.globals.frame_processors = [ 'face_swapper' ]
+	with open(target_path, 'ab') as target_file:
+		target_file.write(b'changed')
+	assert create_shard_job(shard_directory, target_path, [ (0, 100) ]) != job_directory
+	facefusion.globals.frame_processors = None
+
+
+def test_requeue_expired_shards() -> None:
+	shard_directory = tempfile.mkdtemp()
+	job_directory = create_shard_job(shard_directory, '.assets/examples/target-240p.mp4', [ (0, 100) ])
+	_, shard = claim_shard(shard_directory, [ job_directory ])
+
+	requeue_expired_shards(job_directory)
+	assert claim_shard(shard_directory, [ job_directory ]) is None
+	requeue_expired_shards(job_directory, -1)
+	assert claim_shard(shard_directory, [ job_directory ]) == (job_directory, shard)
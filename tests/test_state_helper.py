@@ -0,0 +1,21 @@
+import facefusion.globals
+from facefusion.processors.frame import globals as frame_processors_globals
+from facefusion.state_helper import export_globals_state, import_globals_state
+
+
+def test_export_and_import_globals_state() -> None:
+	facefusion.globals.execution_thread_count = 8
+	facefusion.globals.frame_processors = [ 'face_swapper' ]
+	frame_processors_globals.face_swapper_model = 'inswapper_128'
+	globals_state = export_globals_state()
+
+	assert globals_state.get('globals').get('execution_thread_count') == 8
+	assert globals_state.get('frame_processors_globals').get('face_swapper_model') == 'inswapper_128'
+	assert 'List' not in globals_state.get('globals')
+
+	facefusion.globals.execution_thread_count = 1
+	frame_processors_globals.face_swapper_model = None
+	import_globals_state(globals_state)
+
+	assert facefusion.globals.execution_thread_count == 8
+	assert frame_processors_globals.face_swapper_model == 'inswapper_128'
@@ -0,0 +1,31 @@
+import threading
+from time import sleep
+import pytest
+
+from facefusion import face_analyser
+from facefusion.thread_helper import thread_lock, get_thread_lock_contentions, get_thread_lock_wait_time
+
+
+def test_thread_lock_fast_path(monkeypatch : pytest.MonkeyPatch) -> None:
+	inference_session = object()
+	monkeypatch.setattr(face_analyser, 'FACE_ANALYSER', { 'gender_age': inference_session })
+
+	# 模型已加载时不再获取全局锁,即使锁被占用也能立即返回
+	with thread_lock():
+		thread_lock_contentions = get_thread_lock_contentions()
+		assert face_analyser.get_gender_age() is inference_session
+		assert get_thread_lock_contentions() == thread_lock_contentions
+	thread_lock_wait_time = get_thread_lock_wait_time()
+
+	def acquire_thread_lock() -> None:
+		with thread_lock():
+			pass
+
+	with thread_lock():
+		waiting_thread = threading.Thread(target = acquire_thread_lock)
+		waiting_thread.start()
+		sleep(0.1)
+		assert get_thread_lock_contentions() == thread_lock_contentions
+	waiting_thread.join()
+	assert get_thread_lock_contentions() == thread_lock_contentions + 1
+	assert get_thread_lock_wait_time() > thread_lock_wait_time
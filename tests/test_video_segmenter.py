@@ -0,0 +1,9 @@
+from facefusion.video_segmenter import create_segment_ranges
+
+
+def test_create_segment_ranges() -> None:
+	assert create_segment_ranges(0, 300, [], 3) == [ (0, 100), (100, 200), (200, 300) ]
+	assert create_segment_ranges(0, 300, [ 0, 90, 180, 250 ], 3) == [ (0, 90), (90, 180), (180, 300) ]
+	assert create_segment_ranges(50, 150, [ 0, 300 ], 2) == [ (50, 100), (100, 150) ]
+	assert create_segment_ranges(0, 2, [], 4) == [ (0, 1), (1, 2) ]
+	assert create_segment_ranges(0, 300, [ 0, 90, 180, 250 ], 1) == [ (0, 300) ]